@@ -2,18 +2,13 @@
 import streamlit as st
 import os
 from datetime import datetime
+import perf
 
-# Importações dos módulos de UI
-from ui_dashboard import render_dashboard
-from ui_vendas import render_vendas
-from ui_contas_bancarias import render_contas_bancarias
-from ui_custos import render_custos
-from ui_recebimentos import render_recebimentos
-from ui_despesas import render_despesas
-from ui_entregas import render_entregas
-from ui_configuracoes import render_configuracoes
+perf.iniciar_rerun()  # Tempo de cada fase deste rerun (painel de desempenho na barra lateral)
 
-from database import init_db
+# Módulos de UI: importados só quando a página é selecionada (ver paginas.py)
+from paginas import PAGINAS, rotulo_pagina, carregar_pagina
+from ui_tarefas import resumo_tarefas_ativas
 
 # --- LÓGICA DE AUTENTICAÇÃO ---
 def check_password():
@@ -50,18 +45,25 @@ st.set_page_config(
 )
 
 # APLICA A VERIFICAÇÃO DE SENHA
-if not check_password():
+with perf.medir('autenticacao'):
+    autenticado = check_password()
+if not autenticado:
     st.stop() # Interrompe a execução do app se a senha não estiver correta
 
 # Se a senha estiver correta, o resto do app carrega normalmente
 # -------------------------------------------------------------------
 
-# Inicialização do banco de dados
-if not os.path.exists("financeiro.db"):
-    init_db()
+# Inicialização do banco de dados. Importado depois do login: a tela de senha aparece sem esperar o pandas
+with perf.medir('init_db'):
+    from database import init_db, migrate_db, coletar_consultas, resumo_consultas, cache_leituras_stats, LIMITE_CONSULTA_LENTA_MS, ARQUIVO_CONSULTAS_LENTAS
+    if not os.path.exists("financeiro.db"):
+        init_db()
+    migrate_db()  # Atualiza bancos já existentes (índices, colunas novas); é só uma leitura do user_version quando está em dia
+    from backup import iniciar_backups_agendados
+    iniciar_backups_agendados()  # Só na primeira vez inicia a thread dos backups periódicos
 
 # --- Construção da Barra Lateral de Navegação ---
-with st.sidebar:
+with st.sidebar, perf.medir('barra_lateral'):
     try:
         st.image("logo.png", use_container_width=True)
     except Exception as e:
@@ -72,36 +74,39 @@ with st.sidebar:
 
     pagina_selecionada = st.radio(
         "Selecione uma página:",
-        ["Dashboard", "Vendas", "Contas Bancárias", "Custos", "Recebimentos", "Despesas", "Entregas", "Configuracoes"],
+        list(PAGINAS),
         label_visibility="collapsed",
-        format_func=lambda x: {
-            "Dashboard": "📊 Dashboard", "Vendas": "📝 Vendas", "Contas Bancárias": "🏦 Contas Bancárias",
-            "Custos": "💰 Custos", "Recebimentos": "💳 Recebimentos", "Despesas": "📋 Despesas",
-            "Entregas": "🚚 Entregas", "Configuracoes": "⚙️ Configurações"
-        }.get(x, x.replace("_", " ").title())
+        format_func=rotulo_pagina
     )
 
+    resumo_tarefas_ativas()  # Tarefas em segundo plano continuam ao trocar de página
+
     st.divider()
     st.info(f"Sistema de Gestão v2.3 | © {datetime.now().year}")
+    # Painel do desenvolvedor (MOSTRAR_CONSULTAS=1 liga por padrão)
+    mostrar_desempenho = st.toggle("⏱️ Painel de desempenho", value=os.environ.get("MOSTRAR_CONSULTAS") == "1", key="painel_desempenho")
 
 # --- Renderização da Página Selecionada ---
 st.title("Gestão Financeira | Minha Casa Pré-Fabricada Bahia")
 st.caption("Simplificando a gestão financeira dos seus projetos.")
 st.divider()
 
-if pagina_selecionada == "Dashboard":
-    render_dashboard()
-elif pagina_selecionada == "Vendas":
-    render_vendas()
-elif pagina_selecionada == "Contas Bancárias":
-    render_contas_bancarias()
-elif pagina_selecionada == "Custos":
-    render_custos()
-elif pagina_selecionada == "Recebimentos":
-    render_recebimentos()
-elif pagina_selecionada == "Despesas":
-    render_despesas()
-elif pagina_selecionada == "Entregas":
-    render_entregas()
-elif pagina_selecionada == "Configuracoes":
-    render_configuracoes()
\ No newline at end of file
+with perf.medir('carga_pagina'):
+    render_pagina = carregar_pagina(pagina_selecionada)
+
+with coletar_consultas() as consultas_do_rerun, perf.medir('pagina'):
+    render_pagina()
+
+tempos_do_rerun = perf.finalizar_rerun(pagina_selecionada, consultas_do_rerun)
+
+# Tempos deste rerun, histórico p50/p95 por página e consultas por função render_*
+if mostrar_desempenho:
+    with st.sidebar.expander("⏱️ Desempenho", expanded=True):
+        st.caption(f"Rerun de {pagina_selecionada}: {tempos_do_rerun['total']:.0f} ms")
+        st.dataframe(perf.tempos_do_rerun(tempos_do_rerun), hide_index=True)
+        st.caption("Histórico por página (ms)")
+        st.dataframe(perf.estatisticas_por_pagina(), hide_index=True)
+        st.caption("Consultas desta execução")
+        st.dataframe(resumo_consultas(consultas_do_rerun), hide_index=True)
+        st.caption(f"Cache de leituras: {cache_leituras_stats['hits']} acertos, {cache_leituras_stats['misses']} faltas. "
+                   f"Consultas acima de {LIMITE_CONSULTA_LENTA_MS:.0f} ms são gravadas com o plano de execução em {ARQUIVO_CONSULTAS_LENTAS}.")
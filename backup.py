@@ -0,0 +1,236 @@
+# backup.py (Cópias de segurança do banco sem parar o app)
+# A cópia usa a API de backup do SQLite a partir de uma conexão do pool: é lida dentro de uma única
+# transação de leitura, então sai consistente mesmo com lançamentos acontecendo (com WAL, os
+# escritores não ficam bloqueados). Depois é comprimida com gzip. Há dois usos:
+#   - sob demanda (Configurações): gerada por uma tarefa em segundo plano só quando pedida;
+#   - agendada: uma thread do processo enfileira um backup a cada INTERVALO_BACKUP_HORAS em
+#     DIRETORIO_BACKUPS, mantendo só os BACKUPS_GUARDADOS mais recentes.
+# A restauração faz o caminho inverso sem reiniciar o app: valida o arquivo, pausa o pool de
+# conexões e grava o backup por cima do banco em uso com a mesma API (uma única transação de escrita).
+# O banco substituído é salvo antes com outro prefixo (PREFIXO_SEGURANCA): a retenção e o agendamento
+# só olham os backups agendados, então essa cópia não é apagada nem adia o próximo backup.
+import gzip
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from database import pooled_connection, pool_pausado, connect_db, migrate_db, MIGRACOES
+from tarefas import enviar_tarefa, aguardar_tarefa, STATUS_CONCLUIDA
+
+DIRETORIO_BACKUPS = os.environ.get("DIRETORIO_BACKUPS", "backups")
+BACKUPS_GUARDADOS = int(os.environ.get("BACKUPS_GUARDADOS", "14"))
+INTERVALO_BACKUP_HORAS = float(os.environ.get("INTERVALO_BACKUP_HORAS", "24"))  # 0 desliga o agendamento
+ESPERA_APOS_FALHA = 15 * 60  # Segundos até tentar de novo um backup agendado que falhou
+PREFIXO_BACKUP = "financeiro_"
+PREFIXO_SEGURANCA = "antes_da_restauracao_"  # Banco salvo antes de uma restauração (fora da retenção)
+EXTENSAO_BACKUP = ".db.gz"
+BLOCO_COMPRESSAO = 1024 * 1024
+
+# Tabelas e colunas criadas pelo init_db: um backup sem alguma delas não é deste sistema (as
+# colunas e tabelas criadas pelas migrações são acrescentadas pelo migrate_db após a restauração)
+TABELAS_OBRIGATORIAS = {
+    'contas_bancarias': ('id', 'nome_banco', 'agencia', 'conta', 'saldo_inicial', 'data_criacao'),
+    'transacoes_bancarias': ('id', 'conta_id', 'data', 'tipo', 'descricao', 'valor', 'venda_id'),
+    'vendas': ('id', 'cliente', 'telefone', 'email', 'data_venda', 'nome_kit', 'valor_venda', 'valor_frete'),
+    'custos': ('venda_id', 'custo_mcpf', 'custo_madeireira'),
+    'plano_recebimentos': ('id', 'venda_id', 'descricao', 'valor_previsto', 'data_vencimento', 'status', 'valor_pago', 'data_pagamento', 'forma_pagamento'),
+    'pagamentos_custos': ('id', 'venda_id', 'tipo_fornecedor', 'valor', 'data_pagamento'),
+    'despesas_pagas': ('id', 'venda_id', 'tipo_despesa', 'valor', 'data_pagamento'),
+    'entregas': ('venda_id', 'status_entrega', 'endereco_entrega', 'data_entrega', 'observacoes'),
+    'configuracoes': ('chave', 'valor'),
+}
+CABECALHO_SQLITE = b"SQLite format 3\x00"
+CABECALHO_GZIP = b"\x1f\x8b"
+
+_agendador = None
+_agendador_lock = threading.Lock()
+
+def gerar_backup(destino, progresso=None):
+    """Grava em `destino` uma cópia consistente do banco, comprimida com gzip. Retorna o tamanho em bytes.
+
+    `progresso(feitos, total)` acompanha a compressão (em bytes da cópia). O arquivo só aparece em
+    `destino` quando está completo.
+    """
+    copia = f"{destino}.copia"
+    parcial = f"{destino}.parcial"
+    try:
+        with pooled_connection() as origem, closing(sqlite3.connect(copia)) as conn_copia:
+            origem.backup(conn_copia)  # Um passo só: a cópia inteira sai da mesma transação de leitura
+        total = os.path.getsize(copia)
+        with open(copia, 'rb') as entrada, gzip.open(parcial, 'wb', compresslevel=6) as saida:
+            feitos = 0
+            while bloco := entrada.read(BLOCO_COMPRESSAO):
+                saida.write(bloco)
+                feitos += len(bloco)
+                if progresso:
+                    progresso(feitos, total)
+        os.replace(parcial, destino)
+    finally:
+        for caminho in (copia, parcial):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+    return os.path.getsize(destino)
+
+def _tamanho_legivel(tamanho):
+    return f"{tamanho / (1024 * 1024):.1f} MB" if tamanho >= 1024 * 1024 else f"{tamanho / 1024:.0f} KB"
+
+def tarefa_backup(progresso, destino):
+    """Tarefa (tarefas.py) do backup sob demanda: o arquivo gerado vai para o botão de download."""
+    tamanho = gerar_backup(destino, progresso=lambda feitos, total: progresso(feitos, total, "Comprimindo a cópia..."))
+    return {'arquivo': destino, 'mensagem': f"Backup gerado ({_tamanho_legivel(tamanho)})."}
+
+def listar_backups(diretorio=None, prefixo=PREFIXO_BACKUP):
+    """Backups agendados do diretório (ou, com `prefixo=PREFIXO_SEGURANCA`, as cópias salvas antes
+    das restaurações), do mais recente para o mais antigo."""
+    diretorio = diretorio or DIRETORIO_BACKUPS
+    if not os.path.isdir(diretorio):
+        return []
+    backups = []
+    for nome in os.listdir(diretorio):
+        if nome.startswith(prefixo) and nome.endswith(EXTENSAO_BACKUP):
+            caminho = os.path.join(diretorio, nome)
+            backups.append({'arquivo': nome, 'caminho': caminho, 'tamanho': os.path.getsize(caminho),
+                            'criado_em': datetime.fromtimestamp(os.path.getmtime(caminho))})
+    return sorted(backups, key=lambda backup: backup['arquivo'], reverse=True)  # O nome começa pela data
+
+def aplicar_retencao(diretorio=None, guardados=None):
+    """Apaga os backups agendados além dos `guardados` mais recentes. Retorna quantos foram apagados."""
+    guardados = BACKUPS_GUARDADOS if guardados is None else guardados
+    antigos = listar_backups(diretorio)[guardados:]
+    for backup in antigos:
+        os.remove(backup['caminho'])
+    return len(antigos)
+
+def tarefa_backup_agendado(progresso, diretorio=None):
+    """Tarefa do backup periódico: grava no diretório de backups e aplica a retenção."""
+    diretorio = diretorio or DIRETORIO_BACKUPS
+    os.makedirs(diretorio, exist_ok=True)
+    destino = os.path.join(diretorio, f"{PREFIXO_BACKUP}{datetime.now():%Y%m%d_%H%M%S}{EXTENSAO_BACKUP}")
+    tamanho = gerar_backup(destino, progresso=lambda feitos, total: progresso(feitos, total, "Comprimindo a cópia..."))
+    apagados = aplicar_retencao(diretorio)
+    return {'mensagem': f"Backup agendado gravado em {destino} ({_tamanho_legivel(tamanho)}); {apagados} antigo(s) removido(s)."}
+
+def preparar_arquivo_restauracao(origem, destino):
+    """Copia o backup `origem` (arquivo aberto em modo binário, .db ou .db.gz) para `destino`, descompactando se preciso."""
+    abrir = gzip.open if origem.read(2) == CABECALHO_GZIP else None
+    origem.seek(0)
+    with (abrir(origem) if abrir else origem) as entrada, open(destino, 'wb') as saida:
+        while bloco := entrada.read(BLOCO_COMPRESSAO):
+            saida.write(bloco)
+    return destino
+
+def validar_backup(caminho):
+    """Confere um backup (.db descompactado) antes de restaurar. Retorna um dict com 'problemas'
+    (lista vazia se puder ser restaurado), 'versao' do esquema e as contagens das tabelas principais."""
+    resultado = {'problemas': [], 'versao': None, 'vendas': None, 'contas_bancarias': None, 'transacoes_bancarias': None}
+    with open(caminho, 'rb') as arquivo:
+        if arquivo.read(len(CABECALHO_SQLITE)) != CABECALHO_SQLITE:
+            resultado['problemas'].append("O arquivo não é um banco SQLite.")
+            return resultado
+    try:
+        with closing(sqlite3.connect(f"file:{caminho}?mode=ro&immutable=1", uri=True)) as conn:
+            erros = [linha[0] for linha in conn.execute("PRAGMA integrity_check(10);")]
+            if erros != ['ok']:
+                resultado['problemas'] += [f"Integridade: {erro}" for erro in erros]
+                return resultado
+            for tabela, colunas in TABELAS_OBRIGATORIAS.items():
+                existentes = {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela});")}
+                if not existentes:
+                    resultado['problemas'].append(f"Tabela ausente: {tabela}")
+                elif faltando := [coluna for coluna in colunas if coluna not in existentes]:
+                    resultado['problemas'].append(f"Colunas ausentes em {tabela}: {', '.join(faltando)}")
+            resultado['versao'] = conn.execute("PRAGMA user_version;").fetchone()[0]
+            if resultado['versao'] > MIGRACOES[-1][0]:
+                resultado['problemas'].append(f"Esquema versão {resultado['versao']}, mais novo que o deste sistema ({MIGRACOES[-1][0]}).")
+            if not resultado['problemas']:
+                for tabela in ('vendas', 'contas_bancarias', 'transacoes_bancarias'):
+                    resultado[tabela] = conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        resultado['problemas'].append(f"Não foi possível ler o banco: {e}")
+    return resultado
+
+def _converter_tamanho_de_pagina(caminho, tamanho):
+    """Cópia do backup `caminho` com páginas de `tamanho` bytes. A API de backup não grava em um banco
+    em WAL com outro page_size (falha no meio da cópia); o VACUUM só muda o page_size fora do WAL."""
+    convertido = f"{caminho}.paginas_{tamanho}"
+    with closing(sqlite3.connect(f"file:{caminho}?mode=ro&immutable=1", uri=True)) as origem, closing(sqlite3.connect(convertido)) as destino:
+        origem.backup(destino)
+        destino.execute("PRAGMA journal_mode = DELETE;")
+        destino.execute(f"PRAGMA page_size = {int(tamanho)};")
+        destino.execute("VACUUM;")
+    return convertido
+
+def restaurar_backup(caminho, progresso=None):
+    """Substitui o conteúdo do banco em uso pelo backup `caminho` (.db descompactado).
+
+    Antes, o banco atual é salvo no diretório de backups com PREFIXO_SEGURANCA (a restauração pode
+    ser desfeita; a retenção dos backups agendados não apaga essa cópia). Um backup com outro
+    page_size é antes convertido para o do banco em uso, numa cópia temporária. A troca
+    é feita com o pool pausado, pela API de backup, em uma única transação de escrita: as outras
+    conexões (inclusive de outros processos) veem o banco antigo ou o novo, nunca uma mistura. Em
+    seguida o esquema é migrado para a versão atual. Retorna o caminho do backup de segurança.
+    """
+    progresso = progresso or (lambda feitos, total, mensagem=None: None)
+    problemas = validar_backup(caminho)['problemas']
+    if problemas:
+        raise ValueError("Backup inválido: " + " ".join(problemas))
+    progresso(0, 3, "Salvando o banco atual...")
+    os.makedirs(DIRETORIO_BACKUPS, exist_ok=True)
+    seguranca = os.path.join(DIRETORIO_BACKUPS, f"{PREFIXO_SEGURANCA}{datetime.now():%Y%m%d_%H%M%S}{EXTENSAO_BACKUP}")
+    gerar_backup(seguranca)
+    progresso(1, 3, "Restaurando...")
+    with pooled_connection() as conn:
+        tamanho_pagina = conn.execute("PRAGMA page_size;").fetchone()[0]
+    with closing(sqlite3.connect(f"file:{caminho}?mode=ro&immutable=1", uri=True)) as origem:
+        convertido = None if origem.execute("PRAGMA page_size;").fetchone()[0] == tamanho_pagina else _converter_tamanho_de_pagina(caminho, tamanho_pagina)
+    try:
+        with closing(sqlite3.connect(f"file:{convertido or caminho}?mode=ro&immutable=1", uri=True)) as origem, pool_pausado():
+            with closing(connect_db()) as destino:
+                origem.backup(destino)
+    finally:
+        if convertido:
+            os.remove(convertido)
+    progresso(2, 3, "Atualizando o esquema...")
+    migrate_db()
+    return seguranca
+
+def tarefa_restaurar(progresso, caminho):
+    """Tarefa (tarefas.py) da restauração. Apaga o arquivo temporário `caminho` no final."""
+    try:
+        seguranca = restaurar_backup(caminho, progresso)
+    finally:
+        os.remove(caminho)
+    return {'mensagem': f"Backup restaurado. O banco anterior foi salvo em {seguranca}."}
+
+def _segundos_ate_proximo_backup():
+    backups = listar_backups()
+    if not backups:
+        return 0.0
+    proximo = backups[0]['criado_em'].timestamp() + INTERVALO_BACKUP_HORAS * 3600
+    return max(proximo - time.time(), 0.0)
+
+def _executar_agendador():
+    while True:
+        espera = _segundos_ate_proximo_backup()
+        if espera <= 0:
+            try:
+                tarefa = aguardar_tarefa(enviar_tarefa('backup', "Backup agendado", tarefa_backup_agendado, chave='backup_agendado'), intervalo=5.0)
+                espera = _segundos_ate_proximo_backup() if tarefa and tarefa['status'] == STATUS_CONCLUIDA else ESPERA_APOS_FALHA
+            except Exception as e:
+                print(f"ERRO NO BACKUP AGENDADO: {e}")
+                espera = ESPERA_APOS_FALHA
+        time.sleep(min(max(espera, 1.0), 3600))  # Acorda pelo menos de hora em hora (o relógio pode mudar)
+
+def iniciar_backups_agendados():
+    """Inicia (uma vez por processo) a thread que enfileira os backups periódicos. Chamado a cada
+    rerun pelo app.py; depois da primeira vez não faz nada. O primeiro backup sai logo se o último
+    do diretório tiver mais de INTERVALO_BACKUP_HORAS."""
+    global _agendador
+    if INTERVALO_BACKUP_HORAS <= 0:
+        return
+    with _agendador_lock:
+        if _agendador is None:
+            _agendador = threading.Thread(target=_executar_agendador, name="backup-agendado", daemon=True)
+            _agendador.start()
@@ -0,0 +1,229 @@
+# benchmark.py (Suíte de desempenho do caminho de dados)
+# Uso:
+#   python benchmark.py --vendas 10000 --saida resultado.json
+#   python benchmark.py --banco bench.db --comparar resultado_anterior.json
+#   python benchmark.py --banco bench.db --verificar 500   (motor de rentabilidade x cálculo venda a venda)
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import pandas as pd
+import database
+import calculations
+import pdf_generator
+import gerar_dados
+import rentabilidade
+
+REPETICOES_PADRAO = 20
+TOLERANCIA_REGRESSAO = 0.20  # 20% mais lento que a execução anterior = regressão
+
+def _medir(funcao, repeticoes, preparar=None):
+    """Executa `funcao` `repeticoes` vezes e devolve as estatísticas de tempo em milissegundos."""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        'repeticoes': repeticoes,
+        'mediana_ms': round(statistics.median(tempos), 3),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+        'min_ms': round(tempos[0], 3),
+        'max_ms': round(tempos[-1], 3),
+    }
+
+def cenarios(rnd):
+    """Operações medidas. Cada uma roda com o cache de leituras vazio (custo real no banco),
+    exceto as marcadas "(cache)", que medem a resposta de um rerun sem escrita no meio."""
+    total_vendas = database.get_data_as_dataframe("SELECT COUNT(*) AS n FROM vendas", usar_cache=False)['n'].iloc[0]
+    contas = database.get_data_as_dataframe("SELECT conta_id, COUNT(*) AS n FROM transacoes_bancarias GROUP BY conta_id ORDER BY n DESC LIMIT 1", usar_cache=False)
+    conta_id = int(contas['conta_id'].iloc[0]) if not contas.empty else 1
+    meio_extrato = database.get_data_as_dataframe(
+        "SELECT data, id FROM transacoes_bancarias WHERE conta_id = ? ORDER BY data DESC, id DESC LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM transacoes_bancarias WHERE conta_id = ?)",
+        (conta_id, conta_id), usar_cache=False)
+    cursor_meio = (meio_extrato['data'].iloc[0], int(meio_extrato['id'].iloc[0])) if not meio_extrato.empty else None
+    venda_aleatoria = lambda: rnd.randint(1, max(int(total_vendas), 1))
+
+    def recibo():
+        venda_id = venda_aleatoria()
+        venda = database.get_data_as_dataframe("SELECT * FROM vendas WHERE id = ?", (venda_id,), usar_cache=False)
+        parcelas = database.get_data_as_dataframe("SELECT * FROM plano_recebimentos WHERE venda_id = ?", (venda_id,), usar_cache=False)
+        if not venda.empty:
+            pdf_generator.gerar_recibo_venda(pdf_generator.montar_dados_recibo(venda.iloc[0].to_dict(), parcelas.to_dict('records')))
+
+    return {
+        'calculate_global_totals': lambda: calculations.calculate_global_totals(),
+        'calculate_global_totals (cache)': lambda: calculations.calculate_global_totals(),
+        'calculate_venda_totals': lambda: calculations.calculate_venda_totals(venda_aleatoria()),
+        'calculate_many_venda_totals (pagina de 50)': lambda: calculations.calculate_many_venda_totals(database.buscar_vendas(limite=50)[0]['id'].tolist()),
+        'get_saldo_contas': lambda: database.get_saldo_contas(),
+        'extrato (primeira pagina)': lambda: database.get_extrato_pagina(conta_id, limite=50),
+        'extrato (pagina do meio)': lambda: database.get_extrato_pagina(conta_id, limite=50, antes_de=cursor_meio),
+        'busca de vendas (nome)': lambda: database.buscar_vendas(rnd.choice(gerar_dados.NOMES), limite=50),
+        'busca de vendas (prefixo)': lambda: database.buscar_vendas(rnd.choice(gerar_dados.SOBRENOMES)[:3], limite=50),
+        'gerar_recibo_venda': recibo,
+    }
+
+def executar(repeticoes, semente=7):
+    rnd = random.Random(semente)
+    resultados = {}
+    for nome, funcao in cenarios(rnd).items():
+        usa_cache = nome.endswith('(cache)')
+        if usa_cache:
+            funcao()  # Aquece o cache
+        resultados[nome] = _medir(funcao, repeticoes, preparar=None if usa_cache else database.limpar_cache_leituras)
+        print(f"{nome:<45} mediana {resultados[nome]['mediana_ms']:>10.3f} ms | p95 {resultados[nome]['p95_ms']:>10.3f} ms")
+    return resultados
+
+# --- VERIFICAÇÃO DO MOTOR DE RENTABILIDADE ---
+def _totais_referencia(conn, venda_id, config):
+    """Cálculo original de calculate_venda_totals: consultas e aritmética escalar para uma venda."""
+    venda = pd.read_sql_query("SELECT * FROM vendas WHERE id = ?", conn, params=(venda_id,)).iloc[0]
+    custo = pd.read_sql_query("SELECT * FROM custos WHERE venda_id = ?", conn, params=(venda_id,))
+    plano_recebimentos = pd.read_sql_query("SELECT * FROM plano_recebimentos WHERE venda_id = ?", conn, params=(venda_id,))
+    pagamentos_custos = pd.read_sql_query("SELECT * FROM pagamentos_custos WHERE venda_id = ?", conn, params=(venda_id,))
+    despesas_pagas = pd.read_sql_query("SELECT * FROM despesas_pagas WHERE venda_id = ?", conn, params=(venda_id,))
+
+    custo_mcpf = custo['custo_mcpf'].sum()
+    custo_madeireira = custo['custo_madeireira'].sum()
+    custo_total = custo_mcpf + custo_madeireira
+    pagamentos_mcpf = pagamentos_custos[pagamentos_custos['tipo_fornecedor'] == 'MCPF']['valor'].sum()
+    pagamentos_madeireira = pagamentos_custos[pagamentos_custos['tipo_fornecedor'] == 'Madeireira']['valor'].sum()
+    custo_pago = pagamentos_mcpf + pagamentos_madeireira
+    # Chaves fixas, como no cálculo original (não derivadas de DESPESAS): mudança de regra no motor aparece como divergência
+    despesas_detalhadas = {
+        'royalties': venda['valor_venda'] * config.get('royalties', 0),
+        'propaganda': venda['valor_venda'] * config.get('propaganda', 0),
+        'simples': venda['valor_venda'] * config.get('simples', 0),
+        'corretagem': venda['valor_venda'] * config.get('corretagem', 0),
+        'admin': venda['valor_venda'] * config.get('admin', 0),
+        'icms': custo_total * config.get('icms', 0)
+    }
+    despesas_total_calculado = sum(despesas_detalhadas.values())
+    total_recebido = plano_recebimentos['valor_pago'].sum()
+    total_despesas_pagas = despesas_pagas['valor'].sum()
+    lucro_bruto = venda['valor_venda'] - custo_total
+    return {
+        'custo_total': custo_total, 'custo_pago': custo_pago, 'custo_pendente': custo_total - custo_pago,
+        'custo_mcpf': custo_mcpf, 'pagamentos_mcpf': pagamentos_mcpf,
+        'custo_madeireira': custo_madeireira, 'pagamentos_madeireira': pagamentos_madeireira,
+        'despesas_detalhadas': despesas_detalhadas, 'despesas_total_calculado': despesas_total_calculado,
+        'pagamentos_despesa_por_tipo': despesas_pagas.groupby('tipo_despesa')['valor'].sum().to_dict(),
+        'total_recebido': total_recebido, 'saldo_a_receber': venda['valor_venda'] - total_recebido,
+        'total_despesas_pagas': total_despesas_pagas, 'saldo_despesas_a_pagar': despesas_total_calculado - total_despesas_pagas,
+        'lucro_bruto': lucro_bruto, 'lucro_liquido': lucro_bruto - despesas_total_calculado,
+    }
+
+def _diferenca(esperado, obtido):
+    if isinstance(esperado, dict):
+        chaves = set(esperado) | set(obtido)
+        return max((abs(esperado.get(chave, 0) - obtido.get(chave, 0)) for chave in chaves), default=0.0)
+    return abs(esperado - obtido)
+
+def verificar(amostra=200, semente=7):
+    """Compara o motor de rentabilidade com o cálculo venda a venda e os totais globais (venda_resumo)
+    com a soma do motor. `amostra` vendas sorteadas (0 = todas). Retorna a lista de divergências."""
+    database.limpar_cache_leituras()
+    totais = calculations.calculate_many_venda_totals().set_index('id', drop=False)
+    ids = totais['id'].tolist()
+    if amostra and amostra < len(ids):
+        ids = random.Random(semente).sample(ids, amostra)
+    config = database.get_config()
+    divergencias = []
+    with database.pooled_connection() as conn:
+        for venda_id in ids:
+            esperado = _totais_referencia(conn, venda_id, config)
+            linha = totais.loc[venda_id]
+            for campo in calculations.CAMPOS_TOTAIS:
+                diferenca = _diferenca(esperado[campo], linha[campo])
+                if diferenca > database.TOLERANCIA_DIVERGENCIA:
+                    divergencias.append({'venda_id': venda_id, 'campo': campo, 'diferenca': diferenca})
+    globais_motor = rentabilidade.calcular_totais_globais(rentabilidade.agregar_totais(totais), calculations.calculate_global_totals()['total_saldo_bancario'])
+    for campo, valor in calculations.calculate_global_totals().items():
+        # Somas de milhares de vendas: tolerância de meio centavo por venda
+        if abs(valor - globais_motor[campo]) > database.TOLERANCIA_DIVERGENCIA * max(len(totais), 1):
+            divergencias.append({'venda_id': None, 'campo': campo, 'diferenca': abs(valor - globais_motor[campo])})
+    print(f"{len(ids)} venda(s) conferidas campo a campo, {len(totais)} nos totais globais: {len(divergencias)} divergência(s)")
+    return divergencias
+
+def _versao_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def comparar(atual, anterior, tolerancia=TOLERANCIA_REGRESSAO):
+    """Lista as operações cuja mediana piorou mais que `tolerancia` em relação à execução anterior."""
+    regressoes = []
+    for nome, medida in atual['resultados'].items():
+        referencia = anterior.get('resultados', {}).get(nome)
+        if not referencia or referencia['mediana_ms'] <= 0:
+            continue
+        variacao = medida['mediana_ms'] / referencia['mediana_ms'] - 1
+        print(f"{nome:<45} {referencia['mediana_ms']:>10.3f} -> {medida['mediana_ms']:>10.3f} ms ({variacao:+.1%})")
+        if variacao > tolerancia:
+            regressoes.append({'operacao': nome, 'anterior_ms': referencia['mediana_ms'], 'atual_ms': medida['mediana_ms'], 'variacao': round(variacao, 4)})
+    return regressoes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o desempenho das consultas, cálculos e recibos em um banco sintético.")
+    parser.add_argument("--banco", default="benchmark.db", help="Banco usado na medição (gerado se não existir ou com --gerar)")
+    parser.add_argument("--gerar", action="store_true", help="Gera o banco de novo mesmo que ele já exista")
+    parser.add_argument("--vendas", type=int, default=10000, help="Vendas do banco gerado")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    parser.add_argument("--saida", help="Arquivo JSON com o resultado")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior: aponta regressões e sai com código 1")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO, help="Piora relativa aceita na comparação (0.2 = 20%%)")
+    parser.add_argument("--verificar", type=int, nargs="?", const=200, help="Só confere o motor de rentabilidade contra o cálculo venda a venda em N vendas (0 = todas) e sai com código 1 se divergir")
+    args = parser.parse_args()
+    if os.path.abspath(args.banco) == os.path.abspath(database.DB_NAME):
+        parser.error("Use outro arquivo: o benchmark pode substituir o banco informado.")
+
+    if args.gerar or not os.path.exists(args.banco):
+        print(f"Gerando {args.banco} com {args.vendas} vendas...")
+        linhas = gerar_dados.gerar_banco(args.banco, vendas=args.vendas)
+    else:
+        database.DB_NAME = args.banco
+        database.migrate_db()
+        linhas = {tabela: int(database.get_data_as_dataframe(f"SELECT COUNT(*) AS n FROM {tabela}", usar_cache=False)['n'].iloc[0])
+                  for tabela in ('contas_bancarias', 'vendas', 'plano_recebimentos', 'pagamentos_custos', 'despesas_pagas', 'transacoes_bancarias')}
+
+    if args.verificar is not None:
+        divergencias = verificar(args.verificar)
+        for divergencia in divergencias[:20]:
+            print(f"  venda {divergencia['venda_id']}: {divergencia['campo']} difere em {divergencia['diferenca']:.4f}")
+        sys.exit(1 if divergencias else 0)
+
+    resultado = {
+        'executado_em': datetime.now().isoformat(timespec='seconds'),
+        'codigo': _versao_codigo(),
+        'ambiente': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'plataforma': platform.platform(), 'cpus': os.cpu_count()},
+        'banco': {'arquivo': os.path.basename(args.banco), 'linhas': linhas},
+        'resultados': executar(args.repeticoes),
+    }
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"Resultado gravado em {args.saida}")
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        if anterior.get('banco', {}).get('linhas') != linhas:
+            print("AVISO: a execução anterior usou um banco com outra quantidade de linhas; a comparação pode não ser justa.")
+        regressoes = comparar(resultado, anterior, args.tolerancia)
+        if regressoes:
+            print(f"{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}:")
+            for regressao in regressoes:
+                print(f"  {regressao['operacao']}: {regressao['anterior_ms']} -> {regressao['atual_ms']} ms")
+            sys.exit(1)
+        print("Nenhuma regressão encontrada.")
@@ -0,0 +1,49 @@
+# benchmark_pdf.py (Micro-benchmark da geração de recibos em PDF)
+# Uso: python benchmark_pdf.py [--quantidades 1 100 10000] [--parcelas 120]
+import argparse
+import re
+import time
+import pdf_generator
+from pdf_generator import gerar_recibo_venda
+
+def dados_sinteticos(venda_id, parcelas):
+    """Um recibo com histórico longo: `parcelas` pagamentos confirmados (várias páginas de tabela)."""
+    return {
+        'id': venda_id, 'cliente': f'Cliente Benchmark {venda_id}', 'telefone': '(71) 99999-0000',
+        'email': f'cliente{venda_id}@exemplo.com', 'data_venda': '15/03/2025', 'nome_kit': 'Kit Chalé 48m²',
+        'valor_venda': 150000.0, 'valor_frete': 3500.0,
+        'pagamentos': [
+            {'status': 'Pago', 'data_pagamento': f'{(i % 28) + 1:02d}/{(i % 12) + 1:02d}/2025',
+             'forma_pagamento': ('PIX', 'Boleto', 'Transferência')[i % 3], 'valor_pago': 1000.0 + i}
+            for i in range(parcelas)
+        ],
+    }
+
+def contar_paginas(pdf_bytes):
+    return len(re.findall(rb'/Type\s*/Page\b', pdf_bytes))
+
+def medir(quantidade, parcelas):
+    inicio = time.perf_counter()
+    paginas = 0
+    for venda_id in range(1, quantidade + 1):
+        paginas += contar_paginas(gerar_recibo_venda(dados_sinteticos(venda_id, parcelas)))
+    duracao = time.perf_counter() - inicio
+    return duracao, paginas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede recibos por segundo de gerar_recibo_venda.")
+    parser.add_argument("--quantidades", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--parcelas", type=int, default=120, help="Pagamentos no histórico de cada recibo")
+    args = parser.parse_args()
+
+    # Conferência das quebras de página: a tabela do histórico precisa continuar nas páginas seguintes
+    recibo = gerar_recibo_venda(dados_sinteticos(1, args.parcelas))
+    print(f"Recibo com {args.parcelas} parcelas: {contar_paginas(recibo)} página(s), {len(recibo) / 1024:.1f} KB")
+
+    # A primeira chamada já decodificou o logo; este recibo mede só o custo de um documento novo
+    print(f"{'Recibos':>8} | {'Tempo (s)':>10} | {'Recibos/s':>10} | {'Páginas':>8}")
+    for quantidade in args.quantidades:
+        duracao, paginas = medir(quantidade, args.parcelas)
+        print(f"{quantidade:>8} | {duracao:>10.3f} | {quantidade / duracao:>10.1f} | {paginas:>8}")
+    logo = pdf_generator._logo()
+    print(f"Logo pré-carregado: {'sim' if logo and logo[1] is not None else 'não (bytes pela API pública)' if logo else 'não (logo.png ausente)'}")
@@ -1,157 +1,189 @@
 # calculations.py (Versão com a importação corrigida)
+import json
+from datetime import date, timedelta
 import pandas as pd
 # A CORREÇÃO ESTÁ AQUI: Adicionamos a função que faltava na linha de importação
-from database import get_data_as_dataframe, get_config, get_total_saldo_bancario
+from database import pooled_connection, ler_com_cache, ler_dataframe, consultar
+from rentabilidade import calcular_totais_vendas, calcular_totais_globais, montar_fluxo_caixa
+from perf import medir
 
 def calculate_venda_totals(venda_id):
     """Calcula todos os totais para uma única venda."""
-    venda = get_data_as_dataframe("SELECT * FROM vendas WHERE id = ?", (venda_id,)).iloc[0]
-    custo = get_data_as_dataframe("SELECT * FROM custos WHERE venda_id = ?", (venda_id,)).iloc[0]
-    plano_recebimentos = get_data_as_dataframe("SELECT * FROM plano_recebimentos WHERE venda_id = ?", (venda_id,))
-    pagamentos_custos = get_data_as_dataframe("SELECT * FROM pagamentos_custos WHERE venda_id = ?", (venda_id,))
-    despesas_pagas = get_data_as_dataframe("SELECT * FROM despesas_pagas WHERE venda_id = ?", (venda_id,))
-    config = get_config()
-
-    custo_total = custo['custo_mcpf'] + custo['custo_madeireira']
-    pagamentos_mcpf = pagamentos_custos[pagamentos_custos['tipo_fornecedor'] == 'MCPF']['valor'].sum()
-    pagamentos_madeireira = pagamentos_custos[pagamentos_custos['tipo_fornecedor'] == 'Madeireira']['valor'].sum()
-    custo_pago = pagamentos_mcpf + pagamentos_madeireira
-    custo_pendente = custo_total - custo_pago
-
-    despesas_detalhadas = {
-        'royalties': venda['valor_venda'] * config.get('royalties', 0),
-        'propaganda': venda['valor_venda'] * config.get('propaganda', 0),
-        'simples': venda['valor_venda'] * config.get('simples', 0),
-        'corretagem': venda['valor_venda'] * config.get('corretagem', 0),
-        'admin': venda['valor_venda'] * config.get('admin', 0),
-        'icms': custo_total * config.get('icms', 0)
-    }
-    despesas_total_calculado = sum(despesas_detalhadas.values())
-    
-    total_recebido = plano_recebimentos['valor_pago'].sum()
-    saldo_a_receber = venda['valor_venda'] - total_recebido
-
-    pagamentos_despesa_por_tipo = despesas_pagas.groupby('tipo_despesa')['valor'].sum().to_dict()
-    total_despesas_pagas = despesas_pagas['valor'].sum()
-    saldo_despesas_a_pagar = despesas_total_calculado - total_despesas_pagas
-
-    lucro_bruto = venda['valor_venda'] - custo_total
-    lucro_liquido = lucro_bruto - despesas_total_calculado
-    
-    return {
-        'venda': venda, 'custo_total': custo_total, 'custo_pago': custo_pago, 'custo_pendente': custo_pendente,
-        'custo_mcpf': custo['custo_mcpf'], 'pagamentos_mcpf': pagamentos_mcpf,
-        'custo_madeireira': custo['custo_madeireira'], 'pagamentos_madeireira': pagamentos_madeireira,
-        'despesas_detalhadas': despesas_detalhadas, 'despesas_total_calculado': despesas_total_calculado,
-        'pagamentos_despesa_por_tipo': pagamentos_despesa_por_tipo,
-        'total_recebido': total_recebido, 'saldo_a_receber': saldo_a_receber,
-        'total_despesas_pagas': total_despesas_pagas, 'saldo_despesas_a_pagar': saldo_despesas_a_pagar,
-        'lucro_bruto': lucro_bruto, 'lucro_liquido': lucro_liquido
-    }
-
-# calculations.py (substitua a função calculate_global_totals)
+    totais_df = calculate_many_venda_totals([venda_id])
+    linha = totais_df.iloc[0]  # IndexError se a venda não existir, como antes
+    totals = {campo: linha[campo] for campo in CAMPOS_TOTAIS}
+    totals['venda'] = linha[totais_df.attrs['colunas_venda']]
+    return totals
+
+# --- TOTAIS POR VENDA EM LOTE ---
+# Campos produzidos por venda (além das colunas da própria tabela vendas)
+CAMPOS_TOTAIS = [
+    'custo_total', 'custo_pago', 'custo_pendente', 'custo_mcpf', 'pagamentos_mcpf',
+    'custo_madeireira', 'pagamentos_madeireira', 'despesas_detalhadas', 'despesas_total_calculado',
+    'pagamentos_despesa_por_tipo', 'total_recebido', 'saldo_a_receber',
+    'total_despesas_pagas', 'saldo_despesas_a_pagar', 'lucro_bruto', 'lucro_liquido'
+]
+
+def calculate_many_venda_totals(venda_ids=None, filtro=None, params=()):
+    """Calcula os totais de várias vendas de uma vez, com um número fixo de consultas.
+
+    Recebe uma lista de IDs de venda e/ou um filtro SQL sobre a tabela vendas (alias `v`,
+    ex.: "v.data_venda >= ?") com seus parâmetros. Retorna um DataFrame com uma linha por venda
+    contendo as colunas de `vendas` e todos os campos de calculate_venda_totals.
+    O resultado fica no cache de leituras até a próxima escrita no banco.
+    """
+    ids = None if venda_ids is None else tuple(int(i) for i in venda_ids)
+    return ler_com_cache(('totais_vendas', ids, filtro, tuple(params)), lambda: _calcula_totais_vendas(ids, filtro, params))
+
+def _calcula_totais_vendas(venda_ids, filtro, params):
+    condicoes, parametros = [], []
+    if venda_ids is not None:
+        # Um único parâmetro JSON, independente da quantidade de IDs (sem limite de variáveis do SQLite)
+        condicoes.append("v.id IN (SELECT value FROM json_each(?))")
+        parametros.append(json.dumps(list(venda_ids)))
+    if filtro:
+        condicoes.append(f"({filtro})")
+        parametros.extend(params)
+    where = " AND ".join(condicoes) if condicoes else "1 = 1"
+    ids_filtrados = f"SELECT v.id FROM vendas v WHERE {where}"
+
+    with pooled_connection() as conn:
+        conn.execute("BEGIN;")  # Todas as consultas leem o mesmo estado do banco
+        vendas = ler_dataframe(conn, f"SELECT v.* FROM vendas v WHERE {where} ORDER BY v.id DESC", parametros)
+        # Linhas filhas já somadas por venda no SQL (índices de cobertura por venda_id); o motor soma de novo sem custo
+        custos = ler_dataframe(conn, f"SELECT venda_id, custo_mcpf, custo_madeireira FROM custos WHERE venda_id IN ({ids_filtrados})", parametros)
+        recebimentos = ler_dataframe(conn, f"""
+            SELECT venda_id, TOTAL(valor_pago) AS valor_pago FROM plano_recebimentos
+            WHERE venda_id IN ({ids_filtrados}) GROUP BY venda_id""", parametros)
+        pagamentos = ler_dataframe(conn, f"""
+            SELECT venda_id, tipo_fornecedor, TOTAL(valor) AS valor FROM pagamentos_custos
+            WHERE venda_id IN ({ids_filtrados}) GROUP BY venda_id, tipo_fornecedor""", parametros)
+        despesas = ler_dataframe(conn, f"""
+            SELECT venda_id, tipo_despesa, TOTAL(valor) AS valor FROM despesas_pagas
+            WHERE venda_id IN ({ids_filtrados}) GROUP BY venda_id, tipo_despesa""", parametros)
+        config = {row['chave']: row['valor'] for row in consultar(conn, "SELECT chave, valor FROM configuracoes")}
+        conn.rollback()
+
+    with medir('pandas'):
+        return calcular_totais_vendas(vendas, custos, recebimentos, pagamentos, despesas, config)
+
+# --- TOTAIS GLOBAIS (MOTOR BASEADO EM CONJUNTOS) ---
+# Em vez de chamar calculate_venda_totals para cada venda (6 conexões por venda), os totais do
+# Dashboard saem de uma única soma sobre venda_resumo (mantida por triggers, uma linha por venda),
+# executada em uma única conexão e transação de leitura (snapshot consistente). As fórmulas dos
+# indicadores ficam no motor (rentabilidade.calcular_totais_globais).
+SQL_TOTAIS_GLOBAIS = """
+    SELECT
+        TOTAL(valor_venda) AS total_vendas,
+        TOTAL(custo_total) AS total_custos,
+        TOTAL(custo_pago) AS custo_pago,
+        TOTAL(total_recebido) AS total_recebido,
+        TOTAL(total_despesas_pagas) AS total_despesas_pagas,
+        TOTAL(despesas_total_calculado) AS total_despesas
+    FROM venda_resumo
+"""
 
 def calculate_global_totals():
-    vendas_df = get_data_as_dataframe("SELECT * FROM vendas")
-    total_saldo_bancario = get_total_saldo_bancario()
-
-    if vendas_df.empty:
-        base_dict = {key: 0 for key in [
-            'total_vendas', 'total_recebido', 'total_a_receber', 'total_custos', 
-            'total_despesas', 'lucro_bruto', 'lucro_liquido', 'percentual_lucro',
-            'creditos_realizado', 'creditos_pendente', 'debitos_pago_custos', 
-            'debitos_pago_despesas', 'total_pago_geral', 'debitos_pendente_custos', 
-            'debitos_pendente_despesas', 'total_a_pagar_geral', 'saldo_realizado', 'balanco_futuro'
-        ]}
-        base_dict['total_saldo_bancario'] = total_saldo_bancario
-        return base_dict
-        
-    all_totals = [calculate_venda_totals(venda_id) for venda_id in vendas_df['id']]
-
-    total_vendas = vendas_df['valor_venda'].sum()
-    total_custos = sum(t['custo_total'] for t in all_totals)
-    total_despesas = sum(t['despesas_total_calculado'] for t in all_totals)
-    lucro_bruto = total_vendas - total_custos
-    lucro_liquido = lucro_bruto - total_despesas
-    percentual_lucro = (lucro_liquido / total_vendas) * 100 if total_vendas > 0 else 0
-
-    creditos_realizado = sum(t['total_recebido'] for t in all_totals)
-    creditos_pendente = total_vendas - creditos_realizado
-
-    debitos_pago_custos = sum(t['custo_pago'] for t in all_totals)
-    debitos_pago_despesas = sum(t['total_despesas_pagas'] for t in all_totals)
-    total_pago_geral = debitos_pago_custos + debitos_pago_despesas
-    
-    debitos_pendente_custos = total_custos - debitos_pago_custos
-    debitos_pendente_despesas = total_despesas - debitos_pago_despesas
-    total_a_pagar_geral = debitos_pendente_custos + debitos_pendente_despesas
-
-    # --- NOVOS CÁLCULOS AGREGADOS ---
-    total_disponivel = total_saldo_bancario + creditos_pendente
-    provisao_saldo_final = total_disponivel - total_a_pagar_geral
-
-    return {
-        'total_vendas': total_vendas, 'total_recebido': creditos_realizado, 'total_a_receber': creditos_pendente,
-        'total_custos': total_custos, 'total_despesas': total_despesas, 'lucro_bruto': lucro_bruto,
-        'lucro_liquido': lucro_liquido, 'percentual_lucro': percentual_lucro,
-        'total_saldo_bancario': total_saldo_bancario,
-        'creditos_realizado': creditos_realizado, 'creditos_pendente': creditos_pendente,
-        'debitos_pago_custos': debitos_pago_custos, 'debitos_pago_despesas': debitos_pago_despesas,
-        'total_pago_geral': total_pago_geral,
-        'debitos_pendente_custos': debitos_pendente_custos,
-        'debitos_pendente_despesas': debitos_pendente_despesas,
-        'total_a_pagar_geral': total_a_pagar_geral,
-        'saldo_realizado': creditos_realizado - total_pago_geral,
-        'balanco_futuro': creditos_pendente - total_a_pagar_geral,
-        
-        # Novas chaves para o dashboard estratégico
-        'total_disponivel': total_disponivel,
-        'provisao_saldo_final': provisao_saldo_final
-    }
-        
-    all_totals = [calculate_venda_totals(venda_id) for venda_id in vendas_df['id']]
-
-    total_vendas = vendas_df['valor_venda'].sum()
-    total_custos = sum(t['custo_total'] for t in all_totals)
-    total_despesas = sum(t['despesas_total_calculado'] for t in all_totals)
-    
-    lucro_bruto = total_vendas - total_custos
-    lucro_liquido = lucro_bruto - total_despesas
-    percentual_lucro = (lucro_liquido / total_vendas) * 100 if total_vendas > 0 else 0
-
-    creditos_realizado = sum(t['total_recebido'] for t in all_totals)
-    creditos_pendente = total_vendas - creditos_realizado
-
-    debitos_pago_custos = sum(t['custo_pago'] for t in all_totals)
-    debitos_pago_despesas = sum(t['total_despesas_pagas'] for t in all_totals)
-    total_pago_geral = debitos_pago_custos + debitos_pago_despesas
-    
-    debitos_pendente_custos = total_custos - debitos_pago_custos
-    debitos_pendente_despesas = total_despesas - debitos_pago_despesas
-    total_a_pagar_geral = debitos_pendente_custos + debitos_pendente_despesas
-
-    return {
-        'total_vendas': total_vendas,
-        'total_recebido': creditos_realizado,
-        'total_a_receber': creditos_pendente,
-        'total_custos': total_custos,
-        'total_despesas': total_despesas,
-        'lucro_bruto': lucro_bruto,
-        'lucro_liquido': lucro_liquido,
-        'percentual_lucro': percentual_lucro,
-        'total_saldo_bancario': total_saldo_bancario,
-        
-        'creditos_realizado': creditos_realizado,
-        'creditos_pendente': creditos_pendente,
-        
-        'debitos_pago_custos': debitos_pago_custos,
-        'debitos_pago_despesas': debitos_pago_despesas,
-        'total_pago_geral': total_pago_geral,
-
-        'debitos_pendente_custos': debitos_pendente_custos,
-        'debitos_pendente_despesas': debitos_pendente_despesas,
-        'total_a_pagar_geral': total_a_pagar_geral,
-
-        'saldo_realizado': creditos_realizado - total_pago_geral,
-        'balanco_futuro': creditos_pendente - total_a_pagar_geral
-    }
\ No newline at end of file
+    return ler_com_cache(('totais_globais',), _calcula_totais_globais)
+
+def _calcula_totais_globais():
+    with pooled_connection() as conn:
+        conn.execute("BEGIN;")  # Transação de leitura: todas as agregações veem o mesmo estado do banco
+        agregados = consultar(conn, SQL_TOTAIS_GLOBAIS)[0]
+        total_saldo_bancario = consultar(conn, "SELECT TOTAL(saldo_atual) FROM contas_bancarias")[0][0]
+        conn.rollback()
+
+    return calcular_totais_globais(dict(agregados), total_saldo_bancario)
+
+# --- FLUXO DE CAIXA MENSAL ---
+# Três somas agrupadas por mês, servidas por índices (idx_transacoes_data e o parcial
+# idx_plano_recebimentos_pendentes). Parcelas vencidas e ainda pendentes entram no mês atual. Custos e
+# despesas a pagar não têm vencimento: ficam no mês da próxima parcela pendente da venda (o pagamento
+# acompanha o recebimento) ou, sem parcela pendente, no mês atual.
+SQL_FLUXO_REALIZADO = """
+    SELECT substr(data, 1, 7) AS mes,
+           TOTAL(CASE WHEN tipo = 'Entrada' THEN valor END) AS entradas,
+           TOTAL(CASE WHEN tipo = 'Entrada' THEN NULL ELSE valor END) AS saidas
+    FROM transacoes_bancarias WHERE data >= ? GROUP BY mes
+"""
+SQL_FLUXO_A_RECEBER = """
+    SELECT MAX(COALESCE(substr(data_vencimento, 1, 7), ?), ?) AS mes,
+           TOTAL(valor_previsto - COALESCE(valor_pago, 0)) AS a_receber
+    FROM plano_recebimentos WHERE status <> 'Pago' GROUP BY 1
+"""
+SQL_FLUXO_A_PAGAR = """
+    SELECT MAX(COALESCE(substr(p.proxima_parcela, 1, 7), ?), ?) AS mes,
+           TOTAL(MAX(r.custo_total - r.custo_pago, 0)) AS custos_a_pagar,
+           TOTAL(MAX(r.despesas_total_calculado - r.total_despesas_pagas, 0)) AS despesas_a_pagar
+    FROM venda_resumo r
+    LEFT JOIN (SELECT venda_id, MIN(data_vencimento) AS proxima_parcela FROM plano_recebimentos
+               WHERE status <> 'Pago' GROUP BY venda_id) p ON p.venda_id = r.venda_id
+    GROUP BY 1
+"""
+
+def calculate_fluxo_caixa_mensal(meses_passados=6, meses_futuros=24, hoje=None):
+    """Fluxo de caixa por mês: extrato realizado, parcelas a receber e custos/despesas a pagar projetados,
+    com o saldo estimado no fim de cada mês. Fica no cache de leituras até a próxima escrita."""
+    mes_atual = (hoje or date.today()).strftime('%Y-%m')
+    return ler_com_cache(('fluxo_caixa', mes_atual, meses_passados, meses_futuros),
+                         lambda: _calcula_fluxo_caixa(mes_atual, meses_passados, meses_futuros))
+
+def _calcula_fluxo_caixa(mes_atual, meses_passados, meses_futuros):
+    inicio = (pd.Period(mes_atual, freq='M') - meses_passados).strftime('%Y-%m-01')
+    with pooled_connection() as conn:
+        conn.execute("BEGIN;")  # Extrato, parcelas e resumo lidos no mesmo estado do banco
+        realizado = ler_dataframe(conn, SQL_FLUXO_REALIZADO, (inicio,))
+        a_receber = ler_dataframe(conn, SQL_FLUXO_A_RECEBER, (mes_atual, mes_atual))
+        a_pagar = ler_dataframe(conn, SQL_FLUXO_A_PAGAR, (mes_atual, mes_atual))
+        saldo_atual = consultar(conn, "SELECT TOTAL(saldo_atual) FROM contas_bancarias")[0][0]
+        conn.rollback()
+    with medir('pandas'):
+        return montar_fluxo_caixa(realizado, a_receber, a_pagar, saldo_atual, mes_atual, meses_passados, meses_futuros)
+
+# --- TOTAIS POR PERÍODO (COM COMPARAÇÃO AO PERÍODO ANTERIOR) ---
+# Uma única consulta: cada tabela é lida uma vez no intervalo [início do período anterior, fim do atual)
+# pelo índice da sua coluna de data, e o CASE separa o que é do período atual (data >= ?2) do anterior.
+def _soma_periodos(nome, expressao, coluna_data):
+    return (f"TOTAL(CASE WHEN {coluna_data} >= ?2 THEN {expressao} END) AS {nome}, "
+            f"TOTAL(CASE WHEN {coluna_data} < ?2 THEN {expressao} END) AS {nome}_anterior")
+
+SQL_TOTAIS_PERIODO = f"""
+    SELECT * FROM
+        (SELECT {_soma_periodos('vendas_qtd', '1', 'v.data_venda')},
+                {_soma_periodos('vendas_valor', 'r.valor_venda', 'v.data_venda')},
+                {_soma_periodos('custos', 'r.custo_total', 'v.data_venda')},
+                {_soma_periodos('despesas', 'r.despesas_total_calculado', 'v.data_venda')},
+                {_soma_periodos('lucro_liquido', 'r.valor_venda - r.custo_total - r.despesas_total_calculado', 'v.data_venda')}
+         FROM vendas v JOIN venda_resumo r ON r.venda_id = v.id
+         WHERE v.data_venda >= ?1 AND v.data_venda < ?3),
+        (SELECT {_soma_periodos('recebido', 'valor_pago', 'data_pagamento')}
+         FROM plano_recebimentos WHERE data_pagamento >= ?1 AND data_pagamento < ?3),
+        (SELECT {_soma_periodos('vencimentos', 'valor_previsto', 'data_vencimento')},
+                {_soma_periodos('vencimentos_pendentes', "CASE WHEN status <> 'Pago' THEN valor_previsto - COALESCE(valor_pago, 0) END", 'data_vencimento')}
+         FROM plano_recebimentos WHERE data_vencimento >= ?1 AND data_vencimento < ?3),
+        (SELECT {_soma_periodos('entradas', "CASE WHEN tipo = 'Entrada' THEN valor END", 'data')},
+                {_soma_periodos('saidas', "CASE WHEN tipo = 'Entrada' THEN NULL ELSE valor END", 'data')}
+         FROM transacoes_bancarias WHERE data >= ?1 AND data < ?3)
+"""
+METRICAS_PERIODO = ['vendas_qtd', 'vendas_valor', 'custos', 'despesas', 'lucro_liquido', 'recebido', 'vencimentos', 'vencimentos_pendentes', 'entradas', 'saidas']
+TIPOS_PERIODO = {'Mês': 'M', 'Trimestre': 'Q', 'Ano': 'Y'}
+
+def intervalo_periodo(tipo, referencia):
+    """Mês, trimestre ou ano que contém `referencia`: (início, fim, início do período anterior), datas inclusivas."""
+    periodo = pd.Period(referencia, freq=TIPOS_PERIODO[tipo])
+    return periodo.start_time.date(), periodo.end_time.date(), (periodo - 1).start_time.date()
+
+def calculate_totais_periodo(inicio, fim, inicio_anterior=None):
+    """Totais de vendas (por data_venda), recebimentos (data_pagamento), parcelas (data_vencimento) e extrato
+    (data) entre `inicio` e `fim` (inclusive), com as mesmas somas do período anterior em chaves *_anterior.
+
+    O período anterior vai de `inicio_anterior` até a véspera de `inicio`; por padrão tem o mesmo número de dias.
+    """
+    inicio_anterior = inicio_anterior or inicio - (fim - inicio) - timedelta(days=1)
+    # Fim exclusivo: datas com hora ('AAAA-MM-DD HH:MM') do último dia também entram
+    limites = (inicio_anterior.isoformat(), inicio.isoformat(), (fim + timedelta(days=1)).isoformat())
+    return ler_com_cache(('totais_periodo',) + limites, lambda: _calcula_totais_periodo(limites))
+
+def _calcula_totais_periodo(limites):
+    with pooled_connection() as conn:
+        return dict(consultar(conn, SQL_TOTAIS_PERIODO, limites)[0])
@@ -1,57 +1,918 @@
 # database.py (Versão Definitiva com Função Dinâmica)
+import functools
+import os
+import queue
+import random
 import sqlite3
+import sys
+import threading
+import time
 import pandas as pd
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
 from datetime import datetime
 
 DB_NAME = "financeiro.db"
 
+# Despesas calculadas como percentual (tabela configuracoes): as de DESPESAS_SOBRE_VENDA incidem sobre o
+# valor da venda e as de DESPESAS_SOBRE_CUSTO sobre o custo total. DESPESAS é a lista completa, na ordem
+# de exibição, usada pelo motor (rentabilidade.py), pelos triggers de venda_resumo e pela importação;
+# outras chaves que existam em configuracoes não entram no cálculo.
+DESPESAS_SOBRE_VENDA = ('royalties', 'propaganda', 'simples', 'corretagem', 'admin')
+DESPESAS_SOBRE_CUSTO = ('icms',)
+DESPESAS = DESPESAS_SOBRE_VENDA + DESPESAS_SOBRE_CUSTO
+STATUS_ENTREGA = ('Aguardando', 'Em Transporte', 'Entregue')
+
+# --- POOL DE CONEXÕES ---
+# Cada helper pega uma conexão já aberta e configurada do pool e a devolve no final,
+# em vez de abrir/fechar o arquivo (e reaplicar os PRAGMAs) a cada consulta.
+POOL_MAX_CONEXOES_OCIOSAS = 8
+CACHE_DE_STATEMENTS = 256  # sqlite3 guarda os statements já compilados por conexão
+PRAGMAS_CONEXAO = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA busy_timeout = 5000;",
+    "PRAGMA synchronous = NORMAL;",  # Seguro com WAL e bem mais rápido que FULL
+    "PRAGMA cache_size = -16000;",  # ~16 MB de cache de páginas por conexão
+    "PRAGMA mmap_size = 268435456;",  # Até 256 MB do arquivo mapeados em memória
+    "PRAGMA temp_store = MEMORY;",
+)
+
+_pools = {}  # Um pool por arquivo de banco (DB_NAME pode ser trocado em scripts)
+_pools_lock = threading.Lock()
+# Pausa do pool (restauração de backup): enquanto pausado, ninguém pega conexão nova, nem uma thread
+# que já tem outra emprestada, e quem pausou espera as emprestadas voltarem. Uma thread que pede uma
+# segunda conexão durante a pausa fica parada até ela acabar; a pausa, sem essa conexão de volta,
+# desiste no limite de tempo e nada é restaurado.
+_pool_condicao = threading.Condition()
+_pool_pausado = False
+_conexoes_emprestadas = 0
+
 def connect_db():
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    """Abre uma nova conexão com WAL e os PRAGMAs de desempenho aplicados."""
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, timeout=5.0, cached_statements=CACHE_DE_STATEMENTS)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL;")  # Leitores não bloqueiam o escritor (fica gravado no arquivo)
+    for pragma in PRAGMAS_CONEXAO:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS contas_bancarias (id INTEGER PRIMARY KEY AUTOINCREMENT, nome_banco TEXT NOT NULL, agencia TEXT, conta TEXT, saldo_inicial REAL DEFAULT 0, data_criacao TEXT NOT NULL);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS transacoes_bancarias (id INTEGER PRIMARY KEY AUTOINCREMENT, conta_id INTEGER NOT NULL, data TEXT NOT NULL, tipo TEXT NOT NULL, descricao TEXT NOT NULL, valor REAL NOT NULL, venda_id INTEGER, plano_recebimento_id INTEGER, FOREIGN KEY (conta_id) REFERENCES contas_bancarias(id) ON DELETE CASCADE, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE SET NULL, FOREIGN KEY (plano_recebimento_id) REFERENCES plano_recebimentos(id) ON DELETE SET NULL);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS vendas (id INTEGER PRIMARY KEY AUTOINCREMENT, cliente TEXT NOT NULL, telefone TEXT, email TEXT, data_venda TEXT NOT NULL, nome_kit TEXT NOT NULL, valor_venda REAL NOT NULL, valor_frete REAL DEFAULT 0);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS custos (venda_id INTEGER PRIMARY KEY, custo_mcpf REAL DEFAULT 0, custo_madeireira REAL DEFAULT 0, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS plano_recebimentos (id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER NOT NULL, descricao TEXT NOT NULL, valor_previsto REAL NOT NULL, data_vencimento TEXT, status TEXT DEFAULT 'Pendente', valor_pago REAL, data_pagamento TEXT, forma_pagamento TEXT, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS pagamentos_custos (id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER NOT NULL, tipo_fornecedor TEXT NOT NULL, valor REAL NOT NULL, data_pagamento TEXT NOT NULL, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS despesas_pagas (id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER NOT NULL, tipo_despesa TEXT NOT NULL, valor REAL NOT NULL, data_pagamento TEXT NOT NULL, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS entregas (venda_id INTEGER PRIMARY KEY, status_entrega TEXT DEFAULT 'Aguardando', endereco_entrega TEXT, data_entrega TEXT, observacoes TEXT, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS configuracoes (chave TEXT PRIMARY KEY, valor REAL NOT NULL);""")
-    default_config = {'royalties': 0.075, 'propaganda': 0.015, 'icms': 0.10, 'simples': 0.045, 'corretagem': 0.03, 'admin': 0.05}
-    for key, value in default_config.items(): 
-        cursor.execute("INSERT OR IGNORE INTO configuracoes (chave, valor) VALUES (?, ?)", (key, value))
-    conn.commit()
-    conn.close()
-
-def get_data_as_dataframe(query, params=()):
-    conn = connect_db()
+def _pool_atual():
+    with _pools_lock:
+        pool = _pools.get(DB_NAME)
+        if pool is None:
+            pool = _pools[DB_NAME] = queue.LifoQueue(maxsize=POOL_MAX_CONEXOES_OCIOSAS)
+        return pool
+
+def _registrar_emprestimo():
+    global _conexoes_emprestadas
+    with _pool_condicao:
+        while _pool_pausado:
+            _pool_condicao.wait()
+        _conexoes_emprestadas += 1
+
+def _registrar_devolucao():
+    global _conexoes_emprestadas
+    with _pool_condicao:
+        _conexoes_emprestadas -= 1
+        if _pool_pausado:
+            _pool_condicao.notify_all()
+
+@contextmanager
+def pooled_connection():
+    """Empresta uma conexão do pool (abrindo uma nova se não houver ociosa) e a devolve ao sair."""
+    _registrar_emprestimo()  # Espera aqui se o pool estiver pausado
+    pool = _pool_atual()
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        try:
+            conn = connect_db()
+        except Exception:
+            _registrar_devolucao()
+            raise
+    try:
+        yield conn
+    finally:
+        try:
+            if conn.in_transaction:
+                conn.rollback()  # Nunca devolve ao pool uma transação pela metade
+            pool.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+        _registrar_devolucao()
+
+@contextmanager
+def pool_pausado(limite=30.0):
+    """Pausa o pool: barra novos empréstimos, espera (até `limite` segundos) as conexões em uso
+    voltarem e só então executa o bloco. Ao sair, fecha as conexões ociosas e limpa o cache de
+    leituras (o arquivo pode ter sido trocado) e libera quem estava esperando. A thread que pausa
+    não pode estar com uma conexão do pool emprestada.
+    """
+    global _pool_pausado
+    with _pool_condicao:
+        if _pool_pausado:
+            raise RuntimeError("O banco já está pausado por outra operação.")
+        _pool_pausado = True
+        if not _pool_condicao.wait_for(lambda: _conexoes_emprestadas == 0, timeout=limite):
+            _pool_pausado = False
+            _pool_condicao.notify_all()
+            raise TimeoutError(f"Conexões ainda em uso após {limite:g}s; tente novamente.")
+    try:
+        yield
+    finally:
+        fechar_conexoes()
+        nova_geracao_dados()
+        with _pool_condicao:
+            _pool_pausado = False
+            _pool_condicao.notify_all()
+
+def fechar_conexoes():
+    """Fecha todas as conexões ociosas do pool (ex.: antes de apagar ou substituir o arquivo do banco)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+    with _cache_leituras_lock:
+        for sentinela in _sentinelas.values():
+            sentinela.close()
+        _sentinelas.clear()
+    limpar_cache_leituras()
+
+# --- CACHE DE LEITURAS (INVALIDADO POR ESCRITA) ---
+# Cada rerun do Streamlit repete as mesmas consultas (listas de vendas, contas, configurações,
+# totais). O resultado fica guardado junto com a "versão dos dados" em que foi lido e só é
+# reaproveitado enquanto essa versão não mudar. A versão combina:
+#   - um contador de gerações, incrementado pelos escritores deste processo (execute_query e
+#     as funções transacionais) logo após o commit;
+#   - o PRAGMA data_version de uma conexão sentinela, que muda quando QUALQUER outra conexão
+#     (de outro processo, script de manutenção etc.) grava no arquivo.
+# Eviction LRU limitada por quantidade e por bytes.
+CACHE_LEITURAS_MAX_ITENS = 512
+CACHE_LEITURAS_MAX_BYTES = 64 * 1024 * 1024
+
+_cache_leituras = OrderedDict()  # chave -> (versao, valor, bytes)
+_cache_leituras_bytes = 0
+_cache_leituras_lock = threading.Lock()
+_geracao_dados = 0
+_sentinelas = {}  # Uma conexão sentinela por arquivo de banco, usada só para o PRAGMA data_version
+cache_leituras_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+def nova_geracao_dados():
+    """Marca que os dados mudaram: toda leitura guardada no cache deixa de valer."""
+    global _geracao_dados
+    with _cache_leituras_lock:
+        _geracao_dados += 1
+
+def versao_dados():
+    """Identifica o estado atual do banco: (arquivo, geração local, data_version)."""
+    with _cache_leituras_lock:
+        sentinela = _sentinelas.get(DB_NAME)
+        if sentinela is None:
+            # mode=rw: a sentinela nunca cria o arquivo (um banco vazio criado aqui faria o app.py pular o init_db)
+            sentinela = _sentinelas[DB_NAME] = sqlite3.connect(f"file:{DB_NAME}?mode=rw", uri=True, check_same_thread=False, timeout=5.0)
+        return (DB_NAME, _geracao_dados, sentinela.execute("PRAGMA data_version;").fetchone()[0])
+
+def limpar_cache_leituras():
+    global _cache_leituras_bytes
+    with _cache_leituras_lock:
+        _cache_leituras.clear()
+        _cache_leituras_bytes = 0
+
+def _tamanho_em_bytes(valor):
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    return len(repr(valor))
+
+def _copia(valor):
+    # O chamador pode alterar o que recebe (colunas novas, fillna...) sem estragar o cache
+    if isinstance(valor, pd.DataFrame):
+        copia = valor.copy()
+        copia.attrs = dict(valor.attrs)
+        return copia
+    if isinstance(valor, dict):
+        return dict(valor)
+    return valor
+
+def ler_com_cache(chave, carregar):
+    """Devolve o resultado de `carregar()` guardado para `chave`, desde que os dados não tenham mudado."""
+    global _cache_leituras_bytes
+    versao = versao_dados()  # Lida ANTES da consulta: uma escrita concorrente invalida o que for guardado
+    chave = (DB_NAME,) + tuple(chave)
+    with _cache_leituras_lock:
+        item = _cache_leituras.get(chave)
+        if item is not None:
+            if item[0] == versao:
+                _cache_leituras.move_to_end(chave)
+                cache_leituras_stats['hits'] += 1
+                return _copia(item[1])
+            del _cache_leituras[chave]
+            _cache_leituras_bytes -= item[2]
+            cache_leituras_stats['invalidations'] += 1
+        cache_leituras_stats['misses'] += 1
+
+    valor = carregar()  # Fora do lock: a consulta é a parte cara
+
+    tamanho = _tamanho_em_bytes(valor)
+    with _cache_leituras_lock:
+        if chave not in _cache_leituras and tamanho <= CACHE_LEITURAS_MAX_BYTES:
+            _cache_leituras[chave] = (versao, valor, tamanho)
+            _cache_leituras_bytes += tamanho
+            while len(_cache_leituras) > CACHE_LEITURAS_MAX_ITENS or _cache_leituras_bytes > CACHE_LEITURAS_MAX_BYTES:
+                _, removido = _cache_leituras.popitem(last=False)
+                _cache_leituras_bytes -= removido[2]
+                cache_leituras_stats['evictions'] += 1
+    return _copia(valor)
+
+def checkpoint_wal():
+    """Aplica o conteúdo do arquivo -wal no arquivo principal do banco."""
+    with pooled_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+def remover_arquivos_db():
+    """Apaga o banco junto com os arquivos auxiliares do WAL. Roda com o pool pausado: as conexões
+    emprestadas (inclusive a do escritor) voltam e são fechadas antes, nenhuma fica apontando para o
+    arquivo apagado."""
+    with pool_pausado():
+        fechar_conexoes()
+        for caminho in (DB_NAME, f"{DB_NAME}-wal", f"{DB_NAME}-shm"):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+# --- INSTRUMENTAÇÃO DE CONSULTAS ---
+# Cada consulta feita pelos helpers deste módulo (e pelos cálculos em lote) fica registrada com
+# duração, linhas e local da chamada. Acima do limite, vai para o log de consultas lentas junto
+# com o EXPLAIN QUERY PLAN. As consultas feitas dentro de coletar_consultas() (um rerun do app)
+# também são entregues a quem coletou, para o resumo por função render_*.
+LIMITE_CONSULTA_LENTA_MS = float(os.environ.get('LIMITE_CONSULTA_LENTA_MS', '250'))
+ARQUIVO_CONSULTAS_LENTAS = os.environ.get('ARQUIVO_CONSULTAS_LENTAS', 'consultas_lentas.log')
+HISTORICO_CONSULTAS = 500
+
+consultas_recentes = deque(maxlen=HISTORICO_CONSULTAS)
+_coleta_local = threading.local()
+_log_lento_lock = threading.Lock()
+
+def _local_de_chamada():
+    """Primeiro ponto fora deste módulo na pilha ("arquivo:linha função") e a função render_* de origem."""
+    frame, local, render = sys._getframe(2), None, None
+    while frame is not None:
+        codigo = frame.f_code
+        if local is None and codigo.co_filename != __file__ and not codigo.co_filename.endswith('contextlib.py'):
+            local = f"{os.path.basename(codigo.co_filename)}:{frame.f_lineno} {codigo.co_name}"
+        if codigo.co_name.startswith('render_'):
+            render = codigo.co_name
+            break
+        frame = frame.f_back
+    return local, render
+
+def _grava_consulta_lenta(registro):
+    plano = []
+    if registro['tipo'] != 'transacao':
+        try:
+            plano = explain_query_plan(registro['sql'], registro['params'])
+        except sqlite3.Error as e:
+            plano = [f"(sem plano: {e})"]
+    linhas = [
+        f"{datetime.now():%Y-%m-%d %H:%M:%S} | {registro['duracao_ms']:.1f} ms | {registro['linhas']} linha(s) | {registro['local']} | {registro['render'] or '-'}",
+        f"SQL: {' '.join(registro['sql'].split())}",
+        f"Parâmetros: {registro['params']!r}"[:1000],
+    ] + [f"  {detalhe}" for detalhe in plano]
+    try:
+        with _log_lento_lock, open(ARQUIVO_CONSULTAS_LENTAS, 'a', encoding='utf-8') as log:
+            log.write('\n'.join(linhas) + '\n\n')
+    except OSError as e:
+        print(f"ERRO AO GRAVAR LOG DE CONSULTAS LENTAS: {e}")
+
+def registrar_consulta(sql, params, inicio, linhas, tipo='consulta'):
+    """Registra uma consulta executada a partir de `inicio` (time.perf_counter())."""
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    local, render = getattr(_coleta_local, 'chamada', None) or _local_de_chamada()
+    registro = {'sql': sql, 'params': tuple(params), 'duracao_ms': duracao_ms, 'linhas': linhas, 'tipo': tipo, 'local': local, 'render': render}
+    consultas_recentes.append(registro)
+    coletadas = getattr(_coleta_local, 'consultas', None)
+    if coletadas is not None:
+        coletadas.append(registro)
+    if duracao_ms >= LIMITE_CONSULTA_LENTA_MS:
+        _grava_consulta_lenta(registro)
+
+def ler_dataframe(conn, query, params=()):
+    """pd.read_sql_query com registro da consulta."""
+    inicio = time.perf_counter()
     df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
+    registrar_consulta(query, params, inicio, len(df))
     return df
 
-def execute_query(query, params=()):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
+def consultar(conn, query, params=()):
+    """conn.execute(...).fetchall() com registro da consulta."""
+    inicio = time.perf_counter()
+    linhas = conn.execute(query, params).fetchall()
+    registrar_consulta(query, params, inicio, len(linhas))
+    return linhas
+
+@contextmanager
+def coletar_consultas():
+    """Entrega a lista das consultas registradas nesta thread enquanto o bloco roda (ex.: um rerun)."""
+    anterior = getattr(_coleta_local, 'consultas', None)
+    _coleta_local.consultas = consultas = []
     try:
-        cursor.execute(query, params)
-        last_id = cursor.lastrowid
+        yield consultas
+    finally:
+        _coleta_local.consultas = anterior
+
+def resumo_consultas(consultas):
+    """Agrupa as consultas coletadas pela função render_* que as originou."""
+    colunas = ['render', 'consultas', 'transacoes', 'linhas', 'tempo_ms', 'mais_lenta_ms']
+    if not consultas:
+        return pd.DataFrame(columns=colunas)
+    df = pd.DataFrame(consultas)
+    df['render'] = df['render'].fillna('(fora de render_*)')
+    df['eh_transacao'] = df['tipo'] == 'transacao'
+    df['linhas'] = df['linhas'].where(~df['eh_transacao'], 0)  # A transação já conta as linhas das suas escritas
+    resumo = df.groupby('render').agg(
+        consultas=('eh_transacao', lambda serie: int((~serie).sum())), transacoes=('eh_transacao', 'sum'),
+        linhas=('linhas', 'sum'), tempo_ms=('duracao_ms', 'sum'), mais_lenta_ms=('duracao_ms', 'max'),
+    ).reset_index()
+    return resumo[colunas].round(2)
+
+def init_db():
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""CREATE TABLE IF NOT EXISTS contas_bancarias (id INTEGER PRIMARY KEY AUTOINCREMENT, nome_banco TEXT NOT NULL, agencia TEXT, conta TEXT, saldo_inicial REAL DEFAULT 0, data_criacao TEXT NOT NULL);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS transacoes_bancarias (id INTEGER PRIMARY KEY AUTOINCREMENT, conta_id INTEGER NOT NULL, data TEXT NOT NULL, tipo TEXT NOT NULL, descricao TEXT NOT NULL, valor REAL NOT NULL, venda_id INTEGER, plano_recebimento_id INTEGER, FOREIGN KEY (conta_id) REFERENCES contas_bancarias(id) ON DELETE CASCADE, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE SET NULL, FOREIGN KEY (plano_recebimento_id) REFERENCES plano_recebimentos(id) ON DELETE SET NULL);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS vendas (id INTEGER PRIMARY KEY AUTOINCREMENT, cliente TEXT NOT NULL, telefone TEXT, email TEXT, data_venda TEXT NOT NULL, nome_kit TEXT NOT NULL, valor_venda REAL NOT NULL, valor_frete REAL DEFAULT 0);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS custos (venda_id INTEGER PRIMARY KEY, custo_mcpf REAL DEFAULT 0, custo_madeireira REAL DEFAULT 0, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS plano_recebimentos (id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER NOT NULL, descricao TEXT NOT NULL, valor_previsto REAL NOT NULL, data_vencimento TEXT, status TEXT DEFAULT 'Pendente', valor_pago REAL, data_pagamento TEXT, forma_pagamento TEXT, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS pagamentos_custos (id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER NOT NULL, tipo_fornecedor TEXT NOT NULL, valor REAL NOT NULL, data_pagamento TEXT NOT NULL, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS despesas_pagas (id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER NOT NULL, tipo_despesa TEXT NOT NULL, valor REAL NOT NULL, data_pagamento TEXT NOT NULL, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS entregas (venda_id INTEGER PRIMARY KEY, status_entrega TEXT DEFAULT 'Aguardando', endereco_entrega TEXT, data_entrega TEXT, observacoes TEXT, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS configuracoes (chave TEXT PRIMARY KEY, valor REAL NOT NULL);""")
+        default_config = {'royalties': 0.075, 'propaganda': 0.015, 'icms': 0.10, 'simples': 0.045, 'corretagem': 0.03, 'admin': 0.05}
+        for key, value in default_config.items(): 
+            cursor.execute("INSERT OR IGNORE INTO configuracoes (chave, valor) VALUES (?, ?)", (key, value))
         conn.commit()
-    except Exception as e:
-        print(f"ERRO AO EXECUTAR QUERY: {e}")
-        raise e
+    nova_geracao_dados()
+    migrate_db()
+
+# --- MIGRAÇÕES DE ESQUEMA ---
+# Cada migração recebe a conexão já dentro de uma transação. A versão aplicada fica em
+# PRAGMA user_version, então bancos existentes (financeiro.db antigos) são atualizados na inicialização.
+def _migracao_coluna_plano_recebimento_id(conn):
+    colunas = [row['name'] for row in conn.execute("PRAGMA table_info(transacoes_bancarias)")]
+    if 'plano_recebimento_id' not in colunas:
+        conn.execute("ALTER TABLE transacoes_bancarias ADD COLUMN plano_recebimento_id INTEGER REFERENCES plano_recebimentos(id) ON DELETE SET NULL;")
+
+def _migracao_indices(conn):
+    # Chaves estrangeiras: buscas por venda e os ON DELETE CASCADE/SET NULL de delete_venda.
+    # As colunas extras tornam os índices de cobertura para as somas agrupadas por venda_id.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plano_recebimentos_venda ON plano_recebimentos (venda_id, data_vencimento, valor_pago);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pagamentos_custos_venda ON pagamentos_custos (venda_id, tipo_fornecedor, valor);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_despesas_pagas_venda ON despesas_pagas (venda_id, tipo_despesa, valor);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_venda ON transacoes_bancarias (venda_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_plano ON transacoes_bancarias (plano_recebimento_id);")
+    # Extrato: filtra por conta, ordena por (data, id) e cobre as colunas exibidas e usadas no saldo
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_extrato ON transacoes_bancarias (conta_id, data, id, tipo, valor, descricao);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data_venda ON vendas (data_venda);")
+
+# --- RESUMO POR VENDA (venda_resumo) ---
+# Tabela materializada com os totais de cada venda, mantida por triggers: qualquer escrita em
+# vendas/custos/plano_recebimentos/pagamentos_custos/despesas_pagas/configuracoes recalcula
+# apenas a linha da venda afetada (somas por venda_id, servidas pelos índices de cobertura).
+def _sql_lista(chaves):
+    return ', '.join(f"'{chave}'" for chave in chaves)
+
+_SQL_TAXA_SOBRE_VENDA = f"(SELECT TOTAL(valor) FROM configuracoes WHERE chave IN ({_sql_lista(DESPESAS_SOBRE_VENDA)}))"
+_SQL_TAXA_SOBRE_CUSTO = f"(SELECT TOTAL(valor) FROM configuracoes WHERE chave IN ({_sql_lista(DESPESAS_SOBRE_CUSTO)}))"
+
+_SQL_RESUMO_CALCULADO = f"""
+    SELECT venda_id, valor_venda, custo_total, pagamentos_mcpf + pagamentos_madeireira AS custo_pago,
+           pagamentos_mcpf, pagamentos_madeireira, total_recebido, total_despesas_pagas,
+           valor_venda * {_SQL_TAXA_SOBRE_VENDA} + custo_total * {_SQL_TAXA_SOBRE_CUSTO} AS despesas_total_calculado
+    FROM (
+        SELECT v.id AS venda_id, v.valor_venda,
+               COALESCE(c.custo_mcpf, 0) + COALESCE(c.custo_madeireira, 0) AS custo_total,
+               (SELECT TOTAL(valor) FROM pagamentos_custos WHERE venda_id = v.id AND tipo_fornecedor = 'MCPF') AS pagamentos_mcpf,
+               (SELECT TOTAL(valor) FROM pagamentos_custos WHERE venda_id = v.id AND tipo_fornecedor = 'Madeireira') AS pagamentos_madeireira,
+               (SELECT TOTAL(valor_pago) FROM plano_recebimentos WHERE venda_id = v.id) AS total_recebido,
+               (SELECT TOTAL(valor) FROM despesas_pagas WHERE venda_id = v.id) AS total_despesas_pagas
+        FROM vendas v LEFT JOIN custos c ON c.venda_id = v.id
+        WHERE {{filtro}}
+    )
+    WHERE true
+"""  # O "WHERE true" evita que o ON CONFLICT do upsert seja lido como restrição de JOIN
+COLUNAS_RESUMO = ['venda_id', 'valor_venda', 'custo_total', 'custo_pago', 'pagamentos_mcpf', 'pagamentos_madeireira', 'total_recebido', 'total_despesas_pagas', 'despesas_total_calculado']
+
+def _sql_atualiza_resumo(filtro):
+    atualizacoes = ', '.join(f"{coluna} = excluded.{coluna}" for coluna in COLUNAS_RESUMO[1:])
+    return f"""INSERT INTO venda_resumo ({', '.join(COLUNAS_RESUMO)})
+        {_SQL_RESUMO_CALCULADO.format(filtro=filtro)}
+        ON CONFLICT (venda_id) DO UPDATE SET {atualizacoes};"""
+
+_SQL_ATUALIZA_DESPESAS_RESUMO = f"UPDATE venda_resumo SET despesas_total_calculado = valor_venda * {_SQL_TAXA_SOBRE_VENDA} + custo_total * {_SQL_TAXA_SOBRE_CUSTO};"
+
+def _triggers_resumo():
+    triggers = {
+        'trg_resumo_vendas_insert': ("AFTER INSERT ON vendas", [_sql_atualiza_resumo("v.id = NEW.id")]),
+        'trg_resumo_vendas_update': ("AFTER UPDATE OF valor_venda ON vendas", [_sql_atualiza_resumo("v.id = NEW.id")]),
+        'trg_resumo_vendas_delete': ("AFTER DELETE ON vendas", ["DELETE FROM venda_resumo WHERE venda_id = OLD.id;"]),
+        'trg_resumo_configuracoes_insert': ("AFTER INSERT ON configuracoes", [_SQL_ATUALIZA_DESPESAS_RESUMO]),
+        'trg_resumo_configuracoes_update': ("AFTER UPDATE OF valor ON configuracoes", [_SQL_ATUALIZA_DESPESAS_RESUMO]),
+        'trg_resumo_configuracoes_delete': ("AFTER DELETE ON configuracoes", [_SQL_ATUALIZA_DESPESAS_RESUMO]),
+    }
+    colunas_relevantes = {
+        'custos': 'venda_id, custo_mcpf, custo_madeireira',
+        'plano_recebimentos': 'venda_id, valor_pago',
+        'pagamentos_custos': 'venda_id, tipo_fornecedor, valor',
+        'despesas_pagas': 'venda_id, valor',
+    }
+    for tabela, colunas in colunas_relevantes.items():
+        triggers[f'trg_resumo_{tabela}_insert'] = (f"AFTER INSERT ON {tabela}", [_sql_atualiza_resumo("v.id = NEW.venda_id")])
+        triggers[f'trg_resumo_{tabela}_update'] = (f"AFTER UPDATE OF {colunas} ON {tabela}", [_sql_atualiza_resumo("v.id = OLD.venda_id"), _sql_atualiza_resumo("v.id = NEW.venda_id")])
+        triggers[f'trg_resumo_{tabela}_delete'] = (f"AFTER DELETE ON {tabela}", [_sql_atualiza_resumo("v.id = OLD.venda_id")])
+    return triggers
+
+def _migracao_venda_resumo(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS venda_resumo (venda_id INTEGER PRIMARY KEY, valor_venda REAL NOT NULL DEFAULT 0, custo_total REAL NOT NULL DEFAULT 0, custo_pago REAL NOT NULL DEFAULT 0, pagamentos_mcpf REAL NOT NULL DEFAULT 0, pagamentos_madeireira REAL NOT NULL DEFAULT 0, total_recebido REAL NOT NULL DEFAULT 0, total_despesas_pagas REAL NOT NULL DEFAULT 0, despesas_total_calculado REAL NOT NULL DEFAULT 0, FOREIGN KEY (venda_id) REFERENCES vendas(id) ON DELETE CASCADE);""")
+    for nome, (evento, comandos) in _triggers_resumo().items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome};")
+        conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {' '.join(comandos)} END;")
+    conn.execute("DELETE FROM venda_resumo;")
+    conn.execute(_sql_atualiza_resumo("1 = 1"))
+
+def _migracao_substituida(conn):
+    """Migração que não faz mais nada: o número continua na lista para os bancos que já passaram por ela."""
+
+TOLERANCIA_DIVERGENCIA = 0.005  # Meio centavo
+
+def rebuild_venda_resumo():
+    """Recalcula venda_resumo do zero e retorna um DataFrame com as vendas cujo resumo estava divergente."""
+    with pooled_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            atual = pd.read_sql_query("SELECT * FROM venda_resumo", conn)
+            esperado = pd.read_sql_query(_SQL_RESUMO_CALCULADO.format(filtro="1 = 1"), conn)
+            conn.execute("DELETE FROM venda_resumo;")
+            conn.execute(_sql_atualiza_resumo("1 = 1"))
+            conn.commit()
+        except Exception as e:
+            print(f"ERRO AO RECALCULAR RESUMO, revertendo... Erro: {e}")
+            conn.rollback()
+            raise e
+        finally:
+            nova_geracao_dados()
+    comparacao = esperado.merge(atual, on='venda_id', how='outer', suffixes=('', '_armazenado'), indicator=True)
+    divergente = comparacao['_merge'] != 'both'
+    for coluna in COLUNAS_RESUMO[1:]:
+        divergente |= (comparacao[coluna] - comparacao[f'{coluna}_armazenado']).abs() > TOLERANCIA_DIVERGENCIA
+    return comparacao[divergente].drop(columns='_merge')
+
+# --- SALDOS BANCÁRIOS (LIVRO-RAZÃO) ---
+# contas_bancarias.saldo_atual guarda o saldo corrente e transacoes_bancarias.saldo_apos o saldo
+# da conta logo após cada lançamento (ordem: data, id). Os triggers atualizam os dois na mesma
+# transação da escrita; só os lançamentos posteriores ao alterado são tocados.
+def _valor_assinado(linha):
+    return f"(CASE WHEN {linha}.tipo = 'Entrada' THEN {linha}.valor ELSE -{linha}.valor END)"
+
+def _sql_aplica_lancamento(linha, sinal):
+    """Soma (sinal '+') ou retira (sinal '-') o efeito de um lançamento no saldo da conta e nos lançamentos posteriores."""
+    return [
+        f"UPDATE contas_bancarias SET saldo_atual = saldo_atual {sinal} {_valor_assinado(linha)} WHERE id = {linha}.conta_id;",
+        f"UPDATE transacoes_bancarias SET saldo_apos = saldo_apos {sinal} {_valor_assinado(linha)} WHERE conta_id = {linha}.conta_id AND (data, id) > ({linha}.data, {linha}.id) AND id <> {linha}.id;",
+    ]
+
+_SQL_SALDO_APOS_NOVO = f"""UPDATE transacoes_bancarias SET saldo_apos = COALESCE((
+        SELECT anterior.saldo_apos FROM transacoes_bancarias anterior
+        WHERE anterior.conta_id = NEW.conta_id AND (anterior.data, anterior.id) < (NEW.data, NEW.id)
+        ORDER BY anterior.data DESC, anterior.id DESC LIMIT 1
+    ), 0) + {_valor_assinado('NEW')} WHERE id = NEW.id;"""
+
+_SQL_SALDOS_CALCULADOS = """
+    SELECT id, SUM(CASE WHEN tipo = 'Entrada' THEN valor ELSE -valor END) OVER (PARTITION BY conta_id ORDER BY data, id) AS saldo_apos
+    FROM transacoes_bancarias
+"""
+_SQL_SALDO_ATUAL_CALCULADO = "SELECT c.id, (SELECT TOTAL(CASE WHEN tipo = 'Entrada' THEN valor ELSE -valor END) FROM transacoes_bancarias t WHERE t.conta_id = c.id) AS saldo_atual FROM contas_bancarias c"
+
+def _recalcula_saldos(conn):
+    conn.execute("UPDATE contas_bancarias SET saldo_atual = (SELECT TOTAL(CASE WHEN tipo = 'Entrada' THEN valor ELSE -valor END) FROM transacoes_bancarias t WHERE t.conta_id = contas_bancarias.id);")
+    conn.execute(f"UPDATE transacoes_bancarias SET saldo_apos = calculado.saldo_apos FROM ({_SQL_SALDOS_CALCULADOS}) AS calculado WHERE calculado.id = transacoes_bancarias.id;")
+
+def _migracao_saldos_bancarios(conn):
+    colunas_conta = [row['name'] for row in conn.execute("PRAGMA table_info(contas_bancarias)")]
+    if 'saldo_atual' not in colunas_conta:
+        conn.execute("ALTER TABLE contas_bancarias ADD COLUMN saldo_atual REAL NOT NULL DEFAULT 0;")
+    colunas_transacao = [row['name'] for row in conn.execute("PRAGMA table_info(transacoes_bancarias)")]
+    if 'saldo_apos' not in colunas_transacao:
+        conn.execute("ALTER TABLE transacoes_bancarias ADD COLUMN saldo_apos REAL;")
+    triggers = {
+        'trg_saldo_transacoes_insert': ("AFTER INSERT ON transacoes_bancarias", _sql_aplica_lancamento('NEW', '+') + [_SQL_SALDO_APOS_NOVO]),
+        'trg_saldo_transacoes_delete': ("AFTER DELETE ON transacoes_bancarias", _sql_aplica_lancamento('OLD', '-')),
+        # Só dispara para colunas que mudam o saldo (a própria atualização de saldo_apos não dispara de novo)
+        'trg_saldo_transacoes_update': ("AFTER UPDATE OF conta_id, data, tipo, valor ON transacoes_bancarias", _sql_aplica_lancamento('OLD', '-') + _sql_aplica_lancamento('NEW', '+') + [_SQL_SALDO_APOS_NOVO]),
+    }
+    for nome, (evento, comandos) in triggers.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome};")
+        conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {' '.join(comandos)} END;")
+    _recalcula_saldos(conn)
+
+def rebuild_saldos_bancarios():
+    """Recalcula saldo_atual e saldo_apos do zero e retorna um DataFrame com as contas que estavam divergentes."""
+    with pooled_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            armazenado = pd.read_sql_query("SELECT id, nome_banco, saldo_atual FROM contas_bancarias", conn)
+            calculado = pd.read_sql_query(_SQL_SALDO_ATUAL_CALCULADO, conn)
+            lancamentos_divergentes = pd.read_sql_query(f"""
+                SELECT t.conta_id, COUNT(*) AS lancamentos_divergentes FROM transacoes_bancarias t
+                JOIN ({_SQL_SALDOS_CALCULADOS}) AS calculado ON calculado.id = t.id
+                WHERE t.saldo_apos IS NULL OR ABS(t.saldo_apos - calculado.saldo_apos) > ?
+                GROUP BY t.conta_id""", conn, params=(TOLERANCIA_DIVERGENCIA,))
+            _recalcula_saldos(conn)
+            conn.commit()
+        except Exception as e:
+            print(f"ERRO AO RECALCULAR SALDOS, revertendo... Erro: {e}")
+            conn.rollback()
+            raise e
+        finally:
+            nova_geracao_dados()
+    comparacao = armazenado.merge(calculado, on='id', suffixes=('_armazenado', ''))
+    comparacao = comparacao.merge(lancamentos_divergentes, left_on='id', right_on='conta_id', how='left').drop(columns='conta_id')
+    comparacao['lancamentos_divergentes'] = comparacao['lancamentos_divergentes'].fillna(0).astype(int)
+    divergente = ((comparacao['saldo_atual'] - comparacao['saldo_atual_armazenado']).abs() > TOLERANCIA_DIVERGENCIA) | (comparacao['lancamentos_divergentes'] > 0)
+    return comparacao[divergente]
+
+def tarefa_recalcular_resumos(progresso):
+    """Recalcula venda_resumo e os saldos bancários como tarefa em segundo plano (tarefas.enviar_tarefa).
+    As divergências encontradas voltam como CSV no resultado."""
+    progresso(0, 2, "Recalculando o resumo das vendas...")
+    vendas = rebuild_venda_resumo()
+    progresso(1, 2, "Recalculando os saldos bancários...")
+    saldos = rebuild_saldos_bancarios()
+    mensagem = (f"Resumos e saldos recalculados: {len(vendas)} venda(s) e {len(saldos)} conta(s) estavam divergentes e foram corrigidas."
+                if len(vendas) or len(saldos) else "Resumos e saldos recalculados. Nenhuma divergência encontrada.")
+    if vendas.empty and saldos.empty:
+        return {'mensagem': mensagem}
+    divergencias = pd.concat([vendas.assign(tabela='venda_resumo'), saldos.assign(tabela='contas_bancarias')], ignore_index=True)
+    return {'mensagem': mensagem, 'resultado': divergencias.to_csv(index=False, sep=';').encode('utf-8-sig')}
+
+# --- BUSCA TEXTUAL DE VENDAS (FTS5) ---
+# Índice de texto completo sobre cliente, telefone, email e nome_kit, com conteúdo externo
+# (a tabela vendas) e sincronizado por triggers. O tokenizador remove acentos: "joao" encontra "João".
+COLUNAS_BUSCA_VENDAS = ['cliente', 'telefone', 'email', 'nome_kit']
+PESOS_BUSCA_VENDAS = (10.0, 2.0, 2.0, 5.0)  # Peso de cada coluna no ranking bm25
+
+def _fts5_disponivel(conn):
+    return bool(conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5');").fetchone()[0])
+
+def _migracao_busca_vendas(conn):
+    if not _fts5_disponivel(conn):
+        print("AVISO: SQLite sem FTS5; a busca de vendas usará LIKE.")
+        return
+    colunas = ', '.join(COLUNAS_BUSCA_VENDAS)
+    novas = ', '.join(f"NEW.{coluna}" for coluna in COLUNAS_BUSCA_VENDAS)
+    antigas = ', '.join(f"OLD.{coluna}" for coluna in COLUNAS_BUSCA_VENDAS)
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS vendas_fts USING fts5({colunas}, content='vendas', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');")
+    triggers = {
+        'trg_fts_vendas_insert': ("AFTER INSERT ON vendas", [f"INSERT INTO vendas_fts (rowid, {colunas}) VALUES (NEW.id, {novas});"]),
+        'trg_fts_vendas_delete': ("AFTER DELETE ON vendas", [f"INSERT INTO vendas_fts (vendas_fts, rowid, {colunas}) VALUES ('delete', OLD.id, {antigas});"]),
+        'trg_fts_vendas_update': (f"AFTER UPDATE OF {colunas} ON vendas", [
+            f"INSERT INTO vendas_fts (vendas_fts, rowid, {colunas}) VALUES ('delete', OLD.id, {antigas});",
+            f"INSERT INTO vendas_fts (rowid, {colunas}) VALUES (NEW.id, {novas});",
+        ]),
+    }
+    for nome, (evento, comandos) in triggers.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome};")
+        conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {' '.join(comandos)} END;")
+    conn.execute("INSERT INTO vendas_fts (vendas_fts) VALUES ('rebuild');")
+
+def _consulta_fts(termo):
+    """Converte o texto digitado em uma consulta FTS5: cada palavra vira um prefixo ("joa"*), todas obrigatórias."""
+    palavras = [palavra.replace('"', '') for palavra in termo.split()]
+    return ' '.join(f'"{palavra}"*' for palavra in palavras if palavra)
+
+def buscar_vendas(termo=None, limite=50, offset=0):
+    """Retorna uma página de vendas (com status de entrega) e o total de resultados.
+
+    Com termo, a busca roda no índice FTS5 ordenada por relevância (bm25); sem termo, lista as mais recentes.
+    """
+    consulta = _consulta_fts(termo) if termo else ''
+    base = "SELECT v.*, e.status_entrega FROM vendas v LEFT JOIN entregas e ON v.id = e.venda_id"
+    if not consulta:
+        total = get_data_as_dataframe("SELECT COUNT(*) AS total FROM vendas")['total'].iloc[0]
+        pagina = get_data_as_dataframe(f"{base} ORDER BY v.id DESC LIMIT ? OFFSET ?", (limite, offset))
+        return pagina, int(total)
+    if get_data_as_dataframe("SELECT name FROM sqlite_master WHERE name = 'vendas_fts'").empty:
+        # SQLite sem FTS5: busca simples por trecho (sem ranking)
+        filtro = ' OR '.join(f"v.{coluna} LIKE ?" for coluna in COLUNAS_BUSCA_VENDAS)
+        params = tuple(f"%{termo}%" for _ in COLUNAS_BUSCA_VENDAS)
+        total = get_data_as_dataframe(f"SELECT COUNT(*) AS total FROM vendas v WHERE {filtro}", params)['total'].iloc[0]
+        pagina = get_data_as_dataframe(f"{base} WHERE {filtro} ORDER BY v.id DESC LIMIT ? OFFSET ?", params + (limite, offset))
+        return pagina, int(total)
+    pesos = ', '.join(str(peso) for peso in PESOS_BUSCA_VENDAS)
+    total = get_data_as_dataframe("SELECT COUNT(*) AS total FROM vendas_fts WHERE vendas_fts MATCH ?", (consulta,))['total'].iloc[0]
+    pagina = get_data_as_dataframe(f"""
+        SELECT v.*, e.status_entrega FROM vendas_fts f
+        JOIN vendas v ON v.id = f.rowid
+        LEFT JOIN entregas e ON v.id = e.venda_id
+        WHERE vendas_fts MATCH ?
+        ORDER BY bm25(vendas_fts, {pesos}), v.id DESC LIMIT ? OFFSET ?""", (consulta, limite, offset))
+    return pagina, int(total)
+
+# --- FLUXO DE CAIXA MENSAL ---
+# Índices das somas por mês do fluxo de caixa (calculations.calculate_fluxo_caixa_mensal): o extrato
+# de todas as contas por data e as parcelas ainda não pagas (índice parcial, só as pendentes).
+def _migracao_indices_fluxo_caixa(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_data ON transacoes_bancarias (data, tipo, valor);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plano_recebimentos_pendentes ON plano_recebimentos (venda_id, data_vencimento, valor_previsto, valor_pago, status) WHERE status <> 'Pago';")
+
+# --- FILTROS POR PERÍODO (DASHBOARD) ---
+# Somas do período selecionado e do anterior filtradas por data no SQL (calculations.calculate_totais_periodo):
+# recebimentos por data de pagamento e parcelas por vencimento. Vendas usam idx_vendas_data_venda e o
+# extrato usa idx_transacoes_data.
+def _migracao_indices_periodo(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plano_recebimentos_pagamento ON plano_recebimentos (data_pagamento, valor_pago);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_plano_recebimentos_vencimento ON plano_recebimentos (data_vencimento, status, valor_previsto, valor_pago);")
+
+MIGRACOES = [
+    (1, _migracao_coluna_plano_recebimento_id),
+    (2, _migracao_indices),
+    (3, _migracao_venda_resumo),
+    (4, _migracao_saldos_bancarios),
+    (5, _migracao_busca_vendas),
+    (6, _migracao_substituida),  # Refazia os triggers com toda chave de configuracoes como despesa; corrigido pela 9
+    (7, _migracao_indices_fluxo_caixa),
+    (8, _migracao_indices_periodo),
+    (9, _migracao_venda_resumo),  # Triggers refeitos: só as chaves de DESPESAS entram no cálculo (única reconstrução depois da 3)
+]
+
+def migrate_db():
+    """Aplica, em ordem, as migrações com número maior que o PRAGMA user_version do banco."""
+    with pooled_connection() as conn:
+        if conn.execute("PRAGMA user_version;").fetchone()[0] >= MIGRACOES[-1][0]:
+            return
+        for numero, migracao in MIGRACOES:
+            conn.execute("BEGIN IMMEDIATE;")  # Relê a versão com o lock de escrita (outro processo pode ter migrado)
+            try:
+                if conn.execute("PRAGMA user_version;").fetchone()[0] >= numero:
+                    conn.rollback()
+                    continue
+                migracao(conn)
+                conn.execute(f"PRAGMA user_version = {numero};")
+                conn.commit()
+            except Exception as e:
+                print(f"ERRO NA MIGRAÇÃO {numero}, revertendo... Erro: {e}")
+                conn.rollback()
+                raise e
+            finally:
+                nova_geracao_dados()
+
+# --- VERIFICAÇÃO DOS PLANOS DE CONSULTA ---
+# Consultas quentes da aplicação e o índice que cada uma deve usar (checado com EXPLAIN QUERY PLAN)
+CONSULTAS_CRITICAS = {
+    'plano_da_venda': ("SELECT * FROM plano_recebimentos WHERE venda_id = ? ORDER BY data_vencimento ASC", (1,), 'idx_plano_recebimentos_venda'),
+    'recebido_por_venda': ("SELECT venda_id, TOTAL(valor_pago) FROM plano_recebimentos GROUP BY venda_id", (), 'idx_plano_recebimentos_venda'),
+    'pagamentos_custos_da_venda': ("SELECT id, data_pagamento, tipo_fornecedor, valor FROM pagamentos_custos WHERE venda_id = ? ORDER BY data_pagamento DESC", (1,), 'idx_pagamentos_custos_venda'),
+    'despesas_pagas_da_venda': ("SELECT id, data_pagamento, tipo_despesa, valor FROM despesas_pagas WHERE venda_id = ? ORDER BY data_pagamento DESC", (1,), 'idx_despesas_pagas_venda'),
+    'extrato_da_conta': ("SELECT id, data, tipo, descricao, valor FROM transacoes_bancarias WHERE conta_id = ? ORDER BY data DESC, id DESC", (1,), 'idx_transacoes_extrato'),
+    'extrato_pagina_seguinte': ("SELECT id, data, tipo, descricao, valor, saldo_apos FROM transacoes_bancarias WHERE conta_id = ? AND (data, id) < (?, ?) AND data >= ? AND tipo = ? ORDER BY data DESC, id DESC LIMIT ?", (1, '2025-06-01', 10, '2025-01-01', 'Entrada', 51), 'idx_transacoes_extrato'),
+    'saldos_posteriores': ("UPDATE transacoes_bancarias SET saldo_apos = saldo_apos + 1 WHERE conta_id = ? AND (data, id) > (?, ?)", (1, '2025-01-01', 1), 'idx_transacoes_extrato'),
+    'cascade_plano_da_venda': ("DELETE FROM plano_recebimentos WHERE venda_id = ?", (1,), 'idx_plano_recebimentos_venda'),
+    'set_null_transacoes_da_venda': ("UPDATE transacoes_bancarias SET venda_id = NULL WHERE venda_id = ?", (1,), 'idx_transacoes_venda'),
+    'vendas_por_periodo': ("SELECT * FROM vendas WHERE data_venda BETWEEN ? AND ?", ('2025-01-01', '2025-12-31'), 'idx_vendas_data_venda'),
+    'fluxo_extrato_por_mes': ("SELECT substr(data, 1, 7) AS mes, TOTAL(valor) FROM transacoes_bancarias WHERE data >= ? GROUP BY mes", ('2025-01-01',), 'idx_transacoes_data'),
+    'periodo_recebido': ("SELECT TOTAL(valor_pago) FROM plano_recebimentos WHERE data_pagamento >= ? AND data_pagamento < ?", ('2025-01-01', '2025-02-01'), 'idx_plano_recebimentos_pagamento'),
+    'periodo_vencimentos': ("SELECT TOTAL(valor_previsto) FROM plano_recebimentos WHERE data_vencimento >= ? AND data_vencimento < ?", ('2025-01-01', '2025-02-01'), 'idx_plano_recebimentos_vencimento'),
+    'fluxo_parcelas_pendentes': ("SELECT venda_id, MIN(data_vencimento) FROM plano_recebimentos WHERE status <> 'Pago' GROUP BY venda_id", (), 'idx_plano_recebimentos_pendentes'),
+}
+
+def explain_query_plan(query, params=()):
+    """Retorna as linhas (detail) do EXPLAIN QUERY PLAN de uma consulta."""
+    with pooled_connection() as conn:
+        return [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+def verificar_planos_de_consulta():
+    """Confere se cada consulta crítica usa o índice esperado. Retorna um DataFrame com o resultado."""
+    resultados = []
+    for nome, (query, params, indice) in CONSULTAS_CRITICAS.items():
+        plano = explain_query_plan(query, params)
+        resultados.append({'consulta': nome, 'indice_esperado': indice, 'usa_indice': any(indice in linha for linha in plano), 'plano': ' | '.join(plano)})
+    return pd.DataFrame(resultados)
+
+def get_data_as_dataframe(query, params=(), usar_cache=True):
+    def carregar():
+        with pooled_connection() as conn:
+            return ler_dataframe(conn, query, params)
+    if not usar_cache:
+        return carregar()
+    return ler_com_cache(('df', query, tuple(params)), carregar)
+
+_transacao_local = threading.local()  # Conexão da transação aberta nesta thread (transacao() ou lote do escritor)
+
+def _transacao_da_thread():
+    return getattr(_transacao_local, 'conn', None)
+
+@contextmanager
+def transacao(conn=None):
+    """Unidade de trabalho: uma conexão, um BEGIN e um COMMIT para todas as escritas do bloco.
+
+    Sem `conn`, pega uma conexão do pool, abre a transação (BEGIN IMMEDIATE: o lock de escrita
+    é pego já no início, sem risco de falhar ao promover uma leitura), faz commit na saída ou
+    rollback se houver exceção. Com `conn` (transação já aberta por quem chamou), apenas reutiliza
+    essa conexão: o commit fica por conta do bloco mais externo.
+
+        with transacao() as conn:
+            venda_id = add_venda(dados, conn=conn)
+            add_parcela_plano({...}, conn=conn)
+    """
+    if conn is None:
+        conn = _transacao_da_thread()  # Já dentro de uma transação nesta thread (ou no lote do escritor): participa dela
+    if conn is not None:
+        yield conn
+        return
+    with pooled_connection() as conn:
+        inicio, alteracoes = time.perf_counter(), conn.total_changes
+        conn.execute("BEGIN IMMEDIATE;")
+        _transacao_local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+            registrar_consulta("TRANSAÇÃO", (), inicio, conn.total_changes - alteracoes, tipo='transacao')
+        except Exception as e:
+            print(f"ERRO NA TRANSAÇÃO, revertendo... Erro: {e}")
+            conn.rollback()
+            raise e
+        finally:
+            _transacao_local.conn = None
+            nova_geracao_dados()
+
+# --- ESCRITOR SERIALIZADO ---
+# Com várias sessões gravando ao mesmo tempo, cada escrita abrindo a própria transação disputa o
+# lock de escrita do SQLite (espera de busy_timeout, "database is locked" e picos de latência).
+# As funções de escrita marcadas com @escrita, chamadas sem `conn`, vão para uma fila atendida por
+# uma única thread: ela junta o que estiver na fila (até LOTE_MAXIMO_ESCRITAS) em uma transação,
+# cada escrita em um SAVEPOINT próprio (a que falhar é desfeita sozinha, as outras seguem), e faz
+# um commit só para o lote. Quem chamou recebe o resultado depois do commit. Lock ocupado (outro
+# processo, importação em lote) refaz o lote inteiro com espera exponencial. Blocos `with
+# transacao()` explícitos (importação, gerar_dados) continuam com a própria transação.
+ESCRITOR_SERIALIZADO = os.environ.get('ESCRITOR_SERIALIZADO', '1') != '0'
+LOTE_MAXIMO_ESCRITAS = 64
+TENTATIVAS_ESCRITA = 6
+ESPERA_INICIAL_ESCRITA = 0.05  # Segundos; dobra a cada nova tentativa (com variação aleatória)
+TEMPO_MAXIMO_ESCRITA = float(os.environ.get('TEMPO_MAXIMO_ESCRITA', '60'))  # Segundos que uma escrita espera o escritor
+
+_fila_escritas = queue.Queue()
+_escritor = None
+_escritor_lock = threading.Lock()
+
+def _lock_ocupado(erro):
+    return isinstance(erro, sqlite3.OperationalError) and ('locked' in str(erro) or 'busy' in str(erro))
+
+def _executar_lote(lote):
+    """Executa o lote em uma transação, cada escrita em um SAVEPOINT. Retorna [(future, ok, valor ou erro)].
+    Lock ocupado em qualquer ponto desfaz tudo e sobe a exceção (o lote é refeito por quem chamou)."""
+    with pooled_connection() as conn:
+        inicio, alteracoes = time.perf_counter(), conn.total_changes
+        conn.execute("BEGIN IMMEDIATE;")
+        _transacao_local.conn = conn
+        resultados = []
+        try:
+            for funcao, args, kwargs, futuro, chamada in lote:
+                # Cada escrita registra as suas consultas numa lista própria, atribuídas ao render_* de
+                # origem; quem espera o Future as junta às que está coletando (aguardar_escrita)
+                _coleta_local.consultas = futuro.consultas = []
+                _coleta_local.chamada = chamada
+                conn.execute("SAVEPOINT escrita;")
+                try:
+                    valor = funcao(*args, conn=conn, **kwargs)
+                except Exception as e:
+                    if _lock_ocupado(e):
+                        raise
+                    conn.execute("ROLLBACK TO escrita;")
+                    resultados.append((futuro, False, e))
+                else:
+                    resultados.append((futuro, True, valor))
+                conn.execute("RELEASE escrita;")
+            _coleta_local.consultas = _coleta_local.chamada = None
+            conn.commit()
+            registrar_consulta(f"TRANSAÇÃO (lote de {len(lote)})", (), inicio, conn.total_changes - alteracoes, tipo='transacao')
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            _coleta_local.consultas = _coleta_local.chamada = None
+            _transacao_local.conn = None
+            nova_geracao_dados()
+    return resultados
+
+def _executar_escritor():
+    while True:
+        lote = [_fila_escritas.get()]
+        while len(lote) < LOTE_MAXIMO_ESCRITAS:  # Group commit: junta o que chegou enquanto o lote anterior gravava
+            try:
+                lote.append(_fila_escritas.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _gravar_lote(lote)
+        except Exception as e:  # Nada derruba o escritor: quem esperava recebe o erro e a fila continua
+            print(f"ERRO NO ESCRITOR DE BANCO: {e}")
+            for item in lote:
+                if not item[3].done():
+                    item[3].set_exception(e)
+
+def _gravar_lote(lote):
+    lote = [item for item in lote if item[3].set_running_or_notify_cancel()]
+    if not lote:
+        return
+    for tentativa in range(TENTATIVAS_ESCRITA):
+        try:
+            resultados = _executar_lote(lote)
+            break
+        except Exception as e:
+            if _lock_ocupado(e) and tentativa + 1 < TENTATIVAS_ESCRITA:
+                time.sleep(ESPERA_INICIAL_ESCRITA * 2 ** tentativa * (1 + random.random()))
+                continue
+            print(f"ERRO NO LOTE DE ESCRITAS, revertendo... Erro: {e}")
+            resultados = [(item[3], False, e) for item in lote]
+            break
+    for futuro, ok, valor in resultados:
+        if ok:
+            futuro.set_result(valor)
+        else:
+            futuro.set_exception(valor)
+
+def enviar_escrita(funcao, *args, **kwargs):
+    """Enfileira `funcao(*args, conn=..., **kwargs)` para o escritor e retorna um Future com o resultado.
+
+    Chamada de dentro de uma transação já aberta nesta thread (inclusive de uma escrita que o próprio
+    escritor está executando), a função roda na hora, nessa transação: esperar a fila ali travaria.
+    """
+    futuro = Future()
+    conn = _transacao_da_thread()
+    if conn is not None:
+        try:
+            futuro.set_result(funcao(*args, conn=conn, **kwargs))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None or not _escritor.is_alive():  # Escritor que morreu é substituído; a fila continua a mesma
+            _escritor = threading.Thread(target=_executar_escritor, name="escritor-db", daemon=True)
+            _escritor.start()
+    _fila_escritas.put((funcao, args, kwargs, futuro, _local_de_chamada()))
+    return futuro
+
+def aguardar_escrita(futuro, tempo_maximo=None):
+    """Resultado de um Future de enviar_escrita, esperando no máximo TEMPO_MAXIMO_ESCRITA segundos.
+
+    Se o escritor não chegou a começar a escrita, ela é cancelada (não será gravada); se já está
+    em andamento, o resultado fica incerto. Nos dois casos a espera termina com TimeoutError.
+    As consultas feitas pelo escritor entram, nesta thread, no coletar_consultas() em andamento.
+    """
+    tempo_maximo = TEMPO_MAXIMO_ESCRITA if tempo_maximo is None else tempo_maximo
+    try:
+        return futuro.result(timeout=tempo_maximo)
+    except FuturesTimeoutError:
+        if futuro.done():  # TimeoutError levantado pela própria escrita
+            raise
+        if futuro.cancel():
+            raise TimeoutError(f"O escritor do banco não atendeu a escrita em {tempo_maximo:g} s; nada foi gravado, tente novamente.") from None
+        raise TimeoutError(f"A escrita passou de {tempo_maximo:g} s e ainda está em andamento; confira se foi gravada antes de repetir.") from None
     finally:
-        conn.close()
-    return last_id
+        coletadas = getattr(_coleta_local, 'consultas', None)
+        if coletadas is not None and futuro.done() and not futuro.cancelled():
+            coletadas.extend(getattr(futuro, 'consultas', ()))  # Escrita concluída: o escritor não mexe mais na lista
+
+def escrita(funcao):
+    """Decorador das funções de escrita (assinatura com `conn=None`): sem `conn` e fora de uma
+    transação, a chamada passa pelo escritor serializado e espera o commit do lote."""
+    @functools.wraps(funcao)
+    def envolvida(*args, conn=None, **kwargs):
+        if conn is None and ESCRITOR_SERIALIZADO and _transacao_da_thread() is None:
+            return aguardar_escrita(enviar_escrita(funcao, *args, **kwargs))
+        return funcao(*args, conn=conn, **kwargs)
+    return envolvida
+
+@escrita
+def execute_query(query, params=(), conn=None):
+    with transacao(conn) as conn:
+        try:
+            inicio = time.perf_counter()
+            cursor = conn.execute(query, params)
+            registrar_consulta(query, params, inicio, cursor.rowcount, tipo='escrita')
+        except Exception as e:
+            print(f"ERRO AO EXECUTAR QUERY: {e}")
+            raise e
+        return cursor.lastrowid
 
 # --- A FUNÇÃO INTELIGENTE E À PROVA DE FALHAS ---
-def add_transacao_bancaria(data):
+# Todas as funções de escrita aceitam `conn` para participar de uma transação já aberta (ver transacao());
+# sem `conn`, passam pelo escritor serializado (@escrita).
+@escrita
+def add_transacao_bancaria(data, conn=None):
     # Base de colunas e valores que são sempre obrigatórios
     cols = ['conta_id', 'data', 'tipo', 'descricao', 'valor']
     vals = [data['conta_id'], data['data'], data['tipo'], data['descricao'], data['valor']]
@@ -71,96 +932,137 @@ def add_transacao_bancaria(data):
     query = f"INSERT INTO transacoes_bancarias ({query_cols}) VALUES ({query_placeholders})"
     
     # Executa a query com a lista de valores convertida para tupla
-    execute_query(query, tuple(vals))
-
-def registrar_pagamento_parcela(plano_id, data):
-    # Esta função agora simplesmente chama add_transacao_bancaria, que é mais robusta.
-    # A lógica de transação atômica que implementamos antes garante a segurança.
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-    try:
-        cursor.execute("SELECT venda_id FROM plano_recebimentos WHERE id = ?", (plano_id,))
-        plano_result = cursor.fetchone()
+    return execute_query(query, tuple(vals), conn=conn)
+
+@escrita
+def registrar_pagamento_parcela(plano_id, data, conn=None):
+    # Baixa da parcela e lançamento no extrato na MESMA transação: ou os dois são gravados, ou nenhum.
+    with transacao(conn) as conn:
+        plano_result = conn.execute("SELECT venda_id FROM plano_recebimentos WHERE id = ?", (plano_id,)).fetchone()
         if not plano_result: raise ValueError(f"Parcela com ID {plano_id} não encontrada.")
         venda_id = plano_result['venda_id']
-        cursor.execute("SELECT cliente FROM vendas WHERE id = ?", (venda_id,))
-        venda_result = cursor.fetchone()
+        venda_result = conn.execute("SELECT cliente FROM vendas WHERE id = ?", (venda_id,)).fetchone()
         cliente = venda_result['cliente'] if venda_result else "Cliente Excluído"
-        cursor.execute("BEGIN TRANSACTION;")
-        cursor.execute("UPDATE plano_recebimentos SET status = 'Pago', valor_pago = ?, data_pagamento = ?, forma_pagamento = ? WHERE id = ?", (data['valor_pago'], data['data_pagamento'], data['forma_pagamento'], plano_id))
+        conn.execute("UPDATE plano_recebimentos SET status = 'Pago', valor_pago = ?, data_pagamento = ?, forma_pagamento = ? WHERE id = ?", (data['valor_pago'], data['data_pagamento'], data['forma_pagamento'], plano_id))
         if data.get('conta_id'):
             transacao_data = {
                 'conta_id': data['conta_id'], 'data': data['data_pagamento'], 'tipo': 'Entrada',
                 'descricao': f"Recebimento Venda #{venda_id} - {cliente}",
                 'valor': data['valor_pago'], 'venda_id': venda_id, 'plano_recebimento_id': plano_id
             }
-            add_transacao_bancaria(transacao_data)
-        conn.commit()
-    except Exception as e:
-        print(f"ERRO NA TRANSAÇÃO, revertendo... Erro: {e}")
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+            add_transacao_bancaria(transacao_data, conn=conn)
 
 # ... (Resto das funções mantidas na versão limpa e descompactada)
-def add_conta_bancaria(data):
-    last_id = execute_query("INSERT INTO contas_bancarias (nome_banco, agencia, conta, saldo_inicial, data_criacao) VALUES (?, ?, ?, ?, ?)", (data['nome_banco'], data['agencia'], data['conta'], data['saldo_inicial'], datetime.now().strftime("%Y-%m-%d")))
-    if data['saldo_inicial'] > 0 and last_id: add_transacao_bancaria({'conta_id': last_id, 'data': datetime.now().strftime("%Y-%m-%d"), 'tipo': 'Entrada', 'descricao': 'Saldo Inicial', 'valor': data['saldo_inicial']})
+@escrita
+def add_conta_bancaria(data, conn=None):
+    with transacao(conn) as conn:
+        last_id = execute_query("INSERT INTO contas_bancarias (nome_banco, agencia, conta, saldo_inicial, data_criacao) VALUES (?, ?, ?, ?, ?)", (data['nome_banco'], data['agencia'], data['conta'], data['saldo_inicial'], datetime.now().strftime("%Y-%m-%d")), conn=conn)
+        if data['saldo_inicial'] > 0 and last_id: add_transacao_bancaria({'conta_id': last_id, 'data': datetime.now().strftime("%Y-%m-%d"), 'tipo': 'Entrada', 'descricao': 'Saldo Inicial', 'valor': data['saldo_inicial']}, conn=conn)
+    return last_id
 def get_contas_bancarias():
     return get_data_as_dataframe("SELECT * FROM contas_bancarias")
 def get_saldo_contas():
-    return get_data_as_dataframe("SELECT c.id, c.nome_banco, c.agencia, c.conta, (SELECT TOTAL(CASE WHEN tipo = 'Entrada' THEN valor ELSE -valor END) FROM transacoes_bancarias t WHERE t.conta_id = c.id) as saldo_atual FROM contas_bancarias c")
-def update_parcela_plano(plano_id, data):
-    execute_query( "UPDATE plano_recebimentos SET descricao = ?, valor_previsto = ?, data_vencimento = ? WHERE id = ? AND status = 'Pendente'", (data['descricao'], data['valor_previsto'], data['data_vencimento'], plano_id))
+    return get_data_as_dataframe("SELECT id, nome_banco, agencia, conta, saldo_atual FROM contas_bancarias")
+@escrita
+def update_parcela_plano(plano_id, data, conn=None):
+    execute_query( "UPDATE plano_recebimentos SET descricao = ?, valor_previsto = ?, data_vencimento = ? WHERE id = ? AND status = 'Pendente'", (data['descricao'], data['valor_previsto'], data['data_vencimento'], plano_id), conn=conn)
 def get_all_vendas_options():
     return get_data_as_dataframe("SELECT id, cliente, nome_kit FROM vendas ORDER BY id DESC")
-def add_venda(data):
-    venda_id = execute_query("INSERT INTO vendas (cliente, telefone, email, data_venda, nome_kit, valor_venda, valor_frete) VALUES (?, ?, ?, ?, ?, ?, ?)", (data['cliente'], data['telefone'], data['email'], data['data_venda'], data['nome_kit'], data['valor_venda'], data['valor_frete']))
-    if venda_id:
-        execute_query("INSERT INTO custos (venda_id) VALUES (?)", (venda_id,))
-        execute_query("INSERT INTO entregas (venda_id) VALUES (?)", (venda_id,))
+@escrita
+def add_venda(data, conn=None):
+    # Venda, custos e entrega nascem juntos: uma transação, um commit
+    with transacao(conn) as conn:
+        venda_id = execute_query("INSERT INTO vendas (cliente, telefone, email, data_venda, nome_kit, valor_venda, valor_frete) VALUES (?, ?, ?, ?, ?, ?, ?)", (data['cliente'], data['telefone'], data['email'], data['data_venda'], data['nome_kit'], data['valor_venda'], data['valor_frete']), conn=conn)
+        if venda_id:
+            execute_query("INSERT INTO custos (venda_id) VALUES (?)", (venda_id,), conn=conn)
+            execute_query("INSERT INTO entregas (venda_id) VALUES (?)", (venda_id,), conn=conn)
     return venda_id
-def delete_venda(venda_id):
-    execute_query("DELETE FROM vendas WHERE id = ?", (venda_id,))
-def update_custo(venda_id, custo_mcpf, custo_madeireira):
-    execute_query("UPDATE custos SET custo_mcpf = ?, custo_madeireira = ? WHERE venda_id = ?", (custo_mcpf, custo_madeireira, venda_id))
-def add_pagamento_custo(data):
-    execute_query("INSERT INTO pagamentos_custos (venda_id, tipo_fornecedor, valor, data_pagamento) VALUES (?, ?, ?, ?)", (data['venda_id'], data['tipo_fornecedor'], data['valor'], data['data_pagamento']))
-def delete_pagamento_custo(pagamento_id):
-    execute_query("DELETE FROM pagamentos_custos WHERE id = ?", (pagamento_id,))
-def add_despesa_paga(data):
-    execute_query("INSERT INTO despesas_pagas (venda_id, tipo_despesa, valor, data_pagamento) VALUES (?, ?, ?, ?)", (data['venda_id'], data['tipo_despesa'], data['valor'], data['data_pagamento']))
-def delete_despesa_paga(despesa_id):
-    execute_query("DELETE FROM despesas_pagas WHERE id = ?", (despesa_id,))
+@escrita
+def delete_venda(venda_id, conn=None):
+    execute_query("DELETE FROM vendas WHERE id = ?", (venda_id,), conn=conn)
+@escrita
+def update_custo(venda_id, custo_mcpf, custo_madeireira, conn=None):
+    execute_query("UPDATE custos SET custo_mcpf = ?, custo_madeireira = ? WHERE venda_id = ?", (custo_mcpf, custo_madeireira, venda_id), conn=conn)
+@escrita
+def add_pagamento_custo(data, conn=None):
+    execute_query("INSERT INTO pagamentos_custos (venda_id, tipo_fornecedor, valor, data_pagamento) VALUES (?, ?, ?, ?)", (data['venda_id'], data['tipo_fornecedor'], data['valor'], data['data_pagamento']), conn=conn)
+@escrita
+def delete_pagamento_custo(pagamento_id, conn=None):
+    execute_query("DELETE FROM pagamentos_custos WHERE id = ?", (pagamento_id,), conn=conn)
+@escrita
+def add_despesa_paga(data, conn=None):
+    execute_query("INSERT INTO despesas_pagas (venda_id, tipo_despesa, valor, data_pagamento) VALUES (?, ?, ?, ?)", (data['venda_id'], data['tipo_despesa'], data['valor'], data['data_pagamento']), conn=conn)
+@escrita
+def delete_despesa_paga(despesa_id, conn=None):
+    execute_query("DELETE FROM despesas_pagas WHERE id = ?", (despesa_id,), conn=conn)
 def get_entrega_by_venda_id(venda_id):
     df = get_data_as_dataframe("SELECT * FROM entregas WHERE id = ?", (venda_id,))
     return df.iloc[0] if not df.empty else None
-def update_entrega(data):
-    execute_query("UPDATE entregas SET status_entrega = ?, endereco_entrega = ?, data_entrega = ?, observacoes = ? WHERE venda_id = ?", (data['status_entrega'], data['endereco_entrega'], data['data_entrega'], data['observacoes'], data['venda_id']))
+@escrita
+def update_entrega(data, conn=None):
+    execute_query("UPDATE entregas SET status_entrega = ?, endereco_entrega = ?, data_entrega = ?, observacoes = ? WHERE venda_id = ?", (data['status_entrega'], data['endereco_entrega'], data['data_entrega'], data['observacoes'], data['venda_id']), conn=conn)
 def get_config():
     df = get_data_as_dataframe("SELECT * FROM configuracoes")
     return pd.Series(df.valor.values, index=df.chave).to_dict()
-def save_config(config_data):
-    for key, value in config_data.items(): execute_query("UPDATE configuracoes SET valor = ? WHERE chave = ?", (value, key))
-def add_parcela_plano(data):
-    execute_query("INSERT INTO plano_recebimentos (venda_id, descricao, valor_previsto, data_vencimento) VALUES (?, ?, ?, ?)", (data['venda_id'], data['descricao'], data['valor_previsto'], data['data_vencimento']))
-def delete_parcela_plano(plano_id):
-    execute_query("DELETE FROM plano_recebimentos WHERE id = ?", (plano_id,))
+@escrita
+def save_config(config_data, conn=None):
+    with transacao(conn) as conn:
+        # Só as chaves que mudaram: cada UPDATE dispara o trigger que refaz as despesas de todo o venda_resumo
+        for key, value in config_data.items(): execute_query("UPDATE configuracoes SET valor = ? WHERE chave = ? AND valor IS NOT ?", (value, key, value), conn=conn)
+@escrita
+def add_parcela_plano(data, conn=None):
+    execute_query("INSERT INTO plano_recebimentos (venda_id, descricao, valor_previsto, data_vencimento) VALUES (?, ?, ?, ?)", (data['venda_id'], data['descricao'], data['valor_previsto'], data['data_vencimento']), conn=conn)
+@escrita
+def delete_parcela_plano(plano_id, conn=None):
+    execute_query("DELETE FROM plano_recebimentos WHERE id = ?", (plano_id,), conn=conn)
 def get_total_saldo_bancario():
-    df = get_data_as_dataframe("SELECT TOTAL(CASE WHEN tipo = 'Entrada' THEN valor ELSE -valor END) as saldo_total FROM transacoes_bancarias")
+    df = get_data_as_dataframe("SELECT TOTAL(saldo_atual) as saldo_total FROM contas_bancarias")
     if not df.empty and df['saldo_total'].iloc[0] is not None: return df['saldo_total'].iloc[0]
     return 0
-def delete_transacao_bancaria(transacao_id):
-    conn = connect_db(); cursor = conn.cursor(); cursor.execute("PRAGMA foreign_keys = ON;")
-    try:
-        cursor.execute("SELECT plano_recebimento_id FROM transacoes_bancarias WHERE id = ?", (transacao_id,)); result = cursor.fetchone()
+def get_extrato_pagina(conta_id, limite=50, antes_de=None, data_inicio=None, data_fim=None, tipo=None):
+    """Uma página do extrato (mais recentes primeiro) com paginação keyset em (data, id).
+
+    `antes_de` é o par (data, id) da última linha da página anterior. Retorna o DataFrame da página
+    e o cursor da próxima página (None quando não há mais lançamentos).
+    """
+    condicoes, params = ["conta_id = ?"], [int(conta_id)]
+    if antes_de is not None:
+        condicoes.append("(data, id) < (?, ?)")
+        params.extend([antes_de[0], int(antes_de[1])])
+    if data_inicio:
+        condicoes.append("data >= ?"); params.append(str(data_inicio))
+    if data_fim:
+        condicoes.append("data < date(?, '+1 day')"); params.append(str(data_fim))  # Inclui as linhas com hora no último dia
+    if tipo:
+        condicoes.append("tipo = ?"); params.append(tipo)
+    df = get_data_as_dataframe(
+        f"SELECT id, data, tipo, descricao, valor, saldo_apos FROM transacoes_bancarias WHERE {' AND '.join(condicoes)} ORDER BY data DESC, id DESC LIMIT ?",
+        tuple(params) + (limite + 1,)  # Uma linha a mais só para saber se existe próxima página
+    )
+    if len(df) > limite:
+        df = df.iloc[:limite]
+        return df, (df['data'].iloc[-1], int(df['id'].iloc[-1]))
+    return df, None
+
+@escrita
+def delete_transacao_bancaria(transacao_id, conn=None):
+    # Excluir o recebimento do extrato devolve a parcela para "Pendente" na mesma transação
+    with transacao(conn) as conn:
+        result = conn.execute("SELECT plano_recebimento_id FROM transacoes_bancarias WHERE id = ?", (transacao_id,)).fetchone()
         plano_id = result['plano_recebimento_id'] if result else None
-        cursor.execute("BEGIN TRANSACTION;")
-        cursor.execute("DELETE FROM transacoes_bancarias WHERE id = ?", (transacao_id,))
-        if plano_id: cursor.execute("UPDATE plano_recebimentos SET status = 'Pendente', valor_pago = NULL, data_pagamento = NULL, forma_pagamento = NULL WHERE id = ?", (plano_id,))
-        conn.commit()
-    except Exception as e:
-        print(f"ERRO NA TRANSAÇÃO DE EXCLUSÃO, revertendo... Erro: {e}"); conn.rollback(); raise e
-    finally: conn.close()
\ No newline at end of file
+        conn.execute("DELETE FROM transacoes_bancarias WHERE id = ?", (transacao_id,))
+        if plano_id: conn.execute("UPDATE plano_recebimentos SET status = 'Pendente', valor_pago = NULL, data_pagamento = NULL, forma_pagamento = NULL WHERE id = ?", (plano_id,))
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Manutenção do banco de dados financeiro.")
+    parser.add_argument("comando", nargs="?", default="verificar-indices", choices=["verificar-indices", "recalcular-resumo", "recalcular-saldos"])
+    args = parser.parse_args()
+    init_db()
+    if args.comando == "verificar-indices":
+        print(verificar_planos_de_consulta().to_string(index=False))
+    elif args.comando == "recalcular-resumo":
+        divergencias = rebuild_venda_resumo()
+        print("Resumo recalculado. Nenhuma divergência encontrada." if divergencias.empty else f"Resumo recalculado. {len(divergencias)} venda(s) estavam divergentes:\n{divergencias.to_string(index=False)}")
+    elif args.comando == "recalcular-saldos":
+        divergencias = rebuild_saldos_bancarios()
+        print("Saldos recalculados. Nenhuma divergência encontrada." if divergencias.empty else f"Saldos recalculados. {len(divergencias)} conta(s) estavam divergentes:\n{divergencias.to_string(index=False)}")
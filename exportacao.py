@@ -0,0 +1,104 @@
+# exportacao.py (Exportação de recibos em lote)
+import json
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from database import get_data_as_dataframe, TOLERANCIA_DIVERGENCIA, STATUS_ENTREGA
+
+VENDAS_POR_CONSULTA = 200  # Vendas (e parcelas) lidas do banco de cada vez
+TAREFAS_POR_PROCESSO = 4  # Recibos em andamento por processo: limita quantos PDFs ficam na memória
+
+def filtrar_vendas_recibo(data_inicio=None, data_fim=None, status_entrega=None, apenas_com_saldo=False):
+    """IDs das vendas (mais recentes primeiro) que entram na exportação."""
+    condicoes, params = [], []
+    if data_inicio:
+        condicoes.append("v.data_venda >= ?"); params.append(str(data_inicio))
+    if data_fim:
+        condicoes.append("v.data_venda < date(?, '+1 day')"); params.append(str(data_fim))
+    if status_entrega:
+        condicoes.append("COALESCE(e.status_entrega, 'Aguardando') = ?"); params.append(status_entrega)
+    if apenas_com_saldo:
+        condicoes.append("r.valor_venda - r.total_recebido > ?"); params.append(TOLERANCIA_DIVERGENCIA)
+    where = " AND ".join(condicoes) if condicoes else "1 = 1"
+    df = get_data_as_dataframe(f"""
+        SELECT v.id FROM vendas v
+        LEFT JOIN entregas e ON e.venda_id = v.id
+        LEFT JOIN venda_resumo r ON r.venda_id = v.id
+        WHERE {where} ORDER BY v.data_venda DESC, v.id DESC""", tuple(params))
+    return df['id'].tolist()
+
+def _dados_recibos(venda_ids):
+    """Lê as vendas e parcelas de um grupo de IDs (duas consultas) e monta os dados de cada recibo."""
+    from pdf_generator import montar_dados_recibo  # fpdf só é carregado quando há recibo a gerar
+    ids_json = json.dumps([int(venda_id) for venda_id in venda_ids])
+    vendas = get_data_as_dataframe("SELECT * FROM vendas WHERE id IN (SELECT value FROM json_each(?))", (ids_json,), usar_cache=False)
+    parcelas = get_data_as_dataframe("SELECT * FROM plano_recebimentos WHERE venda_id IN (SELECT value FROM json_each(?)) ORDER BY venda_id, id", (ids_json,), usar_cache=False)
+    parcelas_por_venda = {}
+    for parcela in parcelas.to_dict('records'):
+        parcelas_por_venda.setdefault(parcela['venda_id'], []).append(parcela)
+    for venda in vendas.to_dict('records'):
+        yield montar_dados_recibo(venda, parcelas_por_venda.get(venda['id'], []))
+
+def nome_arquivo_recibo(dados):
+    cliente = re.sub(r'[^\w\-]+', '_', dados['cliente'], flags=re.UNICODE).strip('_') or 'cliente'
+    return f"Recibo_Venda_{dados['id']}_{cliente}.pdf"
+
+def exportar_recibos_zip(destino, venda_ids, processos=None, progresso=None):
+    """Gera os recibos das vendas em paralelo (um processo por núcleo) e grava no ZIP `destino`.
+
+    Cada PDF é escrito no ZIP assim que fica pronto; no máximo `processos * TAREFAS_POR_PROCESSO`
+    recibos ficam em andamento ao mesmo tempo, então a memória não cresce com a quantidade de vendas.
+    `progresso(concluidos, total)` é chamado a cada recibo gravado. Retorna a quantidade de recibos.
+    """
+    from pdf_generator import gerar_recibo_venda
+    processos = processos or os.cpu_count() or 1
+    limite = processos * TAREFAS_POR_PROCESSO
+    total, concluidos = len(venda_ids), 0
+    # "spawn": não herda threads e conexões do processo do Streamlit (fork com threads é inseguro)
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor, \
+            zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as arquivo_zip:  # PDFs já saem comprimidos
+        pendentes = {}
+
+        def gravar_concluidos(bloquear):
+            nonlocal concluidos
+            prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED) if bloquear else ([f for f in pendentes if f.done()], None)
+            for futuro in prontos:
+                arquivo_zip.writestr(pendentes.pop(futuro), futuro.result())
+                concluidos += 1
+                if progresso:
+                    progresso(concluidos, total)
+
+        for inicio in range(0, total, VENDAS_POR_CONSULTA):
+            for dados in _dados_recibos(venda_ids[inicio:inicio + VENDAS_POR_CONSULTA]):
+                while len(pendentes) >= limite:
+                    gravar_concluidos(bloquear=True)
+                pendentes[executor.submit(gerar_recibo_venda, dados)] = nome_arquivo_recibo(dados)
+            gravar_concluidos(bloquear=False)
+        while pendentes:
+            gravar_concluidos(bloquear=True)
+    return concluidos
+
+def tarefa_exportar_recibos(progresso, destino, venda_ids):
+    """Exportação como tarefa em segundo plano (tarefas.enviar_tarefa): o ZIP fica em `destino`."""
+    quantidade = exportar_recibos_zip(destino, venda_ids, progresso=lambda feitos, total: progresso(feitos, total, f"{feitos}/{total} recibos"))
+    return {'arquivo': destino, 'mensagem': f"{quantidade} recibo(s) exportados."}
+
+if __name__ == "__main__":
+    import argparse
+    import database
+    parser = argparse.ArgumentParser(description="Exporta os recibos de venda em PDF para um arquivo ZIP.")
+    parser.add_argument("destino", help="Arquivo .zip a ser criado")
+    parser.add_argument("--inicio", help="Data inicial da venda (AAAA-MM-DD)")
+    parser.add_argument("--fim", help="Data final da venda (AAAA-MM-DD)")
+    parser.add_argument("--status", choices=STATUS_ENTREGA, help="Status da entrega")
+    parser.add_argument("--com-saldo", action="store_true", help="Somente vendas com saldo a receber")
+    parser.add_argument("--processos", type=int, help="Processos em paralelo (padrão: núcleos da CPU)")
+    args = parser.parse_args()
+    database.init_db()
+    ids = filtrar_vendas_recibo(args.inicio, args.fim, args.status, args.com_saldo)
+    quantidade = exportar_recibos_zip(args.destino, ids, processos=args.processos,
+                                      progresso=lambda feitos, total: print(f"\r{feitos}/{total} recibos", end="", flush=True))
+    print(f"\n{quantidade} recibo(s) exportados para {args.destino}")
@@ -0,0 +1,120 @@
+# gerar_dados.py (Gerador de dados sintéticos para testes de desempenho)
+# Uso: python gerar_dados.py bench.db --vendas 10000 [--parcelas 4 --pagamentos-custos 2 --despesas 2 --contas 3 --saidas 1]
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+import database
+from database import transacao, DESPESAS, STATUS_ENTREGA
+
+LOTE_INSERCAO = 10000  # Linhas por executemany/transação
+NOMES = ('Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Fábio', 'Gabriela', 'Hélio', 'Íris', 'João', 'Karina', 'Luís', 'Márcia', 'Nélson', 'Otávio', 'Patrícia')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Araújo', 'Conceição', 'Gonçalves', 'Ribeiro')
+KITS = ('Chalé 36m²', 'Chalé 48m²', 'Casa Campo 60m²', 'Casa Praia 72m²', 'Sobrado 96m²', 'Studio 24m²')
+FORMAS_PAGAMENTO = ('PIX', 'Cartão', 'Boleto', 'Dinheiro', 'Transferência')
+
+def _em_lotes(linhas):
+    for inicio in range(0, len(linhas), LOTE_INSERCAO):
+        yield linhas[inicio:inicio + LOTE_INSERCAO]
+
+def _inserir(comando, linhas):
+    for lote in _em_lotes(linhas):
+        with transacao() as conn:
+            conn.executemany(comando, lote)
+
+def gerar_banco(caminho, vendas=1000, parcelas=4, pagamentos_custos=2, despesas=2, contas=3, saidas=1, semente=42, inicio=date(2022, 1, 1), dias=1095):
+    """Cria (substituindo) um banco compatível com financeiro.db e o preenche com dados sintéticos.
+
+    As quantidades de parcelas, pagamentos, despesas e saídas são médias por venda. Metade das
+    parcelas (aprox.) sai como paga, com o lançamento de entrada correspondente no extrato.
+    Retorna um dict com a quantidade de linhas por tabela.
+    """
+    rnd = random.Random(semente)
+    database.DB_NAME = caminho
+    database.remover_arquivos_db()
+    database.init_db()
+
+    def dia(deslocamento):
+        return (inicio + timedelta(days=min(max(deslocamento, 0), dias))).isoformat()
+
+    # Contas bancárias
+    _inserir("INSERT INTO contas_bancarias (nome_banco, agencia, conta, saldo_inicial, data_criacao) VALUES (?, ?, ?, 0, ?)",
+             [(f"Banco {numero + 1}", f"{rnd.randint(1, 9999):04d}", f"{rnd.randint(10000, 99999)}-{rnd.randint(0, 9)}", inicio.isoformat()) for numero in range(contas)])
+
+    # Vendas (ids 1..N em um banco novo), custos e entregas
+    linhas_vendas, dia_venda = [], []
+    for numero in range(vendas):
+        deslocamento = rnd.randrange(dias)
+        dia_venda.append(deslocamento)
+        cliente = f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {numero + 1}"
+        linhas_vendas.append((cliente, f"(71) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}", f"cliente{numero + 1}@exemplo.com.br",
+                              dia(deslocamento), rnd.choice(KITS), round(rnd.uniform(20000, 250000), 2), round(rnd.uniform(0, 5000), 2)))
+    _inserir("INSERT INTO vendas (cliente, telefone, email, data_venda, nome_kit, valor_venda, valor_frete) VALUES (?, ?, ?, ?, ?, ?, ?)", linhas_vendas)
+    _inserir("INSERT INTO custos (venda_id, custo_mcpf, custo_madeireira) VALUES (?, ?, ?)",
+             [(venda_id, round(valor * rnd.uniform(0.3, 0.5), 2), round(valor * rnd.uniform(0.05, 0.15), 2))
+              for venda_id, (_, _, _, _, _, valor, _) in enumerate(linhas_vendas, start=1)])
+    _inserir("INSERT INTO entregas (venda_id, status_entrega) VALUES (?, ?)",
+             [(venda_id, rnd.choice(STATUS_ENTREGA)) for venda_id in range(1, vendas + 1)])
+
+    def quantidade(media):
+        return rnd.randint(0, 2 * media) if media else 0
+
+    # Plano de recebimentos (parte já paga), pagamentos a fornecedores e despesas pagas
+    linhas_parcelas, linhas_pagamentos, linhas_despesas = [], [], []
+    tipos_despesa = DESPESAS
+    for venda_id, deslocamento in enumerate(dia_venda, start=1):
+        valor_venda = linhas_vendas[venda_id - 1][5]
+        total_parcelas = quantidade(parcelas)
+        for numero in range(total_parcelas):
+            valor = round(valor_venda / total_parcelas, 2)
+            vencimento = deslocamento + 30 * numero
+            if rnd.random() < 0.5:
+                linhas_parcelas.append((venda_id, f"Parcela {numero + 1}/{total_parcelas}", valor, dia(vencimento), 'Pago', valor, dia(vencimento + rnd.randint(-5, 10)), rnd.choice(FORMAS_PAGAMENTO)))
+            else:
+                linhas_parcelas.append((venda_id, f"Parcela {numero + 1}/{total_parcelas}", valor, dia(vencimento), 'Pendente', None, None, None))
+        for _ in range(quantidade(pagamentos_custos)):
+            linhas_pagamentos.append((venda_id, rnd.choice(('MCPF', 'Madeireira')), round(rnd.uniform(500, 20000), 2), dia(deslocamento + rnd.randint(0, 90))))
+        for _ in range(quantidade(despesas)):
+            linhas_despesas.append((venda_id, rnd.choice(tipos_despesa), round(rnd.uniform(50, 5000), 2), dia(deslocamento + rnd.randint(0, 90))))
+    _inserir("INSERT INTO plano_recebimentos (venda_id, descricao, valor_previsto, data_vencimento, status, valor_pago, data_pagamento, forma_pagamento) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linhas_parcelas)
+    _inserir("INSERT INTO pagamentos_custos (venda_id, tipo_fornecedor, valor, data_pagamento) VALUES (?, ?, ?, ?)", linhas_pagamentos)
+    _inserir("INSERT INTO despesas_pagas (venda_id, tipo_despesa, valor, data_pagamento) VALUES (?, ?, ?, ?)", linhas_despesas)
+
+    # Extrato: entradas das parcelas pagas e saídas avulsas. Inseridas em ordem de data, o trigger de
+    # saldo só calcula o saldo_apos da própria linha (não há lançamentos posteriores para atualizar).
+    pagas = database.get_data_as_dataframe("SELECT p.id, p.venda_id, p.valor_pago, p.data_pagamento, v.cliente FROM plano_recebimentos p JOIN vendas v ON v.id = p.venda_id WHERE p.status = 'Pago'", usar_cache=False)
+    lancamentos = [(rnd.randint(1, contas), linha.data_pagamento, 'Entrada', f"Recebimento Venda #{linha.venda_id} - {linha.cliente}", linha.valor_pago, linha.venda_id, linha.id)
+                   for linha in pagas.itertuples(index=False)]
+    lancamentos += [(rnd.randint(1, contas), dia(rnd.randrange(dias)), 'Saída', rnd.choice(('Tarifa bancária', 'Frete', 'Aluguel', 'Fornecedor')), round(rnd.uniform(50, 8000), 2), None, None)
+                    for _ in range(saidas * vendas)]
+    lancamentos.sort(key=lambda lancamento: lancamento[1])
+    _inserir("INSERT INTO transacoes_bancarias (conta_id, data, tipo, descricao, valor, venda_id, plano_recebimento_id) VALUES (?, ?, ?, ?, ?, ?, ?)", lancamentos)
+
+    with database.pooled_connection() as conn:
+        conn.execute("PRAGMA optimize;")
+    database.checkpoint_wal()
+    return {
+        'contas_bancarias': contas, 'vendas': vendas, 'custos': vendas, 'entregas': vendas,
+        'plano_recebimentos': len(linhas_parcelas), 'pagamentos_custos': len(linhas_pagamentos),
+        'despesas_pagas': len(linhas_despesas), 'transacoes_bancarias': len(lancamentos),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um banco financeiro.db com dados sintéticos.")
+    parser.add_argument("destino", help="Arquivo do banco a ser criado (será substituído)")
+    parser.add_argument("--vendas", type=int, default=1000)
+    parser.add_argument("--parcelas", type=int, default=4, help="Parcelas por venda (média)")
+    parser.add_argument("--pagamentos-custos", type=int, default=2, help="Pagamentos a fornecedores por venda (média)")
+    parser.add_argument("--despesas", type=int, default=2, help="Despesas pagas por venda (média)")
+    parser.add_argument("--contas", type=int, default=3)
+    parser.add_argument("--saidas", type=int, default=1, help="Saídas avulsas no extrato por venda (média)")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    if os.path.abspath(args.destino) == os.path.abspath(database.DB_NAME):
+        parser.error("Use outro arquivo: o gerador substitui o banco de destino.")
+    inicio = time.perf_counter()
+    linhas = gerar_banco(args.destino, args.vendas, args.parcelas, args.pagamentos_custos, args.despesas, args.contas, args.saidas, args.semente)
+    for tabela, quantidade in linhas.items():
+        print(f"{tabela}: {quantidade}")
+    print(f"{sum(linhas.values())} linhas geradas em {time.perf_counter() - inicio:.1f}s")
@@ -0,0 +1,326 @@
+# importacao.py (Importação em lote de vendas, planos e pagamentos)
+import json
+import os
+import re
+import unicodedata
+from datetime import date, datetime
+import pandas as pd
+import database
+from database import transacao, DESPESAS
+
+# --- FORMATO DOS ARQUIVOS ---
+# Um CSV por tabela (o nome do arquivo diz qual: vendas.csv, plano_recebimentos.csv...) ou uma
+# planilha XLSX com uma aba para cada. As linhas filhas apontam para a venda pela coluna `ref`
+# (o valor da coluna `ref` da venda no mesmo lote de arquivos) ou por `venda_id` (venda já cadastrada).
+# As tabelas são sempre processadas nesta ordem, para que as vendas existam antes das linhas filhas.
+COLUNAS_IMPORTACAO = {
+    'vendas': ['ref', 'cliente', 'telefone', 'email', 'data_venda', 'nome_kit', 'valor_venda', 'valor_frete'],
+    'custos': ['ref', 'venda_id', 'custo_mcpf', 'custo_madeireira'],
+    'plano_recebimentos': ['ref', 'venda_id', 'descricao', 'valor_previsto', 'data_vencimento', 'valor_pago', 'data_pagamento', 'forma_pagamento'],
+    'pagamentos_custos': ['ref', 'venda_id', 'tipo_fornecedor', 'valor', 'data_pagamento'],
+    'despesas_pagas': ['ref', 'venda_id', 'tipo_despesa', 'valor', 'data_pagamento'],
+}
+TAMANHO_LOTE_PADRAO = 500  # Linhas por transação
+TIPOS_FORNECEDOR = ('MCPF', 'Madeireira')
+FORMATOS_DATA = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d %H:%M:%S')
+
+# --- LEITURA EM LOTES ---
+def _normaliza_nome(texto):
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return texto.strip().lower().replace('-', '').replace(' ', '_')  # "E-mail" -> email, "Valor Venda" -> valor_venda
+
+def _lotes_csv(origem, tamanho_lote):
+    # sep=None: detecta sozinho vírgula ou ponto e vírgula (padrão do Excel em português)
+    leitor = pd.read_csv(origem, sep=None, engine='python', dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=tamanho_lote)
+    numero_linha = 2  # A linha 1 é o cabeçalho
+    for df in leitor:
+        df.columns = [_normaliza_nome(coluna) for coluna in df.columns]
+        registros = df.to_dict('records')
+        yield [(numero_linha + i, registro) for i, registro in enumerate(registros)]
+        numero_linha += len(registros)
+
+def _lotes_planilha(planilha, tamanho_lote):
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = [_normaliza_nome(coluna) if coluna is not None else '' for coluna in next(linhas, ())]
+    lote = []
+    for numero_linha, valores in enumerate(linhas, start=2):
+        if all(valor in (None, '') for valor in valores):
+            continue
+        lote.append((numero_linha, dict(zip(cabecalho, valores))))
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def _abrir_fontes(arquivos, tamanho_lote):
+    """Separa os arquivos por tabela. Retorna {tabela: [(nome da origem, gerador de lotes)]} e os nomes ignorados."""
+    fontes, ignorados = {}, []
+    for nome, origem in arquivos:
+        extensao = os.path.splitext(nome)[1].lower()
+        if extensao in ('.xlsx', '.xlsm'):
+            try:
+                import openpyxl  # Dependência opcional: só é necessária para planilhas
+            except ImportError:
+                raise RuntimeError("Para importar planilhas .xlsx instale o pacote openpyxl (pip install openpyxl).")
+            livro = openpyxl.load_workbook(origem, read_only=True, data_only=True)
+            for aba in livro.worksheets:
+                tabela = _normaliza_nome(aba.title)
+                if tabela in COLUNAS_IMPORTACAO:
+                    fontes.setdefault(tabela, []).append((f"{nome}:{aba.title}", _lotes_planilha(aba, tamanho_lote)))
+                else:
+                    ignorados.append(f"{nome}:{aba.title}")
+        elif extensao in ('.csv', '.txt'):
+            tabela = _normaliza_nome(os.path.splitext(os.path.basename(nome))[0])
+            if tabela in COLUNAS_IMPORTACAO:
+                fontes.setdefault(tabela, []).append((nome, _lotes_csv(origem, tamanho_lote)))
+            else:
+                ignorados.append(nome)
+        else:
+            ignorados.append(nome)
+    return fontes, ignorados
+
+# --- VALIDAÇÃO ---
+def _texto(valor):
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ''
+    return str(valor).strip()
+
+def _numero(registro, campo, obrigatorio=True, positivo=False):
+    valor = registro.get(campo)
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool) and not pd.isna(valor):
+        numero = float(valor)
+    else:
+        texto = _texto(valor).replace('R$', '').replace(' ', '')
+        if not texto:
+            if obrigatorio:
+                raise ValueError(f"{campo} é obrigatório")
+            return None
+        if ',' in texto:  # Formato brasileiro: 1.234,56
+            texto = texto.replace('.', '').replace(',', '.')
+        elif re.fullmatch(r'\d{1,3}(\.\d{3}){2,}', texto):  # Só separador de milhar: 1.234.567
+            texto = texto.replace('.', '')
+        elif re.fullmatch(r'[1-9]\d{0,2}\.\d{3}', texto):
+            # "1.234" é mil duzentos e trinta e quatro numa planilha brasileira e 1,234 em outra: não adivinha
+            raise ValueError(f"{campo} ambíguo: {valor!r} (use 1234, 1.234,00 ou 1234.00)")
+        try:
+            numero = float(texto)
+        except ValueError:
+            raise ValueError(f"{campo} inválido: {valor!r}")
+    if positivo and numero <= 0:
+        raise ValueError(f"{campo} deve ser maior que zero")
+    if numero < 0:
+        raise ValueError(f"{campo} não pode ser negativo")
+    return numero
+
+def _data(registro, campo, obrigatorio=True):
+    valor = registro.get(campo)
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime('%Y-%m-%d')
+    texto = _texto(valor)
+    if not texto:
+        if obrigatorio:
+            raise ValueError(f"{campo} é obrigatório")
+        return None
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"{campo} inválido: {valor!r} (use AAAA-MM-DD ou DD/MM/AAAA)")
+
+def _obrigatorio(registro, campo):
+    texto = _texto(registro.get(campo))
+    if not texto:
+        raise ValueError(f"{campo} é obrigatório")
+    return texto
+
+def _venda_id(registro, refs, vendas_existentes):
+    ref = _texto(registro.get('ref'))
+    if ref:
+        if ref not in refs:
+            raise ValueError(f"ref {ref!r} não corresponde a nenhuma venda importada")
+        return refs[ref]
+    texto = _texto(registro.get('venda_id'))
+    if not texto:
+        raise ValueError("informe ref ou venda_id")
+    try:
+        venda_id = int(float(texto))
+    except ValueError:
+        raise ValueError(f"venda_id inválido: {texto!r}")
+    if venda_id not in vendas_existentes:
+        raise ValueError(f"venda_id {venda_id} não existe")
+    return venda_id
+
+def _valida_venda(registro):
+    return (
+        _obrigatorio(registro, 'cliente'), _texto(registro.get('telefone')), _texto(registro.get('email')),
+        _data(registro, 'data_venda'), _obrigatorio(registro, 'nome_kit'),
+        _numero(registro, 'valor_venda', positivo=True), _numero(registro, 'valor_frete', obrigatorio=False) or 0.0,
+    )
+
+def _valida_custo(registro, venda_id):
+    return (_numero(registro, 'custo_mcpf', obrigatorio=False) or 0.0, _numero(registro, 'custo_madeireira', obrigatorio=False) or 0.0, venda_id)
+
+def _valida_parcela(registro, venda_id):
+    valor_pago = _numero(registro, 'valor_pago', obrigatorio=False)
+    data_pagamento = _data(registro, 'data_pagamento', obrigatorio=valor_pago is not None)
+    status = 'Pago' if valor_pago is not None else 'Pendente'
+    forma_pagamento = _texto(registro.get('forma_pagamento')) or None
+    return (
+        venda_id, _obrigatorio(registro, 'descricao'), _numero(registro, 'valor_previsto', positivo=True),
+        _data(registro, 'data_vencimento', obrigatorio=False), status, valor_pago, data_pagamento, forma_pagamento,
+    )
+
+def _valida_pagamento_custo(registro, venda_id):
+    tipos = {tipo.lower(): tipo for tipo in TIPOS_FORNECEDOR}
+    tipo = tipos.get(_obrigatorio(registro, 'tipo_fornecedor').lower())
+    if tipo is None:
+        raise ValueError(f"tipo_fornecedor deve ser um de: {', '.join(TIPOS_FORNECEDOR)}")
+    return (venda_id, tipo, _numero(registro, 'valor', positivo=True), _data(registro, 'data_pagamento'))
+
+def _valida_despesa_paga(registro, venda_id):
+    tipo = _obrigatorio(registro, 'tipo_despesa').lower()
+    if tipo not in DESPESAS:
+        raise ValueError(f"tipo_despesa deve ser um de: {', '.join(DESPESAS)}")
+    return (venda_id, tipo, _numero(registro, 'valor', positivo=True), _data(registro, 'data_pagamento'))
+
+# Tabelas filhas: validação e comando executado com executemany
+IMPORTACAO_FILHAS = {
+    'custos': (_valida_custo, "UPDATE custos SET custo_mcpf = ?, custo_madeireira = ? WHERE venda_id = ?"),
+    'plano_recebimentos': (_valida_parcela, "INSERT INTO plano_recebimentos (venda_id, descricao, valor_previsto, data_vencimento, status, valor_pago, data_pagamento, forma_pagamento) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"),
+    'pagamentos_custos': (_valida_pagamento_custo, "INSERT INTO pagamentos_custos (venda_id, tipo_fornecedor, valor, data_pagamento) VALUES (?, ?, ?, ?)"),
+    'despesas_pagas': (_valida_despesa_paga, "INSERT INTO despesas_pagas (venda_id, tipo_despesa, valor, data_pagamento) VALUES (?, ?, ?, ?)"),
+}
+
+# --- GRAVAÇÃO (UMA TRANSAÇÃO POR LOTE) ---
+def _grava_vendas(lote, refs, rejeitar):
+    validas = []
+    for numero_linha, registro in lote:
+        try:
+            ref = _texto(registro.get('ref'))
+            if ref and ref in refs:
+                raise ValueError(f"ref {ref!r} repetida")
+            validas.append((numero_linha, registro, ref, _valida_venda(registro)))
+            if ref:
+                refs[ref] = None  # Reserva a ref; o id sai depois do INSERT
+        except ValueError as e:
+            rejeitar(numero_linha, registro, str(e))
+    if not validas:
+        return 0
+    try:
+        with transacao() as conn:
+            conn.executemany("INSERT INTO vendas (cliente, telefone, email, data_venda, nome_kit, valor_venda, valor_frete) VALUES (?, ?, ?, ?, ?, ?, ?)", [params for *_, params in validas])
+            # Com o lock de escrita da transação, os ids do executemany são consecutivos (AUTOINCREMENT)
+            ultimo_id = conn.execute("SELECT last_insert_rowid();").fetchone()[0]
+            primeiro_id = ultimo_id - len(validas) + 1
+            if conn.execute("SELECT COUNT(*) FROM vendas WHERE id BETWEEN ? AND ?", (primeiro_id, ultimo_id)).fetchone()[0] != len(validas):
+                raise RuntimeError("não foi possível identificar os ids das vendas inseridas")
+            ids = range(primeiro_id, ultimo_id + 1)
+            conn.executemany("INSERT INTO custos (venda_id) VALUES (?)", [(venda_id,) for venda_id in ids])
+            conn.executemany("INSERT INTO entregas (venda_id) VALUES (?)", [(venda_id,) for venda_id in ids])
+    except Exception as e:
+        for numero_linha, registro, ref, _ in validas:
+            refs.pop(ref, None)
+            rejeitar(numero_linha, registro, f"erro ao gravar o lote: {e}")
+        return 0
+    for (_, _, ref, _), venda_id in zip(validas, ids):
+        if ref:
+            refs[ref] = venda_id
+    return len(validas)
+
+def _grava_filhas(tabela, lote, refs, rejeitar):
+    validar, comando = IMPORTACAO_FILHAS[tabela]
+    ids_informados = set()
+    for _, registro in lote:
+        try:
+            ids_informados.add(int(float(_texto(registro.get('venda_id')))))
+        except ValueError:
+            pass
+    vendas_existentes = set()
+    if ids_informados:
+        existentes = database.get_data_as_dataframe("SELECT id FROM vendas WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(sorted(ids_informados)),), usar_cache=False)
+        vendas_existentes = set(existentes['id'].tolist())
+    validas = []
+    for numero_linha, registro in lote:
+        try:
+            validas.append((numero_linha, registro, validar(registro, _venda_id(registro, refs, vendas_existentes))))
+        except ValueError as e:
+            rejeitar(numero_linha, registro, str(e))
+    if not validas:
+        return 0
+    try:
+        with transacao() as conn:
+            conn.executemany(comando, [params for *_, params in validas])
+    except Exception as e:
+        for numero_linha, registro, _ in validas:
+            rejeitar(numero_linha, registro, f"erro ao gravar o lote: {e}")
+        return 0
+    return len(validas)
+
+def importar_arquivos(arquivos, tamanho_lote=TAMANHO_LOTE_PADRAO, progresso=None):
+    """Importa vendas e suas tabelas filhas a partir de CSVs e/ou planilhas XLSX.
+
+    `arquivos` é uma lista de (nome, caminho ou arquivo aberto). Cada lote válido é gravado em uma
+    transação; linhas inválidas não interrompem a importação e voltam no relatório de rejeitadas.
+    `progresso(tabela, linhas_lidas)` é chamado após cada lote. Retorna um dict com `importadas`
+    (linhas gravadas por tabela), `rejeitadas` (DataFrame) e `ignorados` (arquivos/abas sem tabela).
+    """
+    fontes, ignorados = _abrir_fontes(arquivos, tamanho_lote)
+    refs, rejeitadas = {}, []
+    importadas = {tabela: 0 for tabela in COLUNAS_IMPORTACAO}
+    for tabela in COLUNAS_IMPORTACAO:
+        for origem, lotes in fontes.get(tabela, []):
+            lidas = 0
+            def rejeitar(numero_linha, registro, motivo):
+                dados = {coluna: _texto(valor) for coluna, valor in registro.items() if coluna}
+                rejeitadas.append({'arquivo': origem, 'tabela': tabela, 'linha': numero_linha, 'motivo': motivo, 'dados': json.dumps(dados, ensure_ascii=False)})
+            for lote in lotes:
+                if tabela == 'vendas':
+                    importadas[tabela] += _grava_vendas(lote, refs, rejeitar)
+                else:
+                    importadas[tabela] += _grava_filhas(tabela, lote, refs, rejeitar)
+                lidas += len(lote)
+                if progresso:
+                    progresso(tabela, lidas)
+    return {
+        'importadas': importadas,
+        'rejeitadas': pd.DataFrame(rejeitadas, columns=['arquivo', 'tabela', 'linha', 'motivo', 'dados']),
+        'ignorados': ignorados,
+    }
+
+def relatorio_rejeitadas_csv(rejeitadas):
+    """Relatório das linhas rejeitadas em CSV (UTF-8 com BOM, abre direto no Excel)."""
+    return rejeitadas.to_csv(index=False, sep=';').encode('utf-8-sig')
+
+def tarefa_importar(progresso, arquivos, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Importação como tarefa em segundo plano (tarefas.enviar_tarefa). O relatório de rejeitadas vira o resultado."""
+    tabelas = list(COLUNAS_IMPORTACAO)
+    resultado = importar_arquivos(arquivos, tamanho_lote, progresso=lambda tabela, lidas: progresso(tabelas.index(tabela), len(tabelas), f"{tabela}: {lidas} linha(s) lidas..."))
+    resumo = ", ".join(f"{quantidade} em {tabela}" for tabela, quantidade in resultado['importadas'].items() if quantidade)
+    mensagem = f"Importação concluída: {resumo or 'nenhuma linha importada'}."
+    if resultado['ignorados']:
+        mensagem += f" Ignorados (nome sem tabela correspondente): {', '.join(resultado['ignorados'])}."
+    rejeitadas = resultado['rejeitadas']
+    if rejeitadas.empty:
+        return {'mensagem': mensagem}
+    return {'mensagem': f"{mensagem} {len(rejeitadas)} linha(s) rejeitadas.", 'resultado': relatorio_rejeitadas_csv(rejeitadas)}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Importação em lote de vendas, planos de recebimento e pagamentos.")
+    parser.add_argument("arquivos", nargs="+", help="CSVs nomeados pela tabela (vendas.csv, custos.csv, plano_recebimentos.csv, pagamentos_custos.csv, despesas_pagas.csv) e/ou planilhas .xlsx com uma aba por tabela")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_PADRAO, help="Linhas gravadas por transação")
+    parser.add_argument("--relatorio", default="importacao_rejeitadas.csv", help="Arquivo CSV com as linhas rejeitadas")
+    args = parser.parse_args()
+    database.init_db()
+    resultado = importar_arquivos([(caminho, caminho) for caminho in args.arquivos], tamanho_lote=args.lote,
+                                  progresso=lambda tabela, lidas: print(f"{tabela}: {lidas} linha(s) lidas"))
+    for tabela, quantidade in resultado['importadas'].items():
+        print(f"{tabela}: {quantidade} linha(s) importadas")
+    for nome in resultado['ignorados']:
+        print(f"AVISO: {nome} ignorado (nome não corresponde a nenhuma tabela)")
+    if not resultado['rejeitadas'].empty:
+        with open(args.relatorio, 'wb') as relatorio:
+            relatorio.write(relatorio_rejeitadas_csv(resultado['rejeitadas']))
+        print(f"{len(resultado['rejeitadas'])} linha(s) rejeitadas. Detalhes em {args.relatorio}")
@@ -0,0 +1,80 @@
+# medir_inicializacao.py (Tempo de importação na partida do app)
+# Uso: python medir_inicializacao.py [--repeticoes 5] [--detalhar]
+# Cada medição roda em um processo Python novo (como após reiniciar o servidor), importando o que o
+# app.py importa antes do primeiro desenho e, em seguida, o módulo de cada página ao ser selecionada.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+MODULOS_PESADOS = ('pandas', 'fpdf', 'openpyxl', 'calculations', 'pdf_generator')
+
+# Executado no processo novo: importa `modulos` em ordem e devolve o tempo de cada um e o que ficou carregado
+SCRIPT_MEDICAO = """
+import json, sys, time
+tempos = {}
+for modulo in sys.argv[1:]:
+    inicio = time.perf_counter()
+    __import__(modulo)
+    tempos[modulo] = (time.perf_counter() - inicio) * 1000
+print(json.dumps({'tempos': tempos, 'carregados': sorted(set(m.split('.')[0] for m in sys.modules))}))
+"""
+
+def modulos_da_partida():
+    """Módulos importados pelo app.py fora das páginas (antes de qualquer página ser renderizada)."""
+    import ast
+    with open(os.path.join(DIRETORIO, 'app.py'), encoding='utf-8') as arquivo:
+        arvore = ast.parse(arquivo.read())
+    modulos = []
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Import):
+            modulos += [nome.name for nome in no.names]
+        elif isinstance(no, ast.ImportFrom) and no.module:
+            modulos.append(no.module)
+    return list(dict.fromkeys(modulos))
+
+def medir(modulos, repeticoes):
+    """Mediana (ms) do tempo de importação de cada módulo, cada repetição em um processo novo."""
+    execucoes = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', SCRIPT_MEDICAO, *modulos], capture_output=True, text=True, cwd=DIRETORIO, check=True)
+        execucoes.append(json.loads(saida.stdout))
+    tempos = {modulo: statistics.median(execucao['tempos'][modulo] for execucao in execucoes) for modulo in modulos}
+    return tempos, execucoes[-1]['carregados']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação do app.py e de cada página em processos novos.")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--detalhar", action="store_true", help="Mostra também o -X importtime da partida (20 maiores)")
+    args = parser.parse_args()
+
+    partida = modulos_da_partida()
+    tempos, carregados = medir(partida, args.repeticoes)
+    total_partida = sum(tempos.values())
+    print(f"Partida (imports do app.py): {total_partida:.0f} ms")
+    for modulo, tempo in tempos.items():
+        print(f"  {modulo:<30} {tempo:>8.1f} ms")
+    print(f"  Pesados já carregados: {', '.join(m for m in MODULOS_PESADOS if m in carregados) or 'nenhum'}")
+
+    sys.path.insert(0, DIRETORIO)
+    from paginas import PAGINAS
+    print("Primeira seleção de cada página (depois da partida):")
+    for pagina, (_, modulo, _) in PAGINAS.items():
+        tempos_pagina, carregados = medir(partida + [modulo], args.repeticoes)
+        novos = [m for m in MODULOS_PESADOS if m in carregados]
+        print(f"  {pagina:<20} {tempos_pagina[modulo]:>8.1f} ms | pesados: {', '.join(novos) or 'nenhum'}")
+
+    # Referência: o custo de importar todas as páginas na partida, como o app.py fazia antes do registro
+    modulos_paginas = [modulo for _, modulo, _ in PAGINAS.values()]
+    tempos_todas, carregados = medir(partida + modulos_paginas, args.repeticoes)
+    print(f"Partida importando todas as páginas: {sum(tempos_todas.values()):.0f} ms | pesados: {', '.join(m for m in MODULOS_PESADOS if m in carregados)}")
+
+    if args.detalhar:
+        saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {', '.join(partida)}"], capture_output=True, text=True, cwd=DIRETORIO)
+        linhas = [linha.split('|') for linha in saida.stderr.splitlines() if linha.startswith('import time:') and 'cumulative' not in linha]
+        print("Maiores importações da partida (cumulativo, ms):")
+        for _, cumulativo, nome in sorted(linhas, key=lambda linha: -int(linha[1]))[:20]:
+            print(f"  {int(cumulativo) / 1000:>8.1f}  {nome.rstrip()}")
@@ -0,0 +1,24 @@
+# paginas.py (Registro das páginas do app, carregadas sob demanda)
+import importlib
+
+# nome -> (rótulo no menu, módulo, função de renderização). O módulo da página (e o que ele importa:
+# pandas, calculations, fpdf...) só é importado quando ela é selecionada pela primeira vez; depois
+# fica em sys.modules e as próximas seleções não pagam de novo.
+PAGINAS = {
+    "Dashboard": ("📊 Dashboard", "ui_dashboard", "render_dashboard"),
+    "Vendas": ("📝 Vendas", "ui_vendas", "render_vendas"),
+    "Contas Bancárias": ("🏦 Contas Bancárias", "ui_contas_bancarias", "render_contas_bancarias"),
+    "Custos": ("💰 Custos", "ui_custos", "render_custos"),
+    "Recebimentos": ("💳 Recebimentos", "ui_recebimentos", "render_recebimentos"),
+    "Despesas": ("📋 Despesas", "ui_despesas", "render_despesas"),
+    "Entregas": ("🚚 Entregas", "ui_entregas", "render_entregas"),
+    "Configuracoes": ("⚙️ Configurações", "ui_configuracoes", "render_configuracoes"),
+}
+
+def rotulo_pagina(nome):
+    return PAGINAS[nome][0] if nome in PAGINAS else nome.replace("_", " ").title()
+
+def carregar_pagina(nome):
+    """Importa (na primeira vez) o módulo da página e devolve sua função render_*."""
+    _, modulo, funcao = PAGINAS[nome]
+    return getattr(importlib.import_module(modulo), funcao)
@@ -1,20 +1,88 @@
 # pdf_generator.py (Versão otimizada para uma página)
 from fpdf import FPDF
 from datetime import datetime
+from collections import OrderedDict
+import hashlib
+import io
+import json
+import math
+import os
+import threading
 
 def format_brl(value):
     if isinstance(value, (int, float)):
         return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
     return "R$ 0,00"
 
+# --- RECURSOS COMPARTILHADOS ENTRE RECIBOS ---
+# O arquivo do logo é lido uma única vez por processo. Com o fpdf2 da faixa fixada em requirements.txt,
+# ele também é decodificado uma vez só (PNG -> dados já comprimidos para o PDF) e cada novo documento
+# recebe uma cópia dessas informações no seu image_cache. Isso usa internos do fpdf2: se eles não
+# existirem ou mudarem de formato, cada documento carrega os bytes guardados pela API pública
+# (FPDF.image(io.BytesIO(...))), mais lento, mas com o mesmo resultado.
+# As fontes usadas são as fontes padrão do PDF (Arial = Helvetica): não há arquivo de fonte para carregar.
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logo.png')
+CABECALHO_EMPRESA = (
+    'CNPJ: 57.721.838.0001/91',
+    'Rodovia Ba 099 Eco Posto Shell Est. do Coco, Abrantes',
+    'Camacari Bahia - Cel 71 99293-6290',
+)
+
+_logo_pre_carregado = None  # (bytes do arquivo, info da imagem ou None, perfis ICC) ou False se o arquivo não existe
+_logo_lock = threading.Lock()
+
+def _pre_carrega_logo():
+    """Decodifica o logo pelos internos do fpdf2. (info, perfis ICC), ou (None, {}) se não for possível."""
+    try:
+        from fpdf.image_datastructures import ImageCache
+        from fpdf.image_parsing import preload_image
+        cache = ImageCache()
+        _, _, info = preload_image(cache, LOGO_PATH)
+        if isinstance(info, dict) and {'i', 'usages'} <= info.keys():
+            return info, dict(cache.icc_profiles)
+    except Exception as e:
+        print(f"AVISO: logo sem pré-carregamento (fpdf2 fora da faixa testada?). Erro: {e}")
+    return None, {}
+
+def _logo():
+    global _logo_pre_carregado
+    with _logo_lock:
+        if _logo_pre_carregado is None:
+            try:
+                with open(LOGO_PATH, 'rb') as arquivo:
+                    dados = arquivo.read()
+            except FileNotFoundError:
+                _logo_pre_carregado = False
+            else:
+                _logo_pre_carregado = (dados,) + _pre_carrega_logo()
+        return _logo_pre_carregado
+
 class PDF(FPDF):
+    def _imagem_logo(self):
+        """O que passar a FPDF.image() para o logo: o caminho, com o logo já decodificado no cache de
+        imagens deste documento, ou os bytes do arquivo. None se não há logo."""
+        logo = _logo()
+        if not logo:
+            return None
+        dados, info, icc_profiles = logo
+        if info is None:
+            return io.BytesIO(dados)
+        if LOGO_PATH not in self.image_cache.images:
+            copia = type(info)(info)  # Cópia rasa: os bytes da imagem são compartilhados, o contador de uso não
+            copia['i'] = len(self.image_cache.images) + 1
+            copia['usages'] = 0
+            self.image_cache.images[LOGO_PATH] = copia
+            self.image_cache.icc_profiles.update(icc_profiles)
+        return LOGO_PATH
+
     def header(self):
         # --- Configurações de Altura (sem alteração) ---
         TEXT_BLOCK_HEIGHT = 22; LOGO_HEIGHT = 25
         initial_y = self.get_y()
-        try:
-            self.image('logo.png', x=160, y=initial_y, h=LOGO_HEIGHT)
-        except FileNotFoundError:
+        logo = self._imagem_logo()
+        if logo is not None:
+            self.image(logo, x=160, y=initial_y, h=LOGO_HEIGHT)
+        else:
             self.set_xy(160, initial_y); self.set_font('Arial', 'I', 8)
             self.multi_cell(40, 5, "Arquivo 'logo.png' nao encontrado.", 0, 'R')
         text_y_offset = (LOGO_HEIGHT - TEXT_BLOCK_HEIGHT) / 2
@@ -22,9 +90,8 @@ class PDF(FPDF):
         self.set_font('Arial', 'B', 12)
         self.cell(0, 7, 'WOODBAHIA CASAS PREFABRICADAS', 0, 1, 'L')
         self.set_font('Arial', '', 9)
-        self.cell(0, 5, 'CNPJ: 57.721.838.0001/91', 0, 1, 'L')
-        self.cell(0, 5, 'Rodovia Ba 099 Eco Posto Shell Est. do Coco, Abrantes', 0, 1, 'L')
-        self.cell(0, 5, 'Camacari Bahia - Cel 71 99293-6290', 0, 1, 'L')
+        for linha in CABECALHO_EMPRESA:
+            self.cell(0, 5, linha, 0, 1, 'L')
         self.set_y(initial_y + LOGO_HEIGHT + 5) # AJUSTE: Margem inferior reduzida
         self.set_font('Arial', 'B', 16) # AJUSTE: Fonte do título principal reduzida
         self.cell(0, 10, 'RECIBO DE VENDA E STATUS FINANCEIRO', 0, 1, 'C')
@@ -37,6 +104,14 @@ class PDF(FPDF):
         self.cell(0, 10, f'Documento emitido em {data_emissao}', 0, 0, 'L')
         self.cell(0, 10, f'Pagina {self.page_no()}', 0, 0, 'C')
 
+def _cabecalho_historico(pdf):
+    pdf.set_font('Arial', 'B', 10)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(40, 6, 'Data', 1, 0, 'C', 1)
+    pdf.cell(60, 6, 'Forma de Pagamento', 1, 0, 'C', 1)
+    pdf.cell(40, 6, 'Valor Pago', 1, 1, 'C', 1)
+    pdf.set_font('Arial', '', 9)
+
 def gerar_recibo_venda(dados_venda):
     pdf = PDF('P', 'mm', 'A4')
     pdf.add_page()
@@ -113,16 +188,13 @@ def gerar_recibo_venda(dados_venda):
     if dados_venda.get('pagamentos'):
         pdf.set_font('Arial', 'B', 12)
         pdf.cell(0, 8, '4. Historico de Pagamentos', 0, 1, 'L')
-        pdf.set_font('Arial', 'B', 10)
-        
-        pdf.set_fill_color(240, 240, 240)
-        pdf.cell(40, 6, 'Data', 1, 0, 'C', 1)
-        pdf.cell(60, 6, 'Forma de Pagamento', 1, 0, 'C', 1)
-        pdf.cell(40, 6, 'Valor Pago', 1, 1, 'C', 1)
-        
-        pdf.set_font('Arial', '', 9)
+        _cabecalho_historico(pdf)
         for pag in dados_venda.get('pagamentos', []):
             if pag['status'] == 'Pago':
+                if pdf.will_page_break(6):
+                    # Histórico longo: a tabela continua na próxima página, repetindo o cabeçalho
+                    pdf.add_page()
+                    _cabecalho_historico(pdf)
                 pdf.cell(40, 6, pag.get('data_pagamento', 'N/A'), 1, 0, 'C')
                 pdf.cell(60, 6, pag.get('forma_pagamento', 'N/A'), 1, 0, 'C')
                 pdf.cell(40, 6, format_brl(pag.get('valor_pago', 0)), 1, 1, 'R')
@@ -131,4 +203,76 @@ def gerar_recibo_venda(dados_venda):
     pdf.cell(0, 8, '________________________________________', 0, 1, 'C')
     pdf.cell(0, 6, f"Assinatura do(a) Cliente: {dados_venda['cliente']}", 0, 1, 'C')
 
-    return bytes(pdf.output())
\ No newline at end of file
+    return bytes(pdf.output())
+
+
+# --- DADOS DO RECIBO ---
+def _texto_ou_na(valor):
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)) or valor == '':
+        return 'N/A'
+    return str(valor)
+
+def _data_br(valor):
+    """Converte uma data ISO (YYYY-MM-DD) para DD/MM/YYYY; valores vazios viram 'N/A'."""
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)) or valor == '':
+        return 'N/A'
+    try:
+        return datetime.strptime(str(valor)[:10], '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return str(valor)
+
+def montar_dados_recibo(venda, pagamentos):
+    """Monta o dicionário de gerar_recibo_venda a partir de uma venda e das parcelas do seu plano (dicts)."""
+    return {
+        'id': int(venda['id']), 'cliente': str(venda['cliente']),
+        'telefone': _texto_ou_na(venda.get('telefone')), 'email': _texto_ou_na(venda.get('email')),
+        'data_venda': _data_br(venda.get('data_venda')), 'nome_kit': str(venda['nome_kit']),
+        'valor_venda': float(venda['valor_venda']), 'valor_frete': float(venda.get('valor_frete') or 0),
+        'pagamentos': [
+            {
+                'status': pag['status'], 'data_pagamento': _data_br(pag.get('data_pagamento')),
+                'forma_pagamento': _texto_ou_na(pag.get('forma_pagamento')),
+                'valor_pago': float(pag['valor_pago']) if pag.get('valor_pago') is not None and not math.isnan(pag['valor_pago']) else 0.0
+            }
+            for pag in pagamentos
+        ]
+    }
+
+# --- CACHE DE RECIBOS (ENDEREÇADO POR CONTEÚDO) ---
+# A chave é o hash dos dados que aparecem no recibo (venda + pagamentos): se nada mudou,
+# um novo download reaproveita o PDF já gerado. Eviction LRU limitada por quantidade e por bytes.
+RECIBO_CACHE_MAX_ITENS = 256
+RECIBO_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+_recibo_cache = OrderedDict()
+_recibo_cache_bytes = 0
+_recibo_cache_lock = threading.Lock()
+recibo_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def chave_recibo(dados_venda):
+    conteudo = json.dumps(dados_venda, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+def gerar_recibo_venda_cache(dados_venda):
+    """Igual a gerar_recibo_venda, mas reaproveita o PDF se os dados do recibo não mudaram."""
+    global _recibo_cache_bytes
+    chave = chave_recibo(dados_venda)
+    with _recibo_cache_lock:
+        pdf_bytes = _recibo_cache.get(chave)
+        if pdf_bytes is not None:
+            _recibo_cache.move_to_end(chave)
+            recibo_cache_stats['hits'] += 1
+            return pdf_bytes
+        recibo_cache_stats['misses'] += 1
+
+    pdf_bytes = gerar_recibo_venda(dados_venda)  # Fora do lock: a geração é a parte cara
+
+    with _recibo_cache_lock:
+        if chave not in _recibo_cache and len(pdf_bytes) <= RECIBO_CACHE_MAX_BYTES:
+            _recibo_cache[chave] = pdf_bytes
+            _recibo_cache_bytes += len(pdf_bytes)
+            while len(_recibo_cache) > RECIBO_CACHE_MAX_ITENS or _recibo_cache_bytes > RECIBO_CACHE_MAX_BYTES:
+                _, removido = _recibo_cache.popitem(last=False)
+                _recibo_cache_bytes -= len(removido)
+                recibo_cache_stats['evictions'] += 1
+    return pdf_bytes
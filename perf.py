@@ -0,0 +1,67 @@
+# perf.py (Medição de tempo por fase dos reruns do Streamlit)
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+HISTORICO_POR_PAGINA = 100  # Reruns guardados por página para calcular p50/p95
+# Fases do rerun e categorias dentro da página. "banco" vem das consultas registradas em database.py
+# (inclui a montagem do DataFrame pelo read_sql_query); "widgets" é o que sobra do tempo da página.
+FASES = ['autenticacao', 'init_db', 'barra_lateral', 'carga_pagina', 'pagina', 'total']
+CATEGORIAS = ['banco', 'pandas', 'pdf', 'widgets']
+
+_local = threading.local()
+_historico = {}  # página -> deque de dicts {fase/categoria: ms}
+_historico_lock = threading.Lock()
+
+def iniciar_rerun():
+    """Começa a medir um rerun nesta thread (o Streamlit roda cada rerun em uma thread)."""
+    _local.tempos = {}
+    _local.inicio = time.perf_counter()
+    return _local.tempos
+
+@contextmanager
+def medir(nome):
+    """Soma o tempo do bloco em `nome` no rerun atual. Fora de um rerun medido não faz nada."""
+    tempos = getattr(_local, 'tempos', None)
+    if tempos is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tempos[nome] = tempos.get(nome, 0.0) + (time.perf_counter() - inicio) * 1000
+
+def finalizar_rerun(pagina, consultas):
+    """Fecha a medição do rerun, guarda no histórico da página e devolve os tempos (ms)."""
+    tempos = getattr(_local, 'tempos', None)
+    if tempos is None:
+        return {}
+    tempos['total'] = (time.perf_counter() - _local.inicio) * 1000
+    tempos['banco'] = sum(consulta['duracao_ms'] for consulta in consultas if consulta['tipo'] != 'transacao')
+    tempos['widgets'] = max(tempos.get('pagina', 0.0) - tempos['banco'] - tempos.get('pandas', 0.0) - tempos.get('pdf', 0.0), 0.0)
+    _local.tempos = None
+    with _historico_lock:
+        _historico.setdefault(pagina, deque(maxlen=HISTORICO_POR_PAGINA)).append(dict(tempos))
+    return tempos
+
+def tempos_do_rerun(tempos):
+    """Tabela (fase, ms) de um rerun."""
+    import pandas as pd  # Só quando o painel está aberto: a partida do app não carrega o pandas por causa deste módulo
+    return pd.DataFrame([{'fase': nome, 'ms': round(tempos.get(nome, 0.0), 2)} for nome in FASES + CATEGORIAS])
+
+def estatisticas_por_pagina():
+    """p50/p95 (ms) de cada fase e categoria, por página, sobre os últimos reruns."""
+    import pandas as pd
+    with _historico_lock:
+        historico = {pagina: list(reruns) for pagina, reruns in _historico.items()}
+    linhas = []
+    for pagina, reruns in historico.items():
+        df = pd.DataFrame(reruns).reindex(columns=FASES + CATEGORIAS).fillna(0.0)
+        linha = {'pagina': pagina, 'reruns': len(df)}
+        for coluna in ['total', 'pagina'] + CATEGORIAS:
+            linha[f'{coluna}_p50'] = round(df[coluna].quantile(0.5), 2)
+            linha[f'{coluna}_p95'] = round(df[coluna].quantile(0.95), 2)
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
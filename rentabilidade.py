@@ -0,0 +1,157 @@
+# rentabilidade.py (Motor de rentabilidade: funções puras sobre DataFrames, sem acesso ao banco)
+# Recebe as tabelas já lidas (vendas, custos, recebimentos, pagamentos e configurações) e calcula os
+# totais de todas as vendas de uma vez, com operações de coluna do NumPy. calculations.py faz as
+# leituras e chama estas funções; benchmark.py --verificar confere o resultado contra o cálculo antigo,
+# venda a venda.
+import numpy as np
+import pandas as pd
+from database import DESPESAS, DESPESAS_SOBRE_CUSTO
+
+def _soma_por_venda(posicoes, df, coluna):
+    """Soma df[coluna] por venda_id, alinhada às vendas (0 para vendas sem linhas; nulos contam como 0)."""
+    if df.empty:
+        return np.zeros(len(posicoes))
+    posicao = posicoes.get_indexer(df['venda_id'])
+    valores = pd.to_numeric(df[coluna]).fillna(0.0).to_numpy(dtype=float)
+    validas = posicao >= 0  # Linhas de vendas que não estão em `vendas` são ignoradas
+    return np.bincount(posicao[validas], weights=valores[validas], minlength=len(posicoes))
+
+def calcular_totais_vendas(vendas, custos, recebimentos, pagamentos_custos, despesas_pagas, config):
+    """Calcula os totais de cada venda (uma linha por venda, na ordem de `vendas`).
+
+    - vendas: colunas da tabela vendas (ao menos id e valor_venda)
+    - custos: venda_id, custo_mcpf, custo_madeireira
+    - recebimentos: venda_id, valor_pago (parcelas, ou já somadas por venda)
+    - pagamentos_custos: venda_id, tipo_fornecedor ('MCPF'/'Madeireira'), valor
+    - despesas_pagas: venda_id, tipo_despesa, valor
+    - config: {chave: percentual} da tabela configuracoes
+
+    As tabelas filhas podem vir linha a linha ou já agrupadas no SQL: tudo é somado por venda aqui.
+    Retorna as colunas de `vendas` mais os campos de CAMPOS_TOTAIS (calculations.py);
+    attrs['colunas_venda'] guarda as colunas originais da venda.
+    """
+    vendas = vendas.reset_index(drop=True)
+    posicoes = pd.Index(vendas['id'])
+    valor_venda = pd.to_numeric(vendas['valor_venda']).to_numpy(dtype=float)
+
+    custo_mcpf = _soma_por_venda(posicoes, custos, 'custo_mcpf')
+    custo_madeireira = _soma_por_venda(posicoes, custos, 'custo_madeireira')
+    custo_total = custo_mcpf + custo_madeireira
+    fornecedor = pagamentos_custos['tipo_fornecedor']
+    pagamentos_mcpf = _soma_por_venda(posicoes, pagamentos_custos[fornecedor == 'MCPF'], 'valor')
+    pagamentos_madeireira = _soma_por_venda(posicoes, pagamentos_custos[fornecedor == 'Madeireira'], 'valor')
+    custo_pago = pagamentos_mcpf + pagamentos_madeireira
+
+    # Uma coluna por despesa de DESPESAS: base (venda ou custo) x percentual (0 se a chave faltar em config)
+    chaves = list(DESPESAS)
+    bases = np.column_stack([custo_total if chave in DESPESAS_SOBRE_CUSTO else valor_venda for chave in chaves])
+    despesas = bases * np.array([config.get(chave, 0) for chave in chaves], dtype=float)
+    despesas_total_calculado = despesas.sum(axis=1)
+
+    total_recebido = _soma_por_venda(posicoes, recebimentos, 'valor_pago')
+    total_despesas_pagas = _soma_por_venda(posicoes, despesas_pagas, 'valor')
+    lucro_bruto = valor_venda - custo_total
+
+    # Pago por tipo de despesa: poucas linhas por venda, somadas direto em dicts (um groupby custaria mais)
+    despesas_por_venda = {}
+    if not despesas_pagas.empty:
+        valores = pd.to_numeric(despesas_pagas['valor']).fillna(0.0).tolist()
+        for venda_id, tipo, valor in zip(despesas_pagas['venda_id'].tolist(), despesas_pagas['tipo_despesa'].tolist(), valores):
+            por_tipo = despesas_por_venda.setdefault(venda_id, {})
+            por_tipo[tipo] = por_tipo.get(tipo, 0.0) + valor
+
+    totais = pd.DataFrame({
+        'custo_mcpf': custo_mcpf, 'custo_madeireira': custo_madeireira,
+        'pagamentos_mcpf': pagamentos_mcpf, 'pagamentos_madeireira': pagamentos_madeireira,
+        'total_recebido': total_recebido, 'total_despesas_pagas': total_despesas_pagas,
+        'custo_total': custo_total, 'custo_pago': custo_pago, 'custo_pendente': custo_total - custo_pago,
+        'despesas_total_calculado': despesas_total_calculado,
+        'despesas_detalhadas': [dict(zip(chaves, valores)) for valores in despesas.tolist()],
+        'saldo_a_receber': valor_venda - total_recebido,
+        'pagamentos_despesa_por_tipo': [despesas_por_venda.get(venda_id, {}) for venda_id in vendas['id'].tolist()],
+        'saldo_despesas_a_pagar': despesas_total_calculado - total_despesas_pagas,
+        'lucro_bruto': lucro_bruto,
+        'lucro_liquido': lucro_bruto - despesas_total_calculado,
+    })
+    df = pd.concat([vendas, totais], axis=1)
+    df.attrs['colunas_venda'] = list(vendas.columns)
+    return df
+
+def agregar_totais(totais):
+    """Somas de todas as vendas no formato de calcular_totais_globais (a partir de calcular_totais_vendas)."""
+    return {
+        'total_vendas': float(totais['valor_venda'].sum()), 'total_custos': float(totais['custo_total'].sum()),
+        'custo_pago': float(totais['custo_pago'].sum()), 'total_recebido': float(totais['total_recebido'].sum()),
+        'total_despesas_pagas': float(totais['total_despesas_pagas'].sum()),
+        'total_despesas': float(totais['despesas_total_calculado'].sum()),
+    }
+
+def calcular_totais_globais(agregados, total_saldo_bancario):
+    """Indicadores do Dashboard a partir das somas de todas as vendas e do saldo das contas."""
+    total_vendas = agregados['total_vendas']
+    total_custos = agregados['total_custos']
+    total_despesas = agregados['total_despesas']
+    lucro_bruto = total_vendas - total_custos
+    lucro_liquido = lucro_bruto - total_despesas
+    percentual_lucro = (lucro_liquido / total_vendas) * 100 if total_vendas > 0 else 0
+
+    creditos_realizado = agregados['total_recebido']
+    creditos_pendente = total_vendas - creditos_realizado
+
+    debitos_pago_custos = agregados['custo_pago']
+    debitos_pago_despesas = agregados['total_despesas_pagas']
+    total_pago_geral = debitos_pago_custos + debitos_pago_despesas
+
+    debitos_pendente_custos = total_custos - debitos_pago_custos
+    debitos_pendente_despesas = total_despesas - debitos_pago_despesas
+    total_a_pagar_geral = debitos_pendente_custos + debitos_pendente_despesas
+
+    total_disponivel = total_saldo_bancario + creditos_pendente
+    provisao_saldo_final = total_disponivel - total_a_pagar_geral
+
+    return {
+        'total_vendas': total_vendas, 'total_recebido': creditos_realizado, 'total_a_receber': creditos_pendente,
+        'total_custos': total_custos, 'total_despesas': total_despesas, 'lucro_bruto': lucro_bruto,
+        'lucro_liquido': lucro_liquido, 'percentual_lucro': percentual_lucro,
+        'total_saldo_bancario': total_saldo_bancario,
+        'creditos_realizado': creditos_realizado, 'creditos_pendente': creditos_pendente,
+        'debitos_pago_custos': debitos_pago_custos, 'debitos_pago_despesas': debitos_pago_despesas,
+        'total_pago_geral': total_pago_geral,
+        'debitos_pendente_custos': debitos_pendente_custos,
+        'debitos_pendente_despesas': debitos_pendente_despesas,
+        'total_a_pagar_geral': total_a_pagar_geral,
+        'saldo_realizado': creditos_realizado - total_pago_geral,
+        'balanco_futuro': creditos_pendente - total_a_pagar_geral,
+        'total_disponivel': total_disponivel,
+        'provisao_saldo_final': provisao_saldo_final
+    }
+
+def montar_fluxo_caixa(realizado, a_receber, a_pagar, saldo_atual, mes_atual, meses_passados, meses_futuros):
+    """Fluxo de caixa mês a mês, de `meses_passados` antes do mês atual até `meses_futuros` à frente.
+
+    - realizado: mes ('AAAA-MM'), entradas, saidas do extrato (todos os meses a partir do início da janela)
+    - a_receber: mes, a_receber das parcelas pendentes
+    - a_pagar: mes, custos_a_pagar, despesas_a_pagar
+    - saldo_atual: soma dos saldos das contas hoje
+
+    saldo_final é o saldo estimado no fim de cada mês: o saldo de hoje sem o que foi lançado no
+    extrato depois do mês, mais o que está projetado (a receber - a pagar) do mês atual até ele.
+    """
+    atual = pd.Period(mes_atual, freq='M')
+    meses = pd.period_range(atual - meses_passados, atual + meses_futuros - 1, freq='M').strftime('%Y-%m')
+    realizado = realizado.set_index('mes').sort_index()
+    fluxo = pd.DataFrame({'mes': meses})
+    fluxo['entradas'] = realizado['entradas'].reindex(meses, fill_value=0.0).to_numpy(dtype=float)
+    fluxo['saidas'] = realizado['saidas'].reindex(meses, fill_value=0.0).to_numpy(dtype=float)
+    fluxo['a_receber'] = a_receber.set_index('mes')['a_receber'].reindex(meses, fill_value=0.0).to_numpy(dtype=float)
+    a_pagar = a_pagar.set_index('mes')
+    fluxo['custos_a_pagar'] = a_pagar['custos_a_pagar'].reindex(meses, fill_value=0.0).to_numpy(dtype=float)
+    fluxo['despesas_a_pagar'] = a_pagar['despesas_a_pagar'].reindex(meses, fill_value=0.0).to_numpy(dtype=float)
+
+    # Lançado no extrato depois de cada mês (inclui meses após a janela): soma acumulada de trás para frente
+    liquido = (realizado['entradas'] - realizado['saidas']).to_numpy(dtype=float)
+    depois = np.append(liquido[::-1].cumsum()[::-1], 0.0)[np.searchsorted(realizado.index.to_numpy(dtype=object), meses.to_numpy(dtype=object), side='right')]
+    projetado = (fluxo['a_receber'] - fluxo['custos_a_pagar'] - fluxo['despesas_a_pagar']).cumsum()
+    fluxo['saldo_final'] = saldo_atual - depois + projetado.to_numpy()
+    fluxo['projetado'] = fluxo['mes'] >= str(atual)
+    return fluxo
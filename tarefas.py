@@ -0,0 +1,171 @@
+# tarefas.py (Execução de tarefas pesadas em segundo plano)
+# Exportação de recibos, importação em lote, recálculos e backups rodam em um pool de threads do
+# processo do Streamlit, fora do rerun. O estado de cada tarefa (status, progresso, mensagem e
+# resultado) fica na tabela `tarefas`, que as páginas consultam sem bloquear. Como o pool e a tabela
+# não dependem da sessão, a tarefa continua ao trocar de página; a `chave` impede que a mesma tarefa
+# seja enfileirada duas vezes enquanto ainda está ativa (ex.: clique repetido ou rerun).
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+# Arquivo próprio: as atualizações de progresso não invalidam o cache de leituras nem disputam o
+# lock de escrita do financeiro.db com os lançamentos
+ARQUIVO_TAREFAS = os.environ.get("ARQUIVO_TAREFAS", "tarefas.db")
+MAX_TAREFAS_SIMULTANEAS = 2
+INTERVALO_PROGRESSO = 0.5  # Segundos mínimos entre duas gravações de progresso da mesma tarefa
+TAREFAS_GUARDADAS = 200  # Tarefas finalizadas mantidas no histórico (as mais recentes)
+
+STATUS_NA_FILA = 'Na fila'
+STATUS_EXECUTANDO = 'Executando'
+STATUS_CONCLUIDA = 'Concluída'
+STATUS_ERRO = 'Erro'
+STATUS_INTERROMPIDA = 'Interrompida'  # Estava ativa quando o servidor foi reiniciado
+STATUS_ATIVOS = (STATUS_NA_FILA, STATUS_EXECUTANDO)
+
+_executor = None
+_executor_lock = threading.Lock()
+_conexao_leitura = None  # Conexão do processo para as consultas de estado (usada sob _leitura_lock)
+_leitura_lock = threading.Lock()
+
+def _conectar():
+    conn = sqlite3.connect(ARQUIVO_TAREFAS, timeout=5.0, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA busy_timeout = 5000;")
+    return conn
+
+def _criar_tabela(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS tarefas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT NOT NULL, descricao TEXT NOT NULL, chave TEXT,
+        processo INTEGER, status TEXT NOT NULL, progresso REAL NOT NULL DEFAULT 0, mensagem TEXT, erro TEXT,
+        resultado BLOB, arquivo_resultado TEXT,
+        criada_em TEXT NOT NULL, iniciada_em TEXT, concluida_em TEXT);""")
+    # Uma só tarefa ativa por chave: o INSERT da segunda falha e quem enviou recebe a que já existe
+    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_tarefas_chave_ativa ON tarefas (chave) WHERE status IN ('{STATUS_NA_FILA}', '{STATUS_EXECUTANDO}');")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_status ON tarefas (status, id);")
+
+def _agora():
+    return datetime.now().isoformat(timespec='seconds')
+
+def _leitura():
+    """Conexão de leitura do processo, aberta na primeira consulta (a barra lateral consulta a cada
+    segundo; não abre uma conexão por rerun). Ao abrir, cria a tabela e marca como interrompidas as
+    tarefas que estavam ativas em outro processo (servidor reiniciado): não têm mais quem as execute.
+    As do próprio processo continuam no pool anterior se o Streamlit recarregar este módulo."""
+    global _conexao_leitura
+    with _leitura_lock:
+        if _conexao_leitura is None:
+            conn = _conectar()
+            _criar_tabela(conn)
+            # Só o processo principal recupera: um filho do "spawn" (ex.: da exportação) não executa o
+            # app.py, mas reimporta o script principal do pai como __mp_main__; um script que envie
+            # tarefas ao ser importado chegaria aqui no filho e marcaria as tarefas do pai
+            if multiprocessing.current_process().name == 'MainProcess':
+                conn.execute("UPDATE tarefas SET status = ?, concluida_em = ?, mensagem = 'Servidor reiniciado durante a execução.' WHERE status IN (?, ?) AND processo IS NOT ?",
+                             (STATUS_INTERROMPIDA, _agora()) + STATUS_ATIVOS + (os.getpid(),))
+            conn.commit()
+            _conexao_leitura = conn
+        return _conexao_leitura
+
+def _consultar(sql, params=()):
+    conn = _leitura()
+    with _leitura_lock:
+        return conn.execute(sql, params).fetchall()
+
+def _pool():
+    """Pool de threads do processo, criado na primeira tarefa (depois da recuperação feita por _leitura)."""
+    global _executor
+    _leitura()
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_TAREFAS_SIMULTANEAS, thread_name_prefix="tarefa")
+        return _executor
+
+def _atualizar(tarefa_id, **campos):
+    colunas = ', '.join(f"{coluna} = ?" for coluna in campos)
+    with closing(_conectar()) as conn:
+        conn.execute(f"UPDATE tarefas SET {colunas} WHERE id = ?", (*campos.values(), tarefa_id))
+        conn.commit()
+
+def _executar(tarefa_id, funcao, args, kwargs):
+    _atualizar(tarefa_id, status=STATUS_EXECUTANDO, iniciada_em=_agora())
+    ultima_gravacao = 0.0
+
+    def progresso(feitos, total, mensagem=None):
+        nonlocal ultima_gravacao
+        agora = time.monotonic()
+        if feitos < total and agora - ultima_gravacao < INTERVALO_PROGRESSO:
+            return
+        ultima_gravacao = agora
+        campos = {'progresso': min(feitos / total, 1.0) if total else 0.0}
+        if mensagem is not None:
+            campos['mensagem'] = mensagem
+        _atualizar(tarefa_id, **campos)
+
+    try:
+        retorno = funcao(progresso, *args, **kwargs) or {}
+    except Exception as e:
+        print(f"ERRO NA TAREFA {tarefa_id}: {e}")
+        _atualizar(tarefa_id, status=STATUS_ERRO, erro=f"{e}\n{traceback.format_exc()}", mensagem=str(e), concluida_em=_agora())
+        return
+    _atualizar(tarefa_id, status=STATUS_CONCLUIDA, progresso=1.0, concluida_em=_agora(), mensagem=retorno.get('mensagem'),
+               resultado=retorno.get('resultado'), arquivo_resultado=retorno.get('arquivo'))
+    _limpar_historico()
+
+def _limpar_historico():
+    with closing(_conectar()) as conn:
+        antigas = conn.execute(f"SELECT id, arquivo_resultado FROM tarefas WHERE status NOT IN (?, ?) ORDER BY id DESC LIMIT -1 OFFSET {TAREFAS_GUARDADAS}", STATUS_ATIVOS).fetchall()
+        for tarefa in antigas:
+            if tarefa['arquivo_resultado'] and os.path.exists(tarefa['arquivo_resultado']):
+                os.remove(tarefa['arquivo_resultado'])
+        conn.executemany("DELETE FROM tarefas WHERE id = ?", [(tarefa['id'],) for tarefa in antigas])
+        conn.commit()
+
+def enviar_tarefa(tipo, descricao, funcao, *args, chave=None, **kwargs):
+    """Enfileira `funcao(progresso, *args, **kwargs)` no pool e retorna o id da tarefa.
+
+    `progresso(feitos, total, mensagem=None)` grava o andamento (no máximo a cada INTERVALO_PROGRESSO).
+    A função pode retornar um dict com 'mensagem' (texto), 'resultado' (bytes) e/ou 'arquivo' (caminho
+    de um arquivo gerado em disco). Se já houver uma tarefa ativa com a mesma `chave`, nada é enfileirado
+    e o id dela é retornado.
+    """
+    executor = _pool()
+    with closing(_conectar()) as conn:
+        try:
+            cursor = conn.execute("INSERT INTO tarefas (tipo, descricao, chave, processo, status, criada_em) VALUES (?, ?, ?, ?, ?, ?)",
+                                  (tipo, descricao, chave, os.getpid(), STATUS_NA_FILA, _agora()))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return conn.execute("SELECT id FROM tarefas WHERE chave = ? AND status IN (?, ?)", (chave,) + STATUS_ATIVOS).fetchone()['id']
+        tarefa_id = cursor.lastrowid
+    executor.submit(_executar, tarefa_id, funcao, args, kwargs)
+    return tarefa_id
+
+def obter_tarefa(tarefa_id, com_resultado=False):
+    """Estado de uma tarefa (dict) ou None. O blob `resultado` só é lido com com_resultado=True."""
+    colunas = "*" if com_resultado else "id, tipo, descricao, chave, status, progresso, mensagem, erro, arquivo_resultado, criada_em, iniciada_em, concluida_em"
+    linhas = _consultar(f"SELECT {colunas} FROM tarefas WHERE id = ?", (tarefa_id,))
+    return dict(linhas[0]) if linhas else None
+
+def tarefas_ativas():
+    """Tarefas na fila ou em execução, da mais antiga para a mais nova."""
+    return [dict(linha) for linha in _consultar(
+        "SELECT id, tipo, descricao, status, progresso, mensagem FROM tarefas WHERE status IN (?, ?) ORDER BY id", STATUS_ATIVOS)]
+
+def aguardar_tarefa(tarefa_id, intervalo=0.2, limite=None):
+    """Espera a tarefa terminar (uso em scripts e na linha de comando). Retorna o estado final."""
+    inicio = time.monotonic()
+    while True:
+        tarefa = obter_tarefa(tarefa_id)
+        if tarefa is None or tarefa['status'] not in STATUS_ATIVOS:
+            return tarefa
+        if limite is not None and time.monotonic() - inicio > limite:
+            return tarefa
+        time.sleep(intervalo)
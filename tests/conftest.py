@@ -0,0 +1,21 @@
+# conftest.py (Configuração comum dos testes: módulos do app no sys.path e banco temporário)
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import gerar_dados
+
+@pytest.fixture
+def banco(tmp_path):
+    """Banco sintético pequeno (gerar_dados.gerar_banco) em um diretório temporário; database.DB_NAME
+    aponta para ele durante o teste e volta ao original no final."""
+    original = database.DB_NAME
+    caminho = str(tmp_path / "teste.db")
+    gerar_dados.gerar_banco(caminho, vendas=40, semente=3)
+    database.limpar_cache_leituras()
+    yield caminho
+    database.fechar_conexoes()
+    database.DB_NAME = original
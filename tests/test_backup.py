@@ -0,0 +1,43 @@
+# test_backup.py (Restauração: cópia de segurança fora da retenção, arquivo temporário apagado)
+import gzip
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+import backup
+import database
+
+def test_restauracao_guarda_copia_fora_da_retencao(banco, tmp_path, monkeypatch):
+    diretorio = str(tmp_path / "backups")
+    monkeypatch.setattr(backup, 'DIRETORIO_BACKUPS', diretorio)
+    backup.tarefa_backup_agendado(lambda *args: None, diretorio)
+    preparado = str(tmp_path / "restauracao_teste.db")
+    with gzip.open(backup.listar_backups(diretorio)[0]['caminho'], 'rb') as origem, open(preparado, 'wb') as destino:
+        shutil.copyfileobj(origem, destino)
+
+    resultado = backup.tarefa_restaurar(lambda *args: None, preparado)
+
+    assert not os.path.exists(preparado)
+    seguranca = backup.listar_backups(diretorio, prefixo=backup.PREFIXO_SEGURANCA)
+    assert len(seguranca) == 1 and seguranca[0]['caminho'] in resultado['mensagem']
+    assert len(backup.listar_backups(diretorio)) == 1  # A cópia de segurança não conta como backup agendado
+    assert backup.aplicar_retencao(diretorio, guardados=0) == 1
+    assert backup.listar_backups(diretorio, prefixo=backup.PREFIXO_SEGURANCA) == seguranca
+    assert database.get_data_as_dataframe("SELECT COUNT(*) AS total FROM vendas", usar_cache=False)['total'].iloc[0] > 0
+
+def test_restauracao_de_banco_com_outro_tamanho_de_pagina(banco, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, 'DIRETORIO_BACKUPS', str(tmp_path / "backups"))
+    preparado = str(tmp_path / "restauracao_paginas.db")
+    with database.pooled_connection() as conn, closing(sqlite3.connect(preparado)) as destino:
+        vendas = conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0]
+        tamanho = conn.execute("PRAGMA page_size;").fetchone()[0]
+        conn.backup(destino)
+        destino.execute("PRAGMA journal_mode = DELETE;")
+        destino.execute(f"PRAGMA page_size = {tamanho * 2};")
+        destino.execute("VACUUM;")
+    database.execute_query("DELETE FROM vendas")
+
+    backup.tarefa_restaurar(lambda *args: None, preparado)
+
+    assert database.get_data_as_dataframe("SELECT COUNT(*) AS total FROM vendas", usar_cache=False)['total'].iloc[0] == vendas
+    assert not [nome for nome in os.listdir(tmp_path) if nome.startswith("restauracao_paginas")]
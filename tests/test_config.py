@@ -0,0 +1,14 @@
+# test_config.py (Configurações: salvar só o que mudou, sem reescrever o venda_resumo à toa)
+import pytest
+import database
+
+def test_save_config_so_grava_as_chaves_alteradas(banco):
+    config = database.get_config()
+    vendas = database.get_data_as_dataframe("SELECT COUNT(*) AS total FROM venda_resumo", usar_cache=False)['total'].iloc[0]
+    with database.transacao() as conn:
+        antes = conn.total_changes
+        database.save_config(config, conn=conn)
+        assert conn.total_changes == antes  # Nada mudou: nenhum UPDATE, nenhum trigger
+        database.save_config(dict(config, royalties=config['royalties'] + 0.01), conn=conn)
+        assert conn.total_changes - antes == 1 + vendas  # A chave alterada e uma reescrita do venda_resumo
+    assert database.get_config()['royalties'] == pytest.approx(config['royalties'] + 0.01)
@@ -0,0 +1,78 @@
+# test_escritor.py (Escritor serializado: SAVEPOINT por escrita no group commit, espera limitada, atribuição das consultas)
+import threading
+import pytest
+import database
+
+@pytest.fixture
+def tabela(banco):
+    database.execute_query("CREATE TABLE teste_escritor (nome TEXT NOT NULL UNIQUE)")
+    return banco
+
+@pytest.fixture
+def escritor_parado():
+    """Prende o escritor em uma escrita até o teste liberar: o que for enfileirado nesse meio-tempo
+    vai junto no próximo lote."""
+    entrou, liberar = threading.Event(), threading.Event()
+    def esperar(conn=None):
+        entrou.set()
+        liberar.wait(10)
+    bloqueio = database.enviar_escrita(esperar)
+    assert entrou.wait(10)
+    yield liberar
+    liberar.set()
+    bloqueio.result(10)
+
+def _insere(nome, falhar=False, conn=None):
+    conn.execute("INSERT INTO teste_escritor (nome) VALUES (?)", (nome,))
+    if falhar:
+        conn.execute("INSERT INTO teste_escritor (nome) VALUES (?)", (nome,))  # UNIQUE: falha depois de já ter gravado uma linha
+
+def _nomes():
+    return list(database.get_data_as_dataframe("SELECT nome FROM teste_escritor ORDER BY nome", usar_cache=False)["nome"])
+
+def test_escrita_com_erro_desfaz_so_o_proprio_savepoint(tabela, escritor_parado):
+    futuros = [database.enviar_escrita(_insere, 'a'), database.enviar_escrita(_insere, 'b', falhar=True), database.enviar_escrita(_insere, 'c')]
+    escritor_parado.set()
+    for futuro in futuros:
+        futuro.exception(10)
+    assert futuros[0].result() is None and futuros[2].result() is None
+    with pytest.raises(database.sqlite3.IntegrityError):
+        futuros[1].result()
+    assert _nomes() == ['a', 'c']
+    # As três foram no mesmo lote (uma transação só)
+    assert any(registro['sql'] == "TRANSAÇÃO (lote de 3)" for registro in database.consultas_recentes)
+
+def test_escrita_nao_atendida_expira_e_e_cancelada(tabela, escritor_parado, monkeypatch):
+    monkeypatch.setattr(database, 'TEMPO_MAXIMO_ESCRITA', 0.2)
+    with pytest.raises(TimeoutError, match="nada foi gravado"):
+        database.execute_query("INSERT INTO teste_escritor (nome) VALUES ('expirou')")
+    escritor_parado.set()
+    database.execute_query("INSERT INTO teste_escritor (nome) VALUES ('depois')")
+    assert _nomes() == ['depois']
+
+def test_escritor_morto_e_substituido(tabela, monkeypatch):
+    morto = threading.Thread(target=lambda: None)
+    morto.start()
+    morto.join()
+    monkeypatch.setattr(database, '_escritor', morto)
+    database.execute_query("INSERT INTO teste_escritor (nome) VALUES ('x')")
+    assert database._escritor is not morto and database._escritor.is_alive()
+    assert _nomes() == ['x']
+
+def render_pagina_de_teste():
+    database.execute_query("INSERT INTO teste_escritor (nome) VALUES ('pagina')")
+
+def test_consultas_do_escritor_atribuidas_ao_render_de_origem(tabela):
+    with database.coletar_consultas() as consultas:
+        render_pagina_de_teste()
+    registro = next(registro for registro in consultas if 'INSERT INTO teste_escritor' in registro['sql'])
+    assert registro['render'] == 'render_pagina_de_teste'
+    assert registro['local'].startswith('test_escritor.py:')
+
+def test_escrita_sem_espera_nao_mexe_na_lista_de_quem_pediu(tabela, escritor_parado):
+    with database.coletar_consultas() as consultas:
+        futuro = database.enviar_escrita(database.execute_query, "INSERT INTO teste_escritor (nome) VALUES ('sem_espera')")
+    escritor_parado.set()
+    futuro.result(10)
+    assert consultas == []  # O escritor grava numa lista própria, entregue pelo Future
+    assert [registro['sql'] for registro in futuro.consultas] == ["INSERT INTO teste_escritor (nome) VALUES ('sem_espera')"]
@@ -0,0 +1,16 @@
+# test_extrato.py (Filtros de período: o último dia entra inteiro, mesmo com hora gravada na data)
+import database
+import exportacao
+
+def test_extrato_inclui_linhas_com_hora_no_ultimo_dia(banco):
+    with database.transacao() as conn:
+        conta_id = conn.execute("INSERT INTO contas_bancarias (nome_banco, saldo_inicial, data_criacao) VALUES ('Banco Teste', 0, '2024-01-01')").lastrowid
+        for data in ('2024-05-01', '2024-05-31', '2024-05-31 14:00', '2024-06-01'):
+            conn.execute("INSERT INTO transacoes_bancarias (conta_id, data, tipo, descricao, valor) VALUES (?, ?, 'Entrada', 'Teste', 10.0)", (conta_id, data))
+    pagina, _ = database.get_extrato_pagina(conta_id, data_inicio='2024-05-01', data_fim='2024-05-31')
+    assert sorted(pagina['data']) == ['2024-05-01', '2024-05-31', '2024-05-31 14:00']
+
+def test_exportacao_inclui_vendas_com_hora_no_ultimo_dia(banco):
+    with database.transacao() as conn:
+        venda_id = conn.execute("INSERT INTO vendas (cliente, data_venda, nome_kit, valor_venda) VALUES ('Com hora', '2099-05-31 14:00', 'Kit', 1000.0)").lastrowid
+    assert venda_id in exportacao.filtrar_vendas_recibo(data_inicio='2099-05-01', data_fim='2099-05-31')
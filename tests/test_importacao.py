@@ -0,0 +1,15 @@
+# test_importacao.py (Valores numéricos das planilhas: formato brasileiro, ponto decimal e casos ambíguos)
+import pytest
+from importacao import _numero
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("1234", 1234.0), ("1.234,56", 1234.56), ("1234,5", 1234.5), ("R$ 1.234,00", 1234.0),
+    ("1.234.567", 1234567.0), ("1234.56", 1234.56), ("1500.5", 1500.5), ("0.125", 0.125), (1234.5, 1234.5),
+])
+def test_numero_interpretado(texto, esperado):
+    assert _numero({'valor': texto}, 'valor') == pytest.approx(esperado)
+
+@pytest.mark.parametrize("texto", ["1.234", "12.500", "999.000"])
+def test_numero_com_ponto_e_tres_digitos_e_rejeitado(texto):
+    with pytest.raises(ValueError, match="ambíguo"):
+        _numero({'valor': texto}, 'valor')
@@ -0,0 +1,29 @@
+# test_pdf_generator.py (Logo do recibo: atalho pré-carregado e API pública produzem o mesmo PDF)
+import re
+import pytest
+import pdf_generator
+from benchmark_pdf import dados_sinteticos
+
+def _imagens(pdf_bytes):
+    """Dicionário de cada imagem do PDF (dimensões, filtro, tamanho do stream), na ordem do arquivo."""
+    dicionarios = re.findall(rb'obj\n<<\n((?:(?!endobj).)*?)>>\nstream', pdf_bytes, re.S)
+    return [dicionario for dicionario in dicionarios if b'/Subtype /Image' in dicionario]
+
+@pytest.fixture
+def logo_sem_pre_carregamento(monkeypatch):
+    logo = pdf_generator._logo()
+    assert logo, "logo.png ausente"
+    monkeypatch.setattr(pdf_generator, '_logo_pre_carregado', (logo[0], None, {}))
+
+def test_logo_pre_carregado_entra_uma_vez_por_recibo():
+    logo = pdf_generator._logo()
+    assert logo and logo[1] is not None, "internos do fpdf2 indisponíveis na versão instalada"
+    for venda_id in (1, 2):  # O segundo recibo reaproveita o logo já decodificado
+        assert len(_imagens(pdf_generator.gerar_recibo_venda(dados_sinteticos(venda_id, 120)))) == 1
+
+def test_logo_pela_api_publica_igual_ao_pre_carregado(logo_sem_pre_carregamento):
+    pela_api = _imagens(pdf_generator.gerar_recibo_venda(dados_sinteticos(3, 120)))
+    pdf_generator._logo_pre_carregado = None  # Volta ao atalho (o monkeypatch restaura no final)
+    pre_carregado = _imagens(pdf_generator.gerar_recibo_venda(dados_sinteticos(3, 120)))
+    assert pdf_generator._logo()[1] is not None
+    assert len(pela_api) == 1 and pela_api == pre_carregado
@@ -0,0 +1,54 @@
+# test_pool.py (Pool de conexões: pausa e remoção do arquivo do banco)
+import os
+import threading
+import time
+import pytest
+import database
+
+def test_remocao_espera_as_conexoes_emprestadas(banco):
+    emprestou, resultado = threading.Event(), {}
+    def segurar_conexao():
+        with database.pooled_connection() as conn:
+            emprestou.set()
+            time.sleep(0.3)
+            resultado['vendas'] = conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0]
+    thread = threading.Thread(target=segurar_conexao)
+    thread.start()
+    assert emprestou.wait(5)
+    database.remover_arquivos_db()
+    thread.join(5)
+    assert resultado['vendas'] > 0  # A remoção esperou a conexão emprestada terminar
+    assert not os.path.exists(banco)
+    assert database._pool_atual().qsize() == 0  # Nenhuma conexão ficou apontando para o arquivo apagado
+
+def test_versao_dados_nao_cria_o_arquivo_do_banco(banco):
+    database.remover_arquivos_db()
+    with pytest.raises(database.sqlite3.OperationalError):
+        database.versao_dados()
+    assert not os.path.exists(banco)
+    database.init_db()
+    database.migrate_db()
+    assert database.versao_dados()[0] == banco
+
+def test_pausa_barra_novo_emprestimo_de_quem_ja_tem_conexao(banco):
+    emprestou, pausando, terminou = threading.Event(), threading.Event(), threading.Event()
+    eventos = []
+    def segunda_conexao():
+        with database.pooled_connection():
+            emprestou.set()
+            assert pausando.wait(5)
+            time.sleep(0.1)  # A pausa já está esperando esta conexão voltar
+            with database.pooled_connection():  # Barrada até a pausa acabar
+                eventos.append('segunda conexão')
+        terminou.set()
+    thread = threading.Thread(target=segunda_conexao)
+    thread.start()
+    assert emprestou.wait(5)
+    pausando.set()
+    with pytest.raises(TimeoutError):
+        with database.pool_pausado(limite=0.5):
+            eventos.append('pausado')
+    assert terminou.wait(5) and eventos == ['segunda conexão']
+    with database.pool_pausado(limite=5):  # Tudo devolvido: agora a pausa consegue
+        assert database._conexoes_emprestadas == 0
+    thread.join(5)
@@ -0,0 +1,113 @@
+# test_rentabilidade.py (Motor vetorizado e venda_resumo x cálculo original, venda a venda)
+import sqlite3
+from contextlib import closing
+import pytest
+import database
+import importacao
+from calculations import calculate_many_venda_totals, calculate_global_totals
+
+TOLERANCIA = 1e-6
+CAMPOS_ESCALARES = [
+    'custo_total', 'custo_pago', 'custo_pendente', 'custo_mcpf', 'pagamentos_mcpf', 'custo_madeireira',
+    'pagamentos_madeireira', 'despesas_total_calculado', 'total_recebido', 'saldo_a_receber',
+    'total_despesas_pagas', 'saldo_despesas_a_pagar', 'lucro_bruto', 'lucro_liquido',
+]
+
+def _referencia(conn, venda_id):
+    """calculate_venda_totals da versão inicial do app, com as chaves de despesa fixas. Única diferença:
+    venda sem linha em custos conta custo 0 (o original falhava com IndexError)."""
+    venda = conn.execute("SELECT * FROM vendas WHERE id = ?", (venda_id,)).fetchone()
+    custo = conn.execute("SELECT custo_mcpf, custo_madeireira FROM custos WHERE venda_id = ?", (venda_id,)).fetchone()
+    parcelas = conn.execute("SELECT valor_pago FROM plano_recebimentos WHERE venda_id = ?", (venda_id,)).fetchall()
+    pagamentos = conn.execute("SELECT tipo_fornecedor, valor FROM pagamentos_custos WHERE venda_id = ?", (venda_id,)).fetchall()
+    despesas_pagas = conn.execute("SELECT tipo_despesa, valor FROM despesas_pagas WHERE venda_id = ?", (venda_id,)).fetchall()
+    config = dict(conn.execute("SELECT chave, valor FROM configuracoes").fetchall())
+
+    custo_mcpf = custo['custo_mcpf'] if custo else 0
+    custo_madeireira = custo['custo_madeireira'] if custo else 0
+    custo_total = custo_mcpf + custo_madeireira
+    pagamentos_mcpf = sum(linha['valor'] for linha in pagamentos if linha['tipo_fornecedor'] == 'MCPF')
+    pagamentos_madeireira = sum(linha['valor'] for linha in pagamentos if linha['tipo_fornecedor'] == 'Madeireira')
+    custo_pago = pagamentos_mcpf + pagamentos_madeireira
+    despesas_detalhadas = {
+        'royalties': venda['valor_venda'] * config.get('royalties', 0),
+        'propaganda': venda['valor_venda'] * config.get('propaganda', 0),
+        'simples': venda['valor_venda'] * config.get('simples', 0),
+        'corretagem': venda['valor_venda'] * config.get('corretagem', 0),
+        'admin': venda['valor_venda'] * config.get('admin', 0),
+        'icms': custo_total * config.get('icms', 0)
+    }
+    despesas_total_calculado = sum(despesas_detalhadas.values())
+    total_recebido = sum(linha['valor_pago'] or 0 for linha in parcelas)
+    pagamentos_despesa_por_tipo = {}
+    for linha in despesas_pagas:
+        pagamentos_despesa_por_tipo[linha['tipo_despesa']] = pagamentos_despesa_por_tipo.get(linha['tipo_despesa'], 0) + linha['valor']
+    total_despesas_pagas = sum(linha['valor'] for linha in despesas_pagas)
+    lucro_bruto = venda['valor_venda'] - custo_total
+    return {
+        'valor_venda': venda['valor_venda'], 'custo_total': custo_total, 'custo_pago': custo_pago, 'custo_pendente': custo_total - custo_pago,
+        'custo_mcpf': custo_mcpf, 'pagamentos_mcpf': pagamentos_mcpf,
+        'custo_madeireira': custo_madeireira, 'pagamentos_madeireira': pagamentos_madeireira,
+        'despesas_detalhadas': despesas_detalhadas, 'despesas_total_calculado': despesas_total_calculado,
+        'pagamentos_despesa_por_tipo': pagamentos_despesa_por_tipo,
+        'total_recebido': total_recebido, 'saldo_a_receber': venda['valor_venda'] - total_recebido,
+        'total_despesas_pagas': total_despesas_pagas, 'saldo_despesas_a_pagar': despesas_total_calculado - total_despesas_pagas,
+        'lucro_bruto': lucro_bruto, 'lucro_liquido': lucro_bruto - despesas_total_calculado,
+    }
+
+@pytest.fixture
+def referencias(banco):
+    """Banco sintético com casos de borda, e o cálculo original de cada venda."""
+    with database.transacao() as conn:
+        # Venda sem custos, parcelas, pagamentos ou despesas (só a linha em vendas)
+        conn.execute("INSERT INTO vendas (cliente, data_venda, nome_kit, valor_venda) VALUES ('Sem custos', '2024-01-10', 'Kit', 1000.0)")
+        # Venda com custos zerados e uma parcela pendente (valor_pago nulo)
+        venda_id = conn.execute("INSERT INTO vendas (cliente, data_venda, nome_kit, valor_venda) VALUES ('Sem parcelas pagas', '2024-01-11', 'Kit', 2500.0)").lastrowid
+        conn.execute("INSERT INTO custos (venda_id) VALUES (?)", (venda_id,))
+        conn.execute("INSERT INTO plano_recebimentos (venda_id, descricao, valor_previsto) VALUES (?, 'Entrada', 500.0)", (venda_id,))
+        # Chave que não é despesa: fica fora do motor e dos triggers, como no cálculo original
+        conn.execute("INSERT INTO configuracoes (chave, valor) VALUES ('outra_taxa', 0.5)")
+    database.save_config({'royalties': 0.08, 'icms': 0.12})
+    with closing(sqlite3.connect(banco)) as conn:
+        conn.row_factory = sqlite3.Row
+        ids = [linha[0] for linha in conn.execute("SELECT id FROM vendas ORDER BY id")]
+        return {venda_id: _referencia(conn, venda_id) for venda_id in ids}
+
+def test_totais_por_venda_iguais_ao_calculo_original(referencias):
+    totais = calculate_many_venda_totals().set_index('id')
+    assert sorted(totais.index) == sorted(referencias)
+    for venda_id, esperado in referencias.items():
+        linha = totais.loc[venda_id]
+        for campo in CAMPOS_ESCALARES:
+            assert linha[campo] == pytest.approx(esperado[campo], abs=TOLERANCIA), (venda_id, campo)
+        assert list(linha['despesas_detalhadas']) == list(esperado['despesas_detalhadas'])
+        assert linha['despesas_detalhadas'] == pytest.approx(esperado['despesas_detalhadas'], abs=TOLERANCIA)
+        assert linha['pagamentos_despesa_por_tipo'] == pytest.approx(esperado['pagamentos_despesa_por_tipo'], abs=TOLERANCIA)
+
+def test_venda_resumo_igual_ao_calculo_original(referencias):
+    resumo = database.get_data_as_dataframe("SELECT * FROM venda_resumo", usar_cache=False).set_index('venda_id')
+    assert sorted(resumo.index) == sorted(referencias)
+    for venda_id, esperado in referencias.items():
+        for coluna in database.COLUNAS_RESUMO[1:]:
+            assert resumo.at[venda_id, coluna] == pytest.approx(esperado[coluna], abs=TOLERANCIA), (venda_id, coluna)
+
+def test_totais_globais_iguais_a_soma_do_calculo_original(referencias):
+    globais = calculate_global_totals()
+    soma = lambda campo: sum(esperado[campo] for esperado in referencias.values())
+    total_vendas = soma('valor_venda')
+    esperados = {
+        'total_vendas': total_vendas, 'total_custos': soma('custo_total'), 'total_despesas': soma('despesas_total_calculado'),
+        'lucro_bruto': soma('lucro_bruto'), 'lucro_liquido': soma('lucro_liquido'),
+        'total_recebido': soma('total_recebido'), 'total_a_receber': soma('saldo_a_receber'),
+        'debitos_pago_custos': soma('custo_pago'), 'debitos_pago_despesas': soma('total_despesas_pagas'),
+        'debitos_pendente_custos': soma('custo_pendente'), 'debitos_pendente_despesas': soma('saldo_despesas_a_pagar'),
+        'percentual_lucro': soma('lucro_liquido') / total_vendas * 100,
+    }
+    for campo, valor in esperados.items():
+        assert globais[campo] == pytest.approx(valor, rel=1e-9, abs=1e-6), campo
+
+def test_importacao_aceita_so_as_chaves_de_despesa():
+    for tipo in database.DESPESAS:
+        importacao._valida_despesa_paga({'tipo_despesa': tipo, 'valor': '10', 'data_pagamento': '2024-01-01'}, 1)
+    with pytest.raises(ValueError):
+        importacao._valida_despesa_paga({'tipo_despesa': 'outra_taxa', 'valor': '10', 'data_pagamento': '2024-01-01'}, 1)
@@ -0,0 +1,33 @@
+# test_tarefas.py (Tarefas em segundo plano: consultas de estado sem criar o pool nem abrir conexões a cada rerun)
+from contextlib import closing
+import pytest
+import tarefas
+
+@pytest.fixture
+def arquivo_tarefas(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "tarefas.db")
+    monkeypatch.setattr(tarefas, 'ARQUIVO_TAREFAS', caminho)
+    monkeypatch.setattr(tarefas, '_conexao_leitura', None)
+    monkeypatch.setattr(tarefas, '_executor', None)
+    yield caminho
+    if tarefas._executor is not None:
+        tarefas._executor.shutdown(wait=True)
+    if tarefas._conexao_leitura is not None:
+        tarefas._conexao_leitura.close()
+
+def test_consulta_de_estado_reaproveita_a_conexao_e_nao_cria_o_pool(arquivo_tarefas):
+    with closing(tarefas._conectar()) as conn:
+        tarefas._criar_tabela(conn)
+        conn.execute("INSERT INTO tarefas (tipo, descricao, processo, status, criada_em) VALUES ('x', 'Antiga', -1, ?, '2024-01-01')", (tarefas.STATUS_EXECUTANDO,))
+        conn.commit()
+    assert tarefas.tarefas_ativas() == []  # A tarefa do processo que não existe mais foi marcada como interrompida
+    conexao = tarefas._conexao_leitura
+    for _ in range(3):
+        tarefas.tarefas_ativas()
+    assert tarefas._conexao_leitura is conexao and tarefas._executor is None
+    assert tarefas.obter_tarefa(1)['status'] == tarefas.STATUS_INTERROMPIDA
+
+def test_tarefa_enviada_aparece_na_conexao_de_leitura(arquivo_tarefas):
+    tarefas.tarefas_ativas()
+    tarefa_id = tarefas.enviar_tarefa('teste', "Teste", lambda progresso: {'mensagem': 'feito'})
+    assert tarefas.aguardar_tarefa(tarefa_id, intervalo=0.05, limite=10)['mensagem'] == 'feito'
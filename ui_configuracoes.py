@@ -1,7 +1,74 @@
 # ui_configuracoes.py
-import streamlit as st
 import os
-from database import get_config, save_config
+import tempfile
+import time
+import uuid
+import streamlit as st
+from database import get_config, save_config, remover_arquivos_db, tarefa_recalcular_resumos
+from backup import tarefa_backup, tarefa_restaurar, listar_backups, preparar_arquivo_restauracao, validar_backup, DIRETORIO_BACKUPS, INTERVALO_BACKUP_HORAS, BACKUPS_GUARDADOS, PREFIXO_SEGURANCA
+from tarefas import enviar_tarefa
+from ui_tarefas import acompanhar_tarefa
+
+PREFIXO_PREPARADO = "restauracao_"
+VALIDADE_PREPARADO = 24 * 3600  # Segundos até um arquivo preparado e não restaurado (sessão encerrada) ser apagado
+
+def _limpar_preparados_abandonados():
+    """Apaga os arquivos preparados para restauração há mais de VALIDADE_PREPARADO (de qualquer sessão)."""
+    diretorio, limite = tempfile.gettempdir(), time.time() - VALIDADE_PREPARADO
+    for nome in os.listdir(diretorio):
+        if nome.startswith(PREFIXO_PREPARADO) and nome.endswith('.db'):
+            caminho = os.path.join(diretorio, nome)
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+            except OSError:
+                pass  # Apagado por outra sessão ou pela tarefa de restauração
+
+def _preparar_restauracao(identificador, abrir_origem):
+    """Descompacta e valida o backup escolhido uma vez só (não a cada rerun); guarda o resultado na sessão.
+    None se esse backup já foi enviado para restauração (escolher outro volta a preparar)."""
+    if st.session_state.get('restauracao_enviada') == identificador:
+        return None
+    st.session_state.pop('restauracao_enviada', None)
+    preparado = st.session_state.get('restauracao_preparada')
+    if preparado is None or preparado['id'] != identificador:
+        if preparado and os.path.exists(preparado['caminho']):
+            os.remove(preparado['caminho'])
+        _limpar_preparados_abandonados()
+        destino = os.path.join(tempfile.gettempdir(), f"{PREFIXO_PREPARADO}{uuid.uuid4().hex}.db")
+        with abrir_origem() as origem:
+            preparar_arquivo_restauracao(origem, destino)
+        preparado = st.session_state.restauracao_preparada = {'id': identificador, 'caminho': destino, 'validacao': validar_backup(destino)}
+    return preparado
+
+def render_restauracao(backups):
+    st.markdown("**Restaurar backup**")
+    origem = st.radio("Origem do backup", ["Enviar arquivo", "Backup do servidor"], horizontal=True, key="restauracao_origem") if backups else "Enviar arquivo"
+    preparado = None
+    if origem == "Enviar arquivo":
+        enviado = st.file_uploader("Arquivo de backup (.db ou .db.gz)", type=['db', 'gz'], key="restauracao_arquivo")
+        if enviado is not None:
+            preparado = _preparar_restauracao(enviado.file_id, lambda: enviado)
+    else:
+        escolhido = st.selectbox("Backup do servidor", backups, format_func=lambda backup: backup['arquivo'], key="restauracao_automatico")
+        preparado = _preparar_restauracao(escolhido['caminho'], lambda: open(escolhido['caminho'], 'rb'))
+
+    if preparado:
+        validacao = preparado['validacao']
+        if validacao['problemas']:
+            st.error("O arquivo não pode ser restaurado:\n\n" + "\n".join(f"- {problema}" for problema in validacao['problemas']))
+        else:
+            st.success(f"Backup válido: {validacao['vendas']} vendas, {validacao['contas_bancarias']} contas e "
+                       f"{validacao['transacoes_bancarias']} lançamentos bancários (esquema versão {validacao['versao']}).")
+            st.warning("A restauração substitui TODOS os dados atuais pelos do backup.")
+            if st.button("Restaurar este backup", key="restauracao_iniciar"):
+                # A tarefa apaga o arquivo temporário no final; enquanto o mesmo backup continuar
+                # escolhido ele não é preparado de novo (nem o botão volta a aparecer)
+                st.session_state.restauracao_tarefa = enviar_tarefa('restauracao', "Restauração de backup", tarefa_restaurar, preparado['caminho'], chave='restauracao')
+                st.session_state.restauracao_enviada = preparado['id']
+                del st.session_state.restauracao_preparada
+                st.rerun()
+    acompanhar_tarefa('restauracao_tarefa')
 
 def render_configuracoes():
     st.header("⚙️ Configurações Gerais")
@@ -27,20 +94,36 @@ def render_configuracoes():
             
     st.divider()
     
+    st.subheader("🔄 Resumos e Saldos")
+    st.caption("Os totais de cada venda e os saldos das contas bancárias são atualizados automaticamente a cada lançamento. Use o botão abaixo para recalculá-los do zero e conferir se havia divergências.")
+    if st.button("Recalcular Resumos e Saldos"):
+        # Roda em segundo plano; a chave evita dois recálculos simultâneos (outro clique, outra sessão)
+        st.session_state.recalculo_tarefa = enviar_tarefa('recalculo', "Recálculo de resumos e saldos", tarefa_recalcular_resumos, chave='recalculo')
+    acompanhar_tarefa('recalculo_tarefa', "Baixar divergências (CSV)", "divergencias.csv", "text/csv")
+
+    st.divider()
+
     st.subheader("💾 Backup e Restauração")
-    st.info("""
-    **Backup:** Para fazer o backup dos seus dados, simplesmente copie o arquivo `financeiro.db` que está na mesma pasta desta aplicação.
+    st.info(f"""
+    **Backup:** O botão abaixo gera uma cópia consistente do banco (mesmo com o sistema em uso), comprimida em `.db.gz`. Descompacte o arquivo para obter o `financeiro.db`.
+    Backups automáticos são gravados na pasta `{DIRETORIO_BACKUPS}` a cada {INTERVALO_BACKUP_HORAS:g} horas; os {BACKUPS_GUARDADOS} mais recentes são mantidos.
     
-    **Restauração:** Para restaurar um backup, feche a aplicação, substitua o arquivo `financeiro.db` atual pelo seu arquivo de backup e inicie a aplicação novamente.
+    **Restauração:** Envie um backup (`.db` ou `.db.gz`) ou escolha um dos salvos no servidor. O arquivo é conferido antes e o banco atual é salvo na pasta `{DIRETORIO_BACKUPS}` (`{PREFIXO_SEGURANCA}...`, fora da rotação dos automáticos); não é preciso reiniciar a aplicação.
     """)
 
-    with open("financeiro.db", "rb") as fp:
-        st.download_button(
-            label="📥 Baixar Arquivo de Backup (financeiro.db)",
-            data=fp,
-            file_name="backup_financeiro.db",
-            mime="application/octet-stream"
-        )
+    if st.button("Gerar Backup"):
+        # A cópia só é feita quando pedida, em segundo plano; o download lê o arquivo só no clique
+        destino = os.path.join(tempfile.gettempdir(), f"backup_{uuid.uuid4().hex}.db.gz")
+        st.session_state.backup_tarefa = enviar_tarefa('backup', "Backup do banco", tarefa_backup, destino, chave='backup_download')
+    acompanhar_tarefa('backup_tarefa', "📥 Baixar Arquivo de Backup (financeiro.db.gz)", "backup_financeiro.db.gz", "application/gzip")
+
+    backups = listar_backups() + listar_backups(prefixo=PREFIXO_SEGURANCA)
+    if backups:
+        with st.expander(f"Backups salvos no servidor ({len(backups)})"):
+            st.dataframe([{'Arquivo': backup['arquivo'], 'Criado em': backup['criado_em'].strftime('%d/%m/%Y %H:%M'),
+                           'Tamanho (KB)': round(backup['tamanho'] / 1024)} for backup in backups], hide_index=True)
+
+    render_restauracao(backups)
         
     st.divider()
     
@@ -55,7 +138,7 @@ def render_configuracoes():
         st.error("Você tem certeza ABSOLUTA que deseja apagar todos os dados?")
         if st.button("Sim, tenho certeza. Apagar tudo."):
             try:
-                os.remove("financeiro.db")
+                remover_arquivos_db()
                 del st.session_state.confirm_delete
                 st.success("Todos os dados foram apagados. A aplicação será reiniciada.")
                 st.rerun()
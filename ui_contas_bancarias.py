@@ -2,7 +2,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import date, datetime
-from database import add_conta_bancaria, get_saldo_contas, add_transacao_bancaria, get_data_as_dataframe, delete_transacao_bancaria
+from database import add_conta_bancaria, get_saldo_contas, add_transacao_bancaria, get_extrato_pagina, delete_transacao_bancaria
 
 def format_brl(value):
     if isinstance(value, (int, float)):
@@ -83,20 +83,35 @@ def render_contas_bancarias():
                     st.rerun()
         
         st.subheader("Extrato da Conta")
-        extrato_df = get_data_as_dataframe(
-            "SELECT id, data, tipo, descricao, valor FROM transacoes_bancarias WHERE conta_id = ? ORDER BY data DESC, id DESC",
-            (int(conta_selecionada_id),)
+        filtro_cols = st.columns([2, 1, 1])
+        periodo = filtro_cols[0].date_input("Período", value=(), format="DD/MM/YYYY", key="extrato_periodo")
+        tipo_filtro = filtro_cols[1].selectbox("Tipo", ["Todos", "Entrada", "Saída"], key="extrato_tipo")
+        tamanho_pagina = filtro_cols[2].selectbox("Lançamentos por página", [25, 50, 100], key="extrato_tamanho")
+        data_inicio = periodo[0] if len(periodo) > 0 else None
+        data_fim = periodo[1] if len(periodo) > 1 else None
+
+        # Paginação keyset: guardamos o cursor (data, id) do fim de cada página já visitada.
+        # Mudou a conta ou algum filtro, volta para a primeira página.
+        filtros_atuais = (int(conta_selecionada_id), str(data_inicio), str(data_fim), tipo_filtro, tamanho_pagina)
+        if st.session_state.get('extrato_filtros') != filtros_atuais:
+            st.session_state.extrato_filtros = filtros_atuais
+            st.session_state.extrato_cursores = []
+        cursores = st.session_state.extrato_cursores
+
+        extrato_df, proximo_cursor = get_extrato_pagina(
+            conta_selecionada_id, limite=tamanho_pagina, antes_de=cursores[-1] if cursores else None,
+            data_inicio=data_inicio, data_fim=data_fim, tipo=None if tipo_filtro == "Todos" else tipo_filtro
         )
         
         if extrato_df.empty:
-            st.info("Nenhuma transação nesta conta ainda.")
+            st.info("Nenhuma transação encontrada para esta conta e filtros.")
         else:
-            header_cols = st.columns([0.15, 0.15, 0.4, 0.2, 0.1])
-            header_cols[0].markdown("**Data**"); header_cols[1].markdown("**Tipo**"); header_cols[2].markdown("**Descrição**"); header_cols[3].markdown("**Valor**"); header_cols[4].markdown("**Ações**")
+            header_cols = st.columns([0.12, 0.12, 0.33, 0.16, 0.17, 0.1])
+            header_cols[0].markdown("**Data**"); header_cols[1].markdown("**Tipo**"); header_cols[2].markdown("**Descrição**"); header_cols[3].markdown("**Valor**"); header_cols[4].markdown("**Saldo Após**"); header_cols[5].markdown("**Ações**")
             st.divider()
 
             for _, row in extrato_df.iterrows():
-                cols = st.columns([0.15, 0.15, 0.4, 0.2, 0.1])
+                cols = st.columns([0.12, 0.12, 0.33, 0.16, 0.17, 0.1])
                 cols[0].write(pd.to_datetime(row['data']).strftime('%d/%m/%Y'))
                 cols[1].write(row['tipo'])
                 cols[2].write(row['descricao'])
@@ -106,9 +121,19 @@ def render_contas_bancarias():
                     cols[3].success(valor_str)
                 else:
                     cols[3].error(f"-{valor_str}")
+                cols[4].write(format_brl(row['saldo_apos']))
                 
                 if 'Saldo Inicial' not in row['descricao']:
-                    if cols[4].button("🗑️", key=f"del_trans_{row['id']}", help="Excluir esta transação"):
+                    if cols[5].button("🗑️", key=f"del_trans_{row['id']}", help="Excluir esta transação"):
                         delete_transacao_bancaria(row['id'])
                         st.success("Transação excluída.")
-                        st.rerun()
\ No newline at end of file
+                        st.rerun()
+
+        nav_cols = st.columns([1, 2, 1])
+        if cursores and nav_cols[0].button("⬅️ Mais recentes", key="extrato_anterior"):
+            cursores.pop()
+            st.rerun()
+        nav_cols[1].caption(f"Página {len(cursores) + 1}")
+        if proximo_cursor is not None and nav_cols[2].button("Mais antigos ➡️", key="extrato_proxima"):
+            cursores.append(proximo_cursor)
+            st.rerun()
\ No newline at end of file
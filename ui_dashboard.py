@@ -1,6 +1,7 @@
 # ui_dashboard.py (Versão Final com alinhamento e cards de lucro)
 import streamlit as st
-from calculations import calculate_global_totals
+from datetime import date
+from calculations import calculate_global_totals, calculate_fluxo_caixa_mensal, calculate_totais_periodo, intervalo_periodo, TIPOS_PERIODO
 
 def format_brl(value):
     if isinstance(value, (int, float)):
@@ -17,6 +18,44 @@ def styled_card(title, value, subtitle="", icon="", bg_color="linear-gradient(13
     </div>
     """, unsafe_allow_html=True)
 
+def metric_periodo(coluna, titulo, totais, chave, moeda=True, inverso=False):
+    """Métrica do período com a variação em relação ao período anterior."""
+    atual, anterior = totais[chave], totais[f'{chave}_anterior']
+    formatar = format_brl if moeda else (lambda valor: f"{valor:,.0f}".replace(",", "."))
+    variacao = f" ({(atual / anterior - 1):+.1%})" if anterior else ""
+    diferenca = atual - anterior
+    delta = f"{'+' if diferenca >= 0 else '-'}{formatar(abs(diferenca))}{variacao}" if anterior or atual else None
+    coluna.metric(titulo, formatar(atual), delta=delta, delta_color="inverse" if inverso else "normal")
+
+def render_periodo():
+    st.subheader("📆 Desempenho do Período")
+    cols = st.columns([2, 3])
+    tipo = cols[0].radio("Período", list(TIPOS_PERIODO) + ["Personalizado"], horizontal=True, key="dashboard_periodo")
+    if tipo == "Personalizado":
+        intervalo = cols[1].date_input("Intervalo", value=(date.today().replace(day=1), date.today()), format="DD/MM/YYYY", key="dashboard_intervalo")
+        if len(intervalo) != 2:
+            st.info("Selecione a data final do intervalo.")
+            return
+        inicio, fim = intervalo
+        inicio_anterior = None  # Mesmo número de dias, imediatamente antes
+    else:
+        referencia = cols[1].date_input("Data de referência", value=date.today(), format="DD/MM/YYYY", key="dashboard_referencia")
+        inicio, fim, inicio_anterior = intervalo_periodo(tipo, referencia)
+
+    totais = calculate_totais_periodo(inicio, fim, inicio_anterior)
+    st.caption(f"De {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}, comparado ao período anterior.")
+
+    linha1 = st.columns(4)
+    metric_periodo(linha1[0], "Vendas Fechadas", totais, 'vendas_qtd', moeda=False)
+    metric_periodo(linha1[1], "Valor Vendido", totais, 'vendas_valor')
+    metric_periodo(linha1[2], "Custos das Vendas", totais, 'custos', inverso=True)
+    metric_periodo(linha1[3], "Lucro Líquido das Vendas", totais, 'lucro_liquido')
+    linha2 = st.columns(4)
+    metric_periodo(linha2[0], "Recebido de Clientes", totais, 'recebido')
+    metric_periodo(linha2[1], "Parcelas com Vencimento", totais, 'vencimentos')
+    metric_periodo(linha2[2], "Vencimentos em Aberto no Período", totais, 'vencimentos_pendentes', inverso=True)
+    metric_periodo(linha2[3], "Saídas no Extrato", totais, 'saidas', inverso=True)
+
 def render_dashboard():
     st.markdown("""
     <style>
@@ -117,4 +156,31 @@ def render_dashboard():
             value=f"{totals['percentual_lucro']:.2f}%",
             subtitle="(Lucro Líquido / Vendas)", icon="💡",
             bg_color="linear-gradient(135deg, #e83e8c, #bf3474)" # Rosa/Magenta
-        )
\ No newline at end of file
+        )
+
+    # --- PERÍODO SELECIONADO ---
+    st.markdown("---")
+    render_periodo()
+
+    # --- FLUXO DE CAIXA MENSAL ---
+    st.markdown("---")
+    st.subheader("📅 Fluxo de Caixa Mensal")
+    meses_futuros = st.select_slider("Meses projetados", options=[6, 12, 24, 36], value=24, key="dashboard_meses_fluxo")
+    fluxo = calculate_fluxo_caixa_mensal(meses_futuros=meses_futuros)
+
+    grafico = fluxo.set_index('mes')
+    movimentos = grafico.assign(
+        Entradas=grafico['entradas'] + grafico['a_receber'],
+        Saídas=-(grafico['saidas'] + grafico['custos_a_pagar'] + grafico['despesas_a_pagar']),
+    )[['Entradas', 'Saídas']]
+    st.bar_chart(movimentos, color=["#28a745", "#dc3545"])
+    st.line_chart(grafico[['saldo_final']].rename(columns={'saldo_final': 'Saldo no fim do mês'}))
+    st.caption("Meses passados: lançamentos do extrato. Do mês atual em diante: parcelas pendentes pelo vencimento (as vencidas entram no mês atual) "
+               "e custos/despesas a pagar no mês da próxima parcela pendente de cada venda.")
+
+    with st.expander("Ver tabela do fluxo de caixa"):
+        tabela = fluxo.rename(columns={
+            'mes': 'Mês', 'entradas': 'Entradas (extrato)', 'saidas': 'Saídas (extrato)', 'a_receber': 'A Receber',
+            'custos_a_pagar': 'Custos a Pagar', 'despesas_a_pagar': 'Despesas a Pagar', 'saldo_final': 'Saldo no Fim do Mês', 'projetado': 'Projetado'})
+        colunas_valor = [coluna for coluna in tabela.columns if coluna not in ('Mês', 'Projetado')]
+        st.dataframe(tabela.style.format({coluna: format_brl for coluna in colunas_valor}), hide_index=True, use_container_width=True)
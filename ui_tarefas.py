@@ -0,0 +1,54 @@
+# ui_tarefas.py (Acompanhamento das tarefas em segundo plano nas páginas)
+import os
+from functools import partial
+import streamlit as st
+from tarefas import obter_tarefa, tarefas_ativas, STATUS_ATIVOS, STATUS_CONCLUIDA
+
+INTERVALO_ATUALIZACAO = 1.0  # Segundos entre duas consultas do andamento
+
+def _ler_arquivo(caminho):
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+def acompanhar_tarefa(chave_sessao, rotulo_download=None, nome_arquivo=None, mime=None):
+    """Mostra o andamento da tarefa cujo id está em st.session_state[chave_sessao].
+
+    Enquanto a tarefa está ativa, só um fragmento é reexecutado a cada INTERVALO_ATUALIZACAO (o resto
+    da página não roda de novo); ao terminar, a página inteira é atualizada uma vez. Concluída, mostra
+    a mensagem e, se houver resultado, o botão de download. Retorna o estado da tarefa (ou None).
+    """
+    tarefa_id = st.session_state.get(chave_sessao)
+    tarefa = obter_tarefa(tarefa_id) if tarefa_id else None
+    if tarefa is None:
+        st.session_state.pop(chave_sessao, None)
+        return None
+
+    if tarefa['status'] in STATUS_ATIVOS:
+        @st.fragment(run_every=INTERVALO_ATUALIZACAO)
+        def andamento():
+            atual = obter_tarefa(tarefa_id)
+            if atual is None or atual['status'] not in STATUS_ATIVOS:
+                st.rerun()
+            st.progress(atual['progresso'], text=f"{atual['descricao']}: {atual['mensagem'] or atual['status']}")
+        andamento()
+        return tarefa
+
+    if tarefa['status'] == STATUS_CONCLUIDA:
+        st.success(tarefa['mensagem'] or f"{tarefa['descricao']}: concluída.")
+        if rotulo_download:
+            if tarefa['arquivo_resultado'] and os.path.exists(tarefa['arquivo_resultado']):
+                # Lido só quando o usuário clica (em outra thread), não a cada rerun da página
+                st.download_button(rotulo_download, data=partial(_ler_arquivo, tarefa['arquivo_resultado']), file_name=nome_arquivo, mime=mime,
+                                   key=f"{chave_sessao}_download")
+            else:
+                resultado = obter_tarefa(tarefa_id, com_resultado=True)['resultado']
+                if resultado:
+                    st.download_button(rotulo_download, data=resultado, file_name=nome_arquivo, mime=mime, key=f"{chave_sessao}_download")
+    else:
+        st.error(f"{tarefa['descricao']}: {tarefa['status'].lower()}. {tarefa['mensagem'] or ''}")
+    return tarefa
+
+def resumo_tarefas_ativas():
+    """Lista curta das tarefas em andamento (barra lateral): continuam rodando ao trocar de página."""
+    for tarefa in tarefas_ativas():
+        st.progress(tarefa['progresso'], text=f"⏳ {tarefa['descricao']} ({tarefa['status'].lower()})")
@@ -1,16 +1,31 @@
 # ui_vendas.py (Versão com Filtro de Busca)
 import streamlit as st
+import hashlib
+import io
+import os
+import tempfile
+import uuid
 import pandas as pd
 from datetime import date
-from database import add_venda, delete_venda, get_data_as_dataframe
-from calculations import calculate_venda_totals
-from pdf_generator import gerar_recibo_venda
+from database import add_venda, delete_venda, get_data_as_dataframe, buscar_vendas, STATUS_ENTREGA
+from calculations import calculate_many_venda_totals
+from ui_tarefas import acompanhar_tarefa
+# importacao, exportacao e tarefas só são importados nos botões que os usam (como as páginas em paginas.py)
+from perf import medir
 
 def format_brl(value):
     if isinstance(value, (int, float)):
         return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
     return "R$ 0,00"
 
+def gerar_recibo(venda_row):
+    """Gera (ou reaproveita do cache) o PDF do recibo de uma venda."""
+    from pdf_generator import gerar_recibo_venda_cache, montar_dados_recibo  # fpdf só é carregado no primeiro recibo
+    pagamentos_df = get_data_as_dataframe("SELECT * FROM plano_recebimentos WHERE venda_id = ?", (int(venda_row['id']),))
+    dados_para_pdf = montar_dados_recibo(venda_row.to_dict(), pagamentos_df.to_dict('records'))
+    with medir('pdf'):
+        return gerar_recibo_venda_cache(dados_para_pdf)
+
 def render_vendas():
     st.header("📝 Vendas")
 
@@ -27,23 +42,65 @@ def render_vendas():
                     venda_data = {'cliente': cliente, 'telefone': telefone, 'email': email, 'data_venda': str(data_venda), 'nome_kit': nome_kit, 'valor_venda': valor_venda, 'valor_frete': valor_frete}
                     add_venda(venda_data); st.success("Venda registrada com sucesso!"); st.rerun()
 
+    with st.expander("📥 Importar Vendas em Lote (CSV/XLSX)", expanded=False):
+        st.caption("Envie um CSV por tabela (vendas.csv, custos.csv, plano_recebimentos.csv, pagamentos_custos.csv, despesas_pagas.csv) "
+                   "ou uma planilha .xlsx com uma aba para cada. As linhas filhas apontam para a venda pela coluna `ref` (da planilha de vendas) ou por `venda_id`.")
+        if st.toggle("Mostrar colunas aceitas", key="importacao_colunas"):
+            from importacao import COLUNAS_IMPORTACAO
+            st.caption(" | ".join(f"**{tabela}**: {', '.join(colunas)}" for tabela, colunas in COLUNAS_IMPORTACAO.items()))
+        arquivos = st.file_uploader("Arquivos para importar", type=['csv', 'xlsx'], accept_multiple_files=True, key="importacao_arquivos")
+        if arquivos and st.button("Importar", key="importacao_iniciar"):
+            from importacao import tarefa_importar
+            from tarefas import enviar_tarefa
+            # Conteúdo copiado agora: a tarefa roda em outra thread, depois que este rerun terminar
+            conteudos = [(arquivo.name, io.BytesIO(arquivo.getvalue())) for arquivo in arquivos]
+            assinatura = hashlib.sha1(b''.join(conteudo.getvalue() for _, conteudo in conteudos)).hexdigest()
+            st.session_state.importacao_tarefa = enviar_tarefa('importacao', f"Importação de {len(conteudos)} arquivo(s)", tarefa_importar, conteudos,
+                                                               chave=f"importacao:{assinatura}")
+        acompanhar_tarefa('importacao_tarefa', "Baixar relatório de rejeitadas", "importacao_rejeitadas.csv", "text/csv")
+
+    with st.expander("🗂️ Exportar Recibos em Lote (ZIP)", expanded=False):
+        filtro_cols = st.columns(3)
+        periodo = filtro_cols[0].date_input("Período da venda", value=(), format="DD/MM/YYYY", key="exportacao_periodo")
+        status_entrega = filtro_cols[1].selectbox("Status da entrega", ["Todos", *STATUS_ENTREGA], key="exportacao_status")
+        apenas_com_saldo = filtro_cols[2].checkbox("Somente com saldo a receber", key="exportacao_com_saldo")
+        if st.button("Gerar ZIP de Recibos", key="exportacao_iniciar"):
+            from exportacao import tarefa_exportar_recibos, filtrar_vendas_recibo
+            from tarefas import enviar_tarefa
+            data_inicio = periodo[0] if len(periodo) > 0 else None
+            data_fim = periodo[1] if len(periodo) > 1 else data_inicio
+            filtro_status = None if status_entrega == "Todos" else status_entrega
+            ids = filtrar_vendas_recibo(data_inicio, data_fim, filtro_status, apenas_com_saldo)
+            if not ids:
+                st.warning("Nenhuma venda encontrada com esses filtros.")
+            else:
+                # O ZIP é montado em disco por uma tarefa em segundo plano; a página só acompanha o andamento
+                destino = os.path.join(tempfile.gettempdir(), f"recibos_{uuid.uuid4().hex}.zip")
+                st.session_state.exportacao_tarefa = enviar_tarefa('exportacao', f"Exportação de {len(ids)} recibo(s)", tarefa_exportar_recibos, destino, ids,
+                                                                   chave=f"exportacao:{data_inicio}:{data_fim}:{filtro_status}:{apenas_com_saldo}")
+        acompanhar_tarefa('exportacao_tarefa', "📥 Baixar ZIP de Recibos", "recibos.zip", "application/zip")
+
     st.subheader("📋 Vendas Registradas")
     
     # --- LÓGICA DO FILTRO DE BUSCA ---
-    # 1. Busca todos os dados do banco de dados primeiro
-    vendas_df_completo = get_data_as_dataframe("SELECT v.*, e.status_entrega FROM vendas v LEFT JOIN entregas e ON v.id = e.venda_id ORDER BY v.id DESC")
-    
-    # 2. Cria o campo de texto para a busca
-    termo_busca = st.text_input("🔍 Buscar Vendas (por cliente ou nome do kit)", placeholder="Digite aqui para filtrar...")
+    # 1. Cria o campo de texto para a busca
+    busca_cols = st.columns([4, 1])
+    termo_busca = busca_cols[0].text_input("🔍 Buscar Vendas (por cliente, telefone, email ou nome do kit)", placeholder="Digite aqui para filtrar...")
+    tamanho_pagina = busca_cols[1].selectbox("Vendas por página", [25, 50, 100], key="vendas_tamanho_pagina")
 
-    # 3. Filtra o dataframe se houver algo digitado na busca
-    if termo_busca:
-        vendas_df_filtrado = vendas_df_completo[
-            vendas_df_completo['cliente'].str.contains(termo_busca, case=False, na=False) |
-            vendas_df_completo['nome_kit'].str.contains(termo_busca, case=False, na=False)
-        ]
-    else:
-        vendas_df_filtrado = vendas_df_completo
+    # 2. Mudou a busca ou o tamanho da página, volta para a primeira página
+    if st.session_state.get('vendas_busca_atual') != (termo_busca, tamanho_pagina):
+        st.session_state.vendas_busca_atual = (termo_busca, tamanho_pagina)
+        st.session_state.vendas_pagina = 0
+
+    # 3. A busca roda no banco (índice de texto completo) e traz só a página exibida
+    vendas_df_filtrado, total_vendas = buscar_vendas(termo_busca, limite=tamanho_pagina, offset=st.session_state.vendas_pagina * tamanho_pagina)
+    total_paginas = max(1, -(-total_vendas // tamanho_pagina))
+    if st.session_state.vendas_pagina >= total_paginas:
+        # A página atual deixou de existir (ex.: excluída a última venda da última página): vai para a última
+        st.session_state.vendas_pagina = total_paginas - 1
+        vendas_df_filtrado, total_vendas = buscar_vendas(termo_busca, limite=tamanho_pagina, offset=st.session_state.vendas_pagina * tamanho_pagina)
+        total_paginas = max(1, -(-total_vendas // tamanho_pagina))
 
     if vendas_df_filtrado.empty:
         if termo_busca:
@@ -57,10 +114,13 @@ def render_vendas():
             col.markdown(f"**{field_name}**")
         st.divider()
 
-        # 4. O loop agora usa o dataframe JÁ FILTRADO
+        # 4. Totais de todas as vendas da página calculados em lote (número fixo de consultas)
+        totais_df = calculate_many_venda_totals(vendas_df_filtrado['id'].tolist()).set_index('id')
+
+        # 5. O loop agora usa o dataframe JÁ FILTRADO
         for _, row in vendas_df_filtrado.iterrows():
             venda_id = row['id']
-            totals = calculate_venda_totals(venda_id)
+            lucro_liquido = totais_df.at[venda_id, 'lucro_liquido']
             
             row_cols = st.columns([0.05, 0.2, 0.1, 0.2, 0.15, 0.1, 0.2])
             
@@ -68,7 +128,7 @@ def render_vendas():
             row_cols[1].write(row['cliente'])
             row_cols[2].write(pd.to_datetime(row['data_venda']).strftime('%d/%m/%Y'))
             row_cols[3].write(row['nome_kit'])
-            row_cols[4].write(format_brl(totals['lucro_liquido']))
+            row_cols[4].write(format_brl(lucro_liquido))
             row_cols[5].write(row['status_entrega'] or 'Aguardando')
             
             with row_cols[6]:
@@ -77,21 +137,21 @@ def render_vendas():
                 if action_cols[0].button("🗑️", key=f"delete_venda_{venda_id}", help="Excluir venda"):
                     delete_venda(venda_id); st.success(f"Venda #{venda_id} excluída."); st.rerun()
                 
-                pagamentos_df = get_data_as_dataframe("SELECT * FROM plano_recebimentos WHERE venda_id = ?", (venda_id,))
-                dados_para_pdf = row.to_dict()
-                dados_para_pdf['data_venda'] = pd.to_datetime(dados_para_pdf['data_venda']).strftime('%d/%m/%Y')
-                pagamentos_list = []
-                for _, pag_row in pagamentos_df.iterrows():
-                    pag_dict = pag_row.to_dict()
-                    if pag_dict.get('data_pagamento'):
-                        pag_dict['data_pagamento'] = pd.to_datetime(pag_dict['data_pagamento']).strftime('%d/%m/%Y')
-                    pagamentos_list.append(pag_dict)
-                dados_para_pdf['pagamentos'] = pagamentos_list
+                # Recibo sob demanda: o PDF só é gerado para a venda em que o usuário clicou
+                if st.session_state.get('recibo_venda_id') == venda_id:
+                    action_cols[1].download_button(
+                        label="📥", data=gerar_recibo(row),
+                        file_name=f"Recibo_Venda_{venda_id}_{row['cliente']}.pdf",
+                        mime='application/pdf', help="Baixar Recibo de Venda em PDF", key=f"download_recibo_{venda_id}"
+                    )
+                elif action_cols[1].button("📄", key=f"recibo_{venda_id}", help="Gerar Recibo de Venda em PDF"):
+                    st.session_state.recibo_venda_id = venda_id
+                    st.rerun()
 
-                pdf_bytes = gerar_recibo_venda(dados_para_pdf)
-                
-                action_cols[1].download_button(
-                    label="📄", data=pdf_bytes,
-                    file_name=f"Recibo_Venda_{venda_id}_{row['cliente']}.pdf",
-                    mime='application/pdf', help="Gerar Recibo de Venda em PDF"
-                )
\ No newline at end of file
+        # 6. Navegação entre páginas
+        nav_cols = st.columns([1, 2, 1])
+        if nav_cols[0].button("⬅️ Anterior", key="vendas_anterior", disabled=st.session_state.vendas_pagina == 0):
+            st.session_state.vendas_pagina -= 1; st.rerun()
+        nav_cols[1].caption(f"Página {st.session_state.vendas_pagina + 1} de {total_paginas} ({total_vendas} vendas)")
+        if nav_cols[2].button("Próxima ➡️", key="vendas_proxima", disabled=st.session_state.vendas_pagina + 1 >= total_paginas):
+            st.session_state.vendas_pagina += 1; st.rerun()
\ No newline at end of file